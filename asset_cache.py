@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染资源共享缓存
+同一站点的页面共用样式表、字体和图片，渲染时所有页面的子资源都经过同一个内存缓存，每个资源只下载一次；
+WeasyPrint通过 url_fetcher 读取，wkhtmltopdf通过本机代理服务读取（HTML中的资源地址会被改写为代理地址）
+"""
+
+import io
+import re
+import threading
+import logging
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlsplit, quote, parse_qs
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 需要改写资源地址的标签属性和CSS引用
+_TAG_RE = re.compile(r'<(?:img|script|link|source|input|video|audio)\b[^>]*>', re.IGNORECASE)
+_ATTR_RE = re.compile(r'''(\s(?:src|href)\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+_STYLE_BLOCK_RE = re.compile(r'(<style\b[^>]*>)(.*?)(</style>)', re.IGNORECASE | re.DOTALL)
+_CSS_URL_RE = re.compile(r'''url\(\s*(["']?)([^"')]*?)\1\s*\)|(@import\s+)(["'])(.*?)\4''', re.IGNORECASE)
+
+# 下载资源时每次读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+
+class Asset:
+    """
+    一个缓存的资源
+    超过单个资源上限的资源不缓存，body 只是已读取的开头部分，其余内容仍在 response 中，由 chunks 边读取边返回
+    """
+    __slots__ = ('status', 'content_type', 'body', 'response')
+
+    def __init__(self, status, content_type, body, response=None):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.response = response
+
+    def chunks(self):
+        """逐块返回资源的全部内容，读完后关闭连接"""
+        yield self.body
+        if self.response is not None:
+            try:
+                yield from self.response.iter_content(CHUNK_SIZE)
+            finally:
+                self.close()
+
+    def close(self):
+        """关闭未读完的连接"""
+        if self.response is not None:
+            self.response.close()
+
+
+class _ChunkReader(io.RawIOBase):
+    """把 Asset.chunks 包装为文件对象，供WeasyPrint的 file_obj 读取"""
+
+    def __init__(self, asset):
+        self.asset = asset
+        self.chunks = asset.chunks()
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        self.chunks.close()
+        self.asset.close()
+        super().close()
+
+
+class AssetCache:
+    """
+    按URL缓存渲染所需子资源的内存缓存，超过max_size_mb时淘汰最久未使用的资源
+    可以在多个线程和多个转换器之间共享；同一URL同时被多个页面请求时只下载一次
+    max_asset_mb: 单个资源的大小上限，超过的资源照常返回但不缓存，也不在内存中读取完整内容
+    """
+
+    def __init__(self, max_size_mb=100, max_asset_mb=10, session=None, timeout=30):
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.max_asset_size = int(max_asset_mb * 1024 * 1024)
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total_size = 0
+        # 正在下载的URL -> threading.Event
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+
+    def get(self, url):
+        """
+        返回url对应的 Asset，未缓存时下载；网络错误时抛出requests异常
+        超过单个资源上限的 Asset 需要通过 chunks 读取或调用 close
+        """
+        url = url.split('#', 1)[0]
+        while True:
+            with self.lock:
+                asset = self.entries.get(url)
+                if asset is not None:
+                    self.entries.move_to_end(url)
+                    self.hits += 1
+                    self.bytes_saved += len(asset.body)
+                    return asset
+                waiting = self.inflight.get(url)
+                if waiting is None:
+                    self.inflight[url] = threading.Event()
+                    self.misses += 1
+                    break
+            # 其他线程正在下载同一资源，等待其完成后重新查找；下载失败时由本线程重试
+            waiting.wait()
+
+        try:
+            asset = self._download(url)
+            self._store(url, asset)
+            return asset
+        finally:
+            with self.lock:
+                self.inflight.pop(url).set()
+
+    def _download(self, url):
+        response = self.session.get(url, timeout=self.timeout, stream=True)
+        content_type = response.headers.get('Content-Type', 'application/octet-stream')
+        body = bytearray()
+        streaming = False
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                body += chunk
+                if len(body) > self.max_asset_size:
+                    # 超过上限时停止读取，其余内容由使用方从连接中逐块转发
+                    streaming = True
+                    return Asset(response.status_code, content_type, bytes(body), response)
+            return Asset(response.status_code, content_type, bytes(body))
+        finally:
+            if not streaming:
+                response.close()
+
+    def _store(self, url, asset):
+        size = len(asset.body)
+        if asset.response is not None or asset.status >= 500:
+            return
+        with self.lock:
+            self.entries[url] = asset
+            self.total_size += size
+            while self.total_size > self.max_size and len(self.entries) > 1:
+                _, old = self.entries.popitem(last=False)
+                self.total_size -= len(old.body)
+                self.evicted += 1
+
+    def stats(self):
+        """返回缓存统计"""
+        with self.lock:
+            requests_count = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'size_mb': self.total_size / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests_count if requests_count else 0.0,
+                'saved_mb': self.bytes_saved / (1024 * 1024),
+                'evicted': self.evicted
+            }
+
+    def reset_stats(self):
+        """清零命中统计（保留已缓存的资源），返回清零前的统计，用于按批次统计"""
+        stats = self.stats()
+        with self.lock:
+            self.hits = self.misses = self.bytes_saved = self.evicted = 0
+        return stats
+
+    def url_fetcher(self, url, **kwargs):
+        """WeasyPrint的url_fetcher，http(s)资源从缓存读取，其他协议交给WeasyPrint默认实现"""
+        if not url.startswith(('http://', 'https://')):
+            from weasyprint import default_url_fetcher
+            return default_url_fetcher(url, **kwargs)
+        asset = self.get(url)
+        if asset.status >= 400:
+            asset.close()
+            raise ValueError(f"资源获取失败 ({asset.status}): {url}")
+        mime_type, _, params = asset.content_type.partition(';')
+        charset = None
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'charset':
+                charset = value.strip('"\'')
+        result = {'mime_type': mime_type.strip(), 'encoding': charset, 'redirected_url': url}
+        if asset.response is not None:
+            # WeasyPrint读取完毕后会关闭 file_obj
+            result['file_obj'] = _ChunkReader(asset)
+        else:
+            result['string'] = asset.body
+        return result
+
+
+def proxy_url_fetcher(server_url):
+    """
+    返回通过 AssetServer 读取http(s)资源的WeasyPrint url_fetcher，
+    用于WeasyPrint渲染进程：子进程不共享父进程的内存缓存，但都经过父进程中的同一个代理
+    """
+    from weasyprint import default_url_fetcher
+
+    def fetcher(url, **kwargs):
+        if not url.startswith(('http://', 'https://')):
+            return default_url_fetcher(url, **kwargs)
+        result = default_url_fetcher(f"{server_url}/asset?url={quote(url, safe='')}", **kwargs)
+        # 相对地址仍按资源的原始地址解析
+        result['redirected_url'] = url
+        return result
+
+    return fetcher
+
+
+class _AssetHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        url = query.get('url', [None])[0]
+        if parts.path != '/asset' or not url or not url.startswith(('http://', 'https://')):
+            self.send_error(404)
+            return
+        try:
+            asset = self.server.cache.get(url)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"资源获取失败: {url} ({e})")
+            self.send_error(502)
+            return
+
+        if asset.response is not None:
+            self._send_stream(asset, url)
+            return
+
+        body = asset.body
+        # wkhtmltopdf读取的样式表中的资源引用也需要经过代理
+        if query.get('rewrite') and 'css' in asset.content_type.lower():
+            body = self.server.asset_server.rewrite_css(body.decode('utf-8', errors='replace'), url).encode('utf-8')
+        self.send_response(asset.status)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, asset, url):
+        """转发未缓存的大资源，不设置Content-Length，以关闭连接结束响应"""
+        self.close_connection = True
+        self.send_response(asset.status)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        chunks = asset.chunks()
+        try:
+            for chunk in chunks:
+                self.wfile.write(chunk)
+        except (requests.exceptions.RequestException, OSError) as e:
+            logger.debug(f"资源转发中断: {url} ({e})")
+        finally:
+            chunks.close()
+            asset.close()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AssetServer:
+    """
+    本机资源代理，把 AssetCache 提供给wkhtmltopdf和WeasyPrint渲染进程
+    只监听127.0.0.1；rewrite_html把HTML中的资源地址改写为代理地址
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _AssetHandler)
+        self.server.daemon_threads = True
+        self.server.cache = cache
+        self.server.asset_server = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def proxy_url(self, url, base_url, rewrite=True):
+        """返回资源的代理地址，data:等无需代理的地址原样返回"""
+        if not url.strip() or url.startswith('#'):
+            return url
+        absolute = urljoin(base_url, url.strip())
+        if not absolute.startswith(('http://', 'https://')) or absolute.startswith(self.base_url):
+            return url
+        return f"{self.base_url}/asset?url={quote(absolute, safe='')}" + ('&rewrite=1' if rewrite else '')
+
+    def rewrite_css(self, css, base_url):
+        """改写样式表中 url() 和 @import 引用的地址"""
+        def replace(match):
+            if match.group(3):
+                return f'{match.group(3)}"{self.proxy_url(match.group(5), base_url)}"'
+            return f'url("{self.proxy_url(match.group(2), base_url)}")'
+        return _CSS_URL_RE.sub(replace, css)
+
+    def rewrite_html(self, html_content, base_url):
+        """改写HTML中图片、脚本、样式表等资源以及<style>中的地址，页面链接（<a>）不变"""
+        def replace_attr(match):
+            return f'{match.group(1)}{match.group(2)}{self.proxy_url(match.group(3), base_url)}{match.group(2)}'
+
+        def replace_tag(match):
+            return _ATTR_RE.sub(replace_attr, match.group(0))
+
+        def replace_style(match):
+            return match.group(1) + self.rewrite_css(match.group(2), base_url) + match.group(3)
+
+        html_content = _TAG_RE.sub(replace_tag, html_content)
+        return _STYLE_BLOCK_RE.sub(replace_style, html_content)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
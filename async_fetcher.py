@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步网页获取模块
+基于asyncio和aiohttp并发获取大量网页，返回值与各转换器的get_webpage_content一致: (content, final_url)
+"""
+
+import asyncio
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from retry_policy import RETRY_STATUSES, CircuitOpenError
+from response_body import BodyLimits, BodyLimitError, CHUNK_BYTES
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+    logger.warning("aiohttp未安装，批量获取将退回到线程池方式")
+
+# aiohttp自行管理压缩和长连接，这些请求头不从requests会话中继承
+SKIPPED_HEADERS = {'accept-encoding', 'connection'}
+
+
+class AsyncFetcher:
+    def __init__(self, headers=None, limit=1000, limit_per_host=8, timeout=30, keepalive_timeout=30, cache=None,
+                 scheduler=None, retry_policy=None, body_limits=None, metrics=None):
+        """
+        limit: 同时进行中的请求总数上限
+        limit_per_host: 每个主机的连接数上限，连接在同一批次内保持复用
+        cache: 可选的 http_cache.ResponseCache，有缓存时发送条件请求
+        scheduler: 可选的 host_scheduler.HostScheduler，按主机控制请求间隔并遵守Retry-After
+        retry_policy: 可选的 retry_policy.RetryPolicy，超时、5xx和429时重试，连续失败的主机熔断
+        body_limits: 响应体的大小上限和允许的内容类型（response_body.BodyLimits），响应体按块读取
+        metrics: 可选的 metrics.ConversionMetrics，记录调度等待、等待响应、下载和解码的耗时
+        """
+        self.headers = {
+            key: value for key, value in (headers or {}).items()
+            if key.lower() not in SKIPPED_HEADERS
+        }
+        self.limit = max(1, limit)
+        self.limit_per_host = max(1, limit_per_host)
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.retry_policy = retry_policy
+        self.body_limits = body_limits or BodyLimits()
+        self.metrics = metrics
+
+    def create_session(self):
+        """创建带连接池限制的aiohttp会话"""
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def fetch(self, session, url, semaphore=None):
+        """
+        获取单个网页内容，返回 (content, final_url)；配置了retry_policy时按策略重试
+        semaphore: 可选的 asyncio.Semaphore，只在实际发送请求和读取响应时占用
+        """
+        try:
+            logger.info(f"正在获取网页内容: {url}")
+            if self.retry_policy is None:
+                return await self._fetch_once(session, url, semaphore)
+
+            policy = self.retry_policy
+            host = policy.check_circuit(url)
+            attempt = 0
+            while True:
+                try:
+                    result = await self._fetch_once(session, url, semaphore)
+                except aiohttp.ClientResponseError as e:
+                    if e.status not in RETRY_STATUSES:
+                        policy.breaker.record_success(host)
+                        raise
+                    # 每次的响应都已在_request中交给调度器，主机的冷却立即生效
+                    delay = policy.response_delay(attempt, e.status, e.headers or {})
+                    if delay is None:
+                        policy.breaker.record_failure(host)
+                        raise
+                    logger.warning(f"服务器返回 {e.status}，{delay:.1f}秒后重试 "
+                                   f"({attempt + 1}/{policy.max_retries}): {url}")
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if attempt >= policy.max_retries:
+                        policy.breaker.record_failure(host)
+                        raise
+                    delay = policy.delay(attempt)
+                    logger.warning(f"请求失败，{delay:.1f}秒后重试 ({attempt + 1}/{policy.max_retries}): {url} ({e!r})")
+                else:
+                    policy.breaker.record_success(host)
+                    return result
+
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError, BodyLimitError) as e:
+            logger.error(f"获取网页失败: {url} ({e})")
+            raise
+
+    async def _fetch_once(self, session, url, semaphore=None):
+        """按主机调度等待后发送一次请求，返回 (content, final_url)"""
+        if self.scheduler:
+            # 在占用并发名额之前等待，只推迟这个URL，其他主机的请求照常进行
+            await asyncio.to_thread(self.scheduler.check_robots, url)
+            delay = self.scheduler.reserve(url)
+            if delay > 0:
+                with timed(self.metrics, 'wait', url):
+                    await asyncio.sleep(delay)
+
+        if semaphore is None:
+            return await self._request(session, url)
+        async with semaphore:
+            return await self._request(session, url)
+
+    async def _request(self, session, url):
+        """发送请求并读取响应"""
+        cached = self.cache.get(url) if self.cache else None
+        with timed(self.metrics, 'response', url):
+            response = await session.get(url, headers=cached.revalidation_headers() if cached else None)
+        async with response:
+            if self.scheduler:
+                self.scheduler.note_response(url, response.status, response.headers)
+            if cached and response.status == 304:
+                logger.info(f"网页未修改，使用缓存: {url}")
+                self.cache.hit(cached)
+                if self.metrics:
+                    self.metrics.count('cache_hits')
+                    # 重定向过的地址从缓存返回时，渲染耗时同样记到请求地址的明细中
+                    self.metrics.link(cached.final_url, url)
+                return cached.content, cached.final_url
+            response.raise_for_status()
+            # 不是网页或Content-Length超过上限时不读取响应体，退出async with即断开连接
+            self.body_limits.check_headers(url, response.headers)
+            with self.body_limits.buffer(url) as body:
+                with timed(self.metrics, 'download', url):
+                    async for chunk in response.content.iter_chunked(CHUNK_BYTES):
+                        body.write(chunk)
+                with timed(self.metrics, 'decode', url):
+                    content, encoding = body.decode(charset=response.charset)
+            if self.metrics:
+                self.metrics.count('downloaded_bytes', body.size)
+                self.metrics.link(str(response.url), url)
+            if self.cache:
+                self.cache.store(url, content, response.url, encoding, response.headers)
+            return content, str(response.url)
+
+    async def fetch_all_async(self, urls, on_result=None, max_pending=None):
+        """
+        并发获取所有URL，返回与urls顺序一致的结果列表，失败的项为异常对象
+        on_result(index, result) 在每个URL完成时立即回调，便于后续阶段流水线处理；
+        提供on_result时网页内容只交给回调，结果列表中成功的项为None，不在整个批次期间保留所有网页
+        max_pending: 同时处于获取中或等待后续处理的URL上限；on_result返回 concurrent.futures.Future
+        （如提交的渲染任务）时，该URL在其完成前继续占用名额，后续阶段跟不上时暂停获取
+        """
+        semaphore = asyncio.Semaphore(self.limit)
+        pending = asyncio.Semaphore(max_pending) if max_pending else None
+        loop = asyncio.get_running_loop()
+        results = [None] * len(urls)
+
+        def release_pending(_):
+            try:
+                loop.call_soon_threadsafe(pending.release)
+            except RuntimeError:
+                # 事件循环已结束，不再有等待名额的URL
+                pass
+
+        async with self.create_session() as session:
+            async def run(index, url):
+                if pending is not None:
+                    await pending.acquire()
+                follow_up = None
+                try:
+                    try:
+                        result = await self.fetch(session, url, semaphore)
+                    except Exception as e:
+                        result = e
+                    results[index] = result if on_result is None or isinstance(result, Exception) else None
+                    if on_result:
+                        follow_up = on_result(index, result)
+                finally:
+                    if pending is not None:
+                        if isinstance(follow_up, Future):
+                            follow_up.add_done_callback(release_pending)
+                        else:
+                            pending.release()
+
+            await asyncio.gather(*(run(index, url) for index, url in enumerate(urls)))
+
+        return results
+
+    def fetch_all(self, urls, on_result=None, max_pending=None):
+        """同步入口，在新的事件循环中执行 fetch_all_async"""
+        return asyncio.run(self.fetch_all_async(urls, on_result, max_pending))
+
+
+def fetch_all(urls, headers=None, fallback=None, max_workers=8, on_result=None, **kwargs):
+    """
+    批量获取网页内容，返回与urls顺序一致的 (content, final_url) 或异常对象
+    aiohttp不可用时使用 fallback(url) 在线程池中获取
+    """
+    if AIOHTTP_AVAILABLE:
+        return AsyncFetcher(headers=headers, **kwargs).fetch_all(urls, on_result)
+
+    if fallback is None:
+        raise RuntimeError("aiohttp未安装，且未提供备用的获取函数")
+
+    def run(index, url):
+        try:
+            result = fallback(url)
+        except Exception as e:
+            result = e
+        if on_result:
+            on_result(index, result)
+            return result if isinstance(result, Exception) else None
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="fetch") as pool:
+        return list(pool.map(run, range(len(urls)), urls))
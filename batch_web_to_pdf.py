@@ -5,15 +5,33 @@
 从网页中获取链接，选择需要的链接，批量转换为PDF文件
 """
 
-import requests
 import os
 import sys
 import re
-from urllib.parse import urlparse, urljoin
-from datetime import datetime
+import time
+from urllib.parse import urljoin, urlsplit
 import logging
 from bs4 import BeautifulSoup
-import time
+import json
+import argparse
+import threading
+import contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from async_fetcher import AsyncFetcher, AIOHTTP_AVAILABLE
+from job_journal import JobJournal
+from link_filter import LinkFilter
+from http_cache import normalize_url
+from host_scheduler import HostScheduler, robots_crawl_delay
+from html_preprocess import enhance_html_for_chinese
+from pdf_merge import StreamingPDFMerger
+from output_paths import output_path
+from asset_cache import AssetCache
+from response_body import BodyLimits, DEFAULT_MAX_BYTES
+from metrics import ConversionMetrics, timed
+from profiling import ConversionProfiler, profiled
+from converter_core import (BROWSER_HEADERS, PDFKIT_OPTIONS, ConverterBase, HTMLRenderer, WkhtmltopdfRenderer,
+                            shared_session)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,63 +44,72 @@ except ImportError:
     PDFKIT_AVAILABLE = False
     logger.warning("pdfkit未安装，将使用HTML文件保存方式")
 
-class BatchWebToPDF:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        })
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+class BatchWebToPDF(ConverterBase):
+    def __init__(self, max_workers=4, render_workers=None, request_delay=1, async_fetch=None, limit_per_host=8,
+                 persistent_render=True, render_max_jobs=200, render_max_memory_mb=512, cache=None,
+                 render_cache=None, link_filter=None, burst=1, respect_crawl_delay=True, retry_policy=None,
+                 asset_cache=None, body_limits=None, metrics=None, profiler=None, max_pending=None):
+        # 并发配置：获取网页使用线程池或asyncio，渲染使用独立的有界池
+        # 每个渲染线程驱动一个wkhtmltopdf子进程，因此render_workers即同时运行的子进程上限
+        self.max_workers = max(1, max_workers)
+        self.render_workers = max(1, render_workers or min(self.max_workers, os.cpu_count() or 1))
+        self.request_delay = request_delay
+        # async_fetch为None时，aiohttp可用即启用异步获取
+        self.async_fetch = AIOHTTP_AVAILABLE if async_fetch is None else async_fetch and AIOHTTP_AVAILABLE
+        self.limit_per_host = limit_per_host
+        # 同时处于获取中或等待渲染的页面上限，渲染跟不上时暂停获取，内存占用不随批量大小增长
+        self.max_pending = max(1, max_pending or max(64, self.render_workers * 8))
+        
+        # 链接过滤规则在创建时编译一次，见 link_filter.LinkFilter
+        self.link_filter = link_filter or LinkFilter()
         
+        # 按主机调度请求：request_delay为同一主机的最小请求间隔，limit_per_host为每个主机的并发上限，
+        # 同时遵守Retry-After和robots.txt中的Crawl-delay
+        crawl_delay_lookup = None
+        if respect_crawl_delay:
+            crawl_delay_lookup = lambda url: robots_crawl_delay(self.session, url, self.fetcher.headers['User-Agent'])
+        self.scheduler = HostScheduler(min_interval=request_delay, burst=burst, max_per_host=limit_per_host,
+                                       crawl_delay_lookup=crawl_delay_lookup)
+        
+        # 先渲染为PDF，失败时保存为HTML。常驻wkhtmltopdf渲染池在首次渲染时创建，
+        # 找不到wkhtmltopdf时退回到pdfkit逐页启动进程
+        self.html_renderer = HTMLRenderer(preprocess=self.enhance_html_for_chinese)
+        self.pdf_renderer = None
+        renderers = [self.html_renderer]
         if PDFKIT_AVAILABLE:
-            self.pdfkit_options = {
-                'page-size': 'A4',
-                'margin-top': '0.75in',
-                'margin-right': '0.75in',
-                'margin-bottom': '0.75in',
-                'margin-left': '0.75in',
-                'encoding': "UTF-8",
-                'no-outline': None,
-                'enable-local-file-access': None,
-                'disable-smart-shrinking': None,
-                'no-stop-slow-scripts': None,
-                'load-error-handling': 'ignore',
-                'load-media-error-handling': 'ignore',
-                'javascript-delay': '1000',
-                'no-images': None,
-                'disable-javascript': None
-            }
+            self.pdfkit_options = dict(PDFKIT_OPTIONS)
+            self.pdf_renderer = WkhtmltopdfRenderer(self.pdfkit_options, persistent=persistent_render,
+                                                    pool_size=self.render_workers, max_jobs=render_max_jobs,
+                                                    max_memory_mb=render_max_memory_mb, asset_cache=asset_cache)
+            renderers.insert(0, self.pdf_renderer)
+        
+        # 获取、缓存、重试和剖析的装配见 converter_core.ConverterBase.setup_core；请求头模拟浏览器访问
+        # 每个URL各阶段的耗时和汇总，见 metrics.ConversionMetrics；每次批量转换或抓取开始时清零
+        self.setup_core(renderers, headers=BROWSER_HEADERS, cache=cache, render_cache=render_cache,
+                        retry_policy=retry_policy, asset_cache=asset_cache, body_limits=body_limits,
+                        metrics=metrics or ConversionMetrics(), profiler=profiler, scheduler=self.scheduler)
+        if self.profiler:
+            # 事件循环中并发的请求无法按URL分别剖析，改用线程获取
+            self.async_fetch = False
     
-    def get_webpage_content(self, url):
-        """获取网页内容"""
-        try:
-            logger.info(f"正在获取网页内容: {url}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            
-            if response.encoding == 'ISO-8859-1':
-                response.encoding = response.apparent_encoding
-            
-            if response.encoding.lower() not in ['utf-8', 'utf8']:
-                logger.info(f"检测到编码: {response.encoding}，转换为UTF-8")
-                content = response.content.decode(response.encoding, errors='replace')
-                content = content.encode('utf-8').decode('utf-8')
-            else:
-                content = response.text
-            
-            return content, response.url
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"获取网页失败: {e}")
-            raise
+    def get_webpage_contents(self, urls):
+        """并发获取多个网页内容，返回与urls顺序一致的 (content, final_url) 或异常对象"""
+        return self.fetcher.fetch_all(urls, max_workers=self.max_workers, limit_per_host=self.limit_per_host)
     
     def extract_links_from_page(self, url, html_content):
         """从网页中提取链接"""
         try:
+            if LXML_AVAILABLE:
+                unique_links = list(self.iter_links_from_page(url, html_content))
+                logger.info(f"从页面中提取到 {len(unique_links)} 个有效链接")
+                return unique_links
+            
             soup = BeautifulSoup(html_content, 'html.parser')
             links = []
             
@@ -114,28 +141,68 @@ class BatchWebToPDF:
             logger.error(f"提取链接失败: {e}")
             return []
     
+    def iter_links_from_page(self, url, html_content, chunk_size=64 * 1024):
+        """使用lxml增量解析HTML，逐个产生去重后的有效链接
+        
+        HTML分块送入解析器，已处理完的元素立即清除，内存占用不随页面大小增长
+        """
+        parser = etree.HTMLPullParser(events=('start', 'end'))
+        seen_urls = set()
+        # 当前位于几层<a>之内，<a>内部的元素要等<a>结束、取完文本后才能清除
+        open_links = 0
+        
+        def read_links():
+            nonlocal open_links
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if element.tag == 'a':
+                        open_links += 1
+                    continue
+                
+                if element.tag == 'a':
+                    open_links -= 1
+                    link = self._link_from_element(url, element, seen_urls)
+                    if link:
+                        yield link
+                
+                if open_links == 0:
+                    element.clear(keep_tail=True)
+                    # 根元素前可能有注释或<?xml?>等顶层兄弟节点，它们没有父元素，无需清除
+                    parent = element.getparent()
+                    if parent is not None:
+                        while element.getprevious() is not None:
+                            del parent[0]
+        
+        for offset in range(0, len(html_content), chunk_size):
+            parser.feed(html_content[offset:offset + chunk_size])
+            yield from read_links()
+        parser.close()
+        yield from read_links()
+    
+    def _link_from_element(self, url, element, seen_urls):
+        """将<a>元素转换为链接字典，无效或重复的链接返回None"""
+        href = element.get('href')
+        if href is None:
+            return None
+        
+        absolute_url = urljoin(url, href)
+        if absolute_url in seen_urls:
+            return None
+        
+        text = ''.join(part.strip() for part in element.itertext())
+        if not self.is_valid_link(absolute_url, text):
+            return None
+        
+        seen_urls.add(absolute_url)
+        return {
+            'url': absolute_url,
+            'text': text[:50] + '...' if len(text) > 50 else text,
+            'title': element.get('title', '')
+        }
+    
     def is_valid_link(self, url, text):
         """判断链接是否有效"""
-        invalid_patterns = [
-            r'javascript:',
-            r'mailto:',
-            r'tel:',
-            r'#',
-            r'\.(css|js|png|jpg|jpeg|gif|ico|pdf|zip|rar)$',
-            r'logout',
-            r'login',
-            r'admin',
-            r'\.(com|cn|org|net)/$'
-        ]
-        
-        for pattern in invalid_patterns:
-            if re.search(pattern, url, re.IGNORECASE):
-                return False
-        
-        if not text.strip():
-            return False
-        
-        return True
+        return self.link_filter.is_valid(url, text)
     
     def display_links(self, links):
         """显示链接列表供用户选择"""
@@ -183,143 +250,353 @@ class BatchWebToPDF:
                 print("\n操作被取消")
                 return []
     
+    def filter_links(self, links, include=None, exclude=None):
+        """按正则表达式筛选链接，代替交互式选择
+        
+        include: 正则列表，链接的URL或文本匹配任意一个即保留，为空时保留全部
+        exclude: 正则列表，匹配任意一个即排除
+        """
+        include = [re.compile(pattern) for pattern in include or []]
+        exclude = [re.compile(pattern) for pattern in exclude or []]
+        
+        selected_urls = []
+        for link in links:
+            fields = (link['url'], link['text'])
+            if include and not any(p.search(field) for p in include for field in fields):
+                continue
+            if any(p.search(field) for p in exclude for field in fields):
+                continue
+            selected_urls.append(link['url'])
+        return selected_urls
+    
     def convert_url_to_pdf(self, url, output_dir="batch_outputs"):
         """转换单个URL为PDF"""
         try:
             html_content, final_url = self.get_webpage_content(url)
-            
-            if PDFKIT_AVAILABLE:
-                try:
-                    output_path = self.generate_filename(final_url, output_dir, "pdf")
-                    self.convert_html_to_pdf(html_content, output_path)
-                    return output_path, "pdf"
-                except Exception as e:
-                    logger.warning(f"HTML转PDF失败，将保存为HTML: {e}")
-            
-            output_path = self.generate_filename(final_url, output_dir, "html")
-            self.save_as_html(html_content, output_path)
-            return output_path, "html"
+            return self.render_content(html_content, final_url, output_dir)
             
         except Exception as e:
             logger.error(f"转换失败: {e}")
             raise
     
+    def render_content(self, html_content, final_url, output_dir="batch_outputs"):
+        """将已获取的网页内容渲染为PDF，失败时保存为HTML"""
+        return self.core.render(html_content, final_url, output_dir)
+    
     def generate_filename(self, url, output_dir="batch_outputs", extension="pdf"):
-        """根据URL生成文件名"""
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            logger.info(f"创建输出目录: {output_dir}")
-        
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc.replace('.', '_')
-        path = parsed_url.path.strip('/').replace('/', '_') or 'index'
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{domain}_{path}_{timestamp}.{extension}"
-        
-        filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-        
-        return os.path.join(output_dir, filename)
+        """根据URL生成文件名，文件按URL哈希分散到子目录中，同一URL总是得到同一路径"""
+        return output_path(url, output_dir, extension)
     
     def save_as_html(self, html_content, output_path):
         """保存为HTML文件"""
         try:
-            enhanced_content = self.enhance_html_for_chinese(html_content)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(enhanced_content)
-            logger.info(f"HTML文件保存成功: {output_path}")
+            self.core.render_with(self.html_renderer, html_content, output_path)
             return True
         except Exception as e:
             logger.error(f"保存HTML文件失败: {e}")
             raise
     
     def enhance_html_for_chinese(self, html_content):
-        """增强HTML内容的中文支持"""
-        if '<meta charset=' not in html_content and '<meta http-equiv="Content-Type"' not in html_content:
-            if '<head>' in html_content:
-                html_content = html_content.replace('<head>', '<head>\n    <meta charset="UTF-8">')
-            elif '<head ' in html_content:
-                html_content = re.sub(r'(<head[^>]*>)', r'\1\n    <meta charset="UTF-8">', html_content)
-            else:
-                html_content = html_content.replace('<html>', '<html>\n<head>\n    <meta charset="UTF-8">\n</head>')
-        
-        font_css = """
-        <style>
-        body {
-            font-family: "Microsoft YaHei", "SimSun", "SimHei", "KaiTi", "FangSong", Arial, sans-serif;
-            line-height: 1.6;
-        }
-        </style>
-        """
-        
-        if '<head>' in html_content:
-            html_content = html_content.replace('<head>', '<head>' + font_css)
-        elif '<head ' in html_content:
-            html_content = re.sub(r'(<head[^>]*>)', r'\1' + font_css, html_content)
-        
-        return html_content
+        """增强HTML内容的中文支持，见 html_preprocess.enhance_html_for_chinese"""
+        return enhance_html_for_chinese(html_content)
     
-    def convert_html_to_pdf(self, html_content, output_path):
-        """将HTML内容转换为PDF"""
+    def convert_html_to_pdf(self, html_content, output_path, base_url=None):
+        """将HTML内容转换为PDF，base_url为页面地址，用于解析相对资源地址"""
+        if self.pdf_renderer is None:
+            raise RuntimeError("转换PDF需要安装pdfkit: pip install pdfkit")
         try:
-            logger.info(f"正在将HTML内容转换为PDF: {output_path}")
-            
-            temp_html = "temp_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".html"
-            with open(temp_html, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
-            try:
-                config = pdfkit.configuration(wkhtmltopdf=r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe')
-                pdfkit.from_file(temp_html, output_path, options=self.pdfkit_options, configuration=config)
-                logger.info(f"PDF文件生成成功: {output_path}")
-                return True
-            finally:
-                if os.path.exists(temp_html):
-                    os.remove(temp_html)
-                    
+            self.core.render_with(self.pdf_renderer, html_content, output_path, base_url)
+            return True
         except Exception as e:
             logger.error(f"HTML转PDF失败: {e}")
             raise
     
-    def batch_convert(self, urls, output_dir="batch_outputs"):
-        """批量转换URL列表"""
-        results = []
+    def get_render_pool(self):
+        """返回常驻渲染池，未启用或找不到wkhtmltopdf时返回None"""
+        return self.pdf_renderer.get_pool() if self.pdf_renderer else None
+    
+    def batch_convert(self, urls, output_dir="batch_outputs", max_workers=None, journal=None, merge_output=None):
+        """批量转换URL列表
+        
+        获取网页通过asyncio（或线程池）并发执行，渲染提交到独立的有界渲染池，
+        返回结果的顺序与输入URL的顺序一致
+        journal: 可选的 job_journal.JobJournal，记录每个URL的结果；已成功的URL直接取日志中的结果，不再转换
+        merge_output: 可选的PDF路径，转换完成后把所有PDF按输入顺序合并到该文件，每个URL一个书签
+        """
         total = len(urls)
+        results = [None] * total
+        
+        if journal is not None:
+            journal.add_urls(urls)
+            completed = journal.completed(urls)
+            for index, url in enumerate(urls):
+                if url in completed:
+                    results[index] = completed[url]
+            if completed:
+                print(f"\n任务日志中已完成 {len(completed)} 个链接，跳过")
+        
+        # 需要处理的URL在urls中的位置
+        todo = [index for index in range(total) if results[index] is None]
+        todo_urls = [urls[index] for index in todo]
+        self.metrics.reset()
+        if self.asset_cache:
+            self.asset_cache.reset_stats()
+        fetch_workers = max(1, min(max_workers or self.max_workers, len(todo) or 1))
         
-        print(f"\n开始批量转换 {total} 个链接...")
+        def record(index, result):
+            results[index] = result
+            if journal is not None:
+                journal.record(result)
+        
+        fetch_mode = f"asyncio, 每主机连接: {self.limit_per_host}" if self.async_fetch else f"获取线程: {fetch_workers}"
+        print(f"\n开始批量转换 {len(todo)} 个链接 ({fetch_mode}, 渲染线程: {self.render_workers})...")
         print("=" * 60)
         
-        for i, url in enumerate(urls, 1):
-            try:
-                print(f"\n[{i}/{total}] 正在转换: {url}")
+        with ThreadPoolExecutor(max_workers=self.render_workers, thread_name_prefix="render") as render_pool:
+            # 渲染完成时立即在渲染线程中记录结果，任务中断时已完成的页面不会丢失
+            def handle_rendered(index, future):
+                record(index, self._render_result(index, total, urls[index], future))
+            
+            # 两种获取方式都在当前线程中回调，获取完成即提交渲染，返回渲染任务；
+            # 每个页面在渲染完成前占用max_pending中的一个名额
+            def handle_fetched(position, outcome):
+                index = todo[position]
+                if isinstance(outcome, Exception):
+                    record(index, self._failed_result(index, total, urls[index], outcome))
+                    return None
                 
-                output_path, file_type = self.convert_url_to_pdf(url, output_dir)
+                html_content, final_url = outcome
+                render_future = render_pool.submit(self.render_content, html_content, final_url, output_dir)
+                render_future.add_done_callback(lambda future: handle_rendered(index, future))
+                return render_future
+            
+            if self.async_fetch:
+                fetcher = AsyncFetcher(headers=self.fetcher.headers, limit_per_host=self.limit_per_host,
+                                       cache=self.cache, scheduler=self.scheduler, retry_policy=self.retry_policy,
+                                       body_limits=self.fetcher.body_limits, metrics=self.metrics)
+                fetcher.fetch_all(todo_urls, on_result=handle_fetched, max_pending=self.max_pending)
+            else:
+                # 获取线程从调度器领取已经可以发送的URL，冷却中的主机不会占用线程
+                for position, url in enumerate(todo_urls):
+                    self.scheduler.add(position, url)
+                pending = threading.BoundedSemaphore(self.max_pending)
                 
-                file_size = os.path.getsize(output_path) / 1024
-                print(f"✅ 成功: {output_path} ({file_type.upper()}, {file_size:.2f} KB)")
+                def fetch_worker():
+                    while True:
+                        pending.acquire()
+                        started = time.perf_counter()
+                        ready = self.scheduler.next_ready()
+                        if ready is None:
+                            pending.release()
+                            return
+                        position, url = ready
+                        # 领取前不知道是哪个URL，等待调度器放行的耗时在领取后记到该URL上
+                        self.metrics.record('wait', time.perf_counter() - started, url)
+                        try:
+                            outcome = self._fetch_scheduled(url)
+                        except Exception as e:
+                            outcome = e
+                        render_future = handle_fetched(position, outcome)
+                        if render_future is None:
+                            pending.release()
+                        else:
+                            render_future.add_done_callback(lambda future: pending.release())
                 
-                results.append({
-                    'url': url,
-                    'output_path': output_path,
-                    'file_type': file_type,
-                    'file_size': file_size,
-                    'status': 'success'
-                })
+                with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch") as fetch_pool:
+                    for _ in range(fetch_workers):
+                        fetch_pool.submit(fetch_worker)
+        
+        if merge_output:
+            self.merge_results(results, merge_output)
+        return results
+    
+    def resume_batch(self, journal, output_dir="batch_outputs", retry_failed=True, merge_output=None):
+        """继续执行任务日志中未完成的URL（retry_failed为True时包括失败的URL），返回日志中全部结果"""
+        pending = journal.pending_urls(retry_failed)
+        if pending:
+            self.batch_convert(pending, output_dir, journal=journal)
+        else:
+            print("任务日志中没有需要处理的链接")
+        results = journal.results()
+        if merge_output:
+            self.merge_results(results, merge_output)
+        return results
+    
+    def merge_results(self, results, output_path):
+        """把结果中的PDF按顺序流式合并为一个文件，每个URL一个书签，返回合并的文档数"""
+        pdf_results = [r for r in results if r['status'] == 'success' and r['file_type'] == 'pdf']
+        skipped = sum(1 for r in results if r['status'] == 'success') - len(pdf_results)
+        if skipped:
+            logger.warning(f"{skipped} 个结果为HTML文件，不会合并")
+        
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        merged = 0
+        with StreamingPDFMerger(output_path) as merger:
+            for result in pdf_results:
+                try:
+                    merger.append(result['output_path'], result['url'])
+                    merged += 1
+                except Exception as e:
+                    logger.error(f"合并PDF失败: {result['output_path']} ({e})")
+        
+        print(f"\n📚 已合并 {merged} 个PDF: {output_path}")
+        return merged
+    
+    def _fetch_for_batch(self, url):
+        """批量模式下获取单个网页，等待调度器允许后再向该主机发送请求"""
+        with timed(self.metrics, 'wait', url):
+            self.scheduler.acquire(url)
+        return self._fetch_scheduled(url)
+    
+    def _fetch_scheduled(self, url):
+        """获取已由调度器放行的网页，完成后释放该主机的并发名额"""
+        try:
+            self.scheduler.check_robots(url)
+            # 每次收到的响应（包括重试前的429/503）都由获取器交给调度器，其他线程立即避开该主机；
+            # 重试前交还名额并重新领取，与异步获取遵守相同的冷却和请求间隔
+            return self.core.fetch(url, scheduled=True)
+        finally:
+            self.scheduler.release(url)
+    
+    def crawl(self, start_url, output_dir="batch_outputs", max_depth=2, max_pages=100, same_domain=True,
+              journal=None, merge_output=None):
+        """从start_url开始广度优先抓取并转换整个站点
+        
+        获取网页和提取链接在获取线程中进行，渲染提交到独立的渲染池，各阶段重叠执行；
+        待抓取队列按规范化URL去重，max_depth限制链接深度，max_pages限制加入队列的页面总数，
+        same_domain为True时只抓取与起始页面同一主机的链接；重定向到已处理页面的URL不再重复渲染
+        返回按发现顺序排列的结果列表，不包括重复的页面
+        journal: 可选的 job_journal.JobJournal；已成功的页面仍会获取以继续发现链接，但不再渲染
+        merge_output: 可选的PDF路径，按发现顺序把所有页面合并到该文件
+        """
+        completed = journal.completed() if journal is not None else {}
+        self.metrics.reset()
+        if self.asset_cache:
+            self.asset_cache.reset_stats()
+        allowed_hosts = {urlsplit(start_url).hostname}
+        frontier = deque([(start_url, 0)])
+        seen = {normalize_url(start_url)}
+        # 加入过队列的页面数，重定向后的地址只用于去重，不占用max_pages
+        queued = 1
+        # 已处理页面的规范化最终地址 -> 序号；duplicates为重定向到同一页面的 序号 -> 首个页面的序号
+        processed = {}
+        duplicates = {}
+        urls = []
+        results = {}
+        
+        def record(index, result):
+            results[index] = result
+            if journal is not None:
+                journal.record(result)
+        
+        def handle_rendered(index, future):
+            record(index, self._render_result(index, max_pages, urls[index], future))
+        
+        print(f"\n开始抓取站点: {start_url} (最大深度: {max_depth}, 最多页面: {max_pages}, "
+              f"获取线程: {self.max_workers}, 渲染线程: {self.render_workers})...")
+        print("=" * 60)
+        
+        with ThreadPoolExecutor(max_workers=self.render_workers, thread_name_prefix="render") as render_pool, \
+                ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetch") as fetch_pool:
+            in_flight = {}
+            
+            while frontier or in_flight:
+                # 保持获取线程忙碌，同时不一次性提交整个待抓取队列
+                while frontier and len(in_flight) < self.max_workers * 2:
+                    url, depth = frontier.popleft()
+                    index = len(urls)
+                    urls.append(url)
+                    if journal is not None:
+                        journal.add_urls([url])
+                    in_flight[fetch_pool.submit(self._fetch_and_extract, url)] = (index, depth)
                 
-                if i < total:
-                    time.sleep(1)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, depth = in_flight.pop(future)
+                    url = urls[index]
+                    try:
+                        html_content, final_url, links = future.result()
+                    except Exception as e:
+                        record(index, self._failed_result(index, max_pages, url, e))
+                        continue
+                    
+                    # 起始页面被重定向到其他主机（如加上www）时，该主机也视为站内
+                    if index == 0:
+                        allowed_hosts.add(urlsplit(final_url).hostname)
+                    final_key = normalize_url(final_url)
+                    seen.add(final_key)
+                    if final_key in processed:
+                        # 与已处理的页面重定向到同一地址，链接已经提取过，不再渲染到同一个输出文件
+                        logger.info(f"{url} 与 {urls[processed[final_key]]} 是同一页面，跳过")
+                        duplicates[index] = processed[final_key]
+                        continue
+                    processed[final_key] = index
                     
-            except Exception as e:
-                print(f"❌ 失败: {e}")
-                results.append({
-                    'url': url,
-                    'error': str(e),
-                    'status': 'failed'
-                })
+                    if depth < max_depth:
+                        for link in links:
+                            if queued >= max_pages:
+                                break
+                            if same_domain and urlsplit(link['url']).hostname not in allowed_hosts:
+                                continue
+                            key = normalize_url(link['url'])
+                            if key not in seen:
+                                seen.add(key)
+                                queued += 1
+                                frontier.append((link['url'], depth + 1))
+                    
+                    if url in completed:
+                        results[index] = completed[url]
+                        continue
+                    render_future = render_pool.submit(self.render_content, html_content, final_url, output_dir)
+                    render_future.add_done_callback(lambda future, index=index: handle_rendered(index, future))
         
+        if journal is not None:
+            # 重复的页面记为与首个页面相同的结果，恢复任务时不再处理
+            for index, original in duplicates.items():
+                journal.record(dict(results[original], url=urls[index]))
+        results = [results[index] for index in range(len(urls)) if index not in duplicates]
+        if merge_output:
+            self.merge_results(results, merge_output)
         return results
     
+    def _fetch_and_extract(self, url):
+        """抓取模式下获取网页并提取链接，返回 (content, final_url, links)"""
+        html_content, final_url = self._fetch_for_batch(url)
+        with profiled(self.profiler, 'parse', final_url):
+            links = self.extract_links_from_page(final_url, html_content)
+        return html_content, final_url, links
+    
+    def _render_result(self, index, total, url, future):
+        """根据渲染任务的结果打印并构造结果字典"""
+        try:
+            output_path, file_type = future.result()
+            file_size = os.path.getsize(output_path) / 1024
+            print(f"[{index + 1}/{total}] ✅ 成功: {url} -> {output_path} ({file_type.upper()}, {file_size:.2f} KB)")
+            self.metrics.finish(url, 'success', output_path=output_path, file_type=file_type, file_size=file_size)
+            
+            return {
+                'url': url,
+                'output_path': output_path,
+                'file_type': file_type,
+                'file_size': file_size,
+                'status': 'success'
+            }
+        except Exception as e:
+            return self._failed_result(index, total, url, e)
+    
+    def _failed_result(self, index, total, url, error):
+        """打印并构造失败结果"""
+        print(f"[{index + 1}/{total}] ❌ 失败: {url} -> {error}")
+        self.metrics.finish(url, 'failed', error=str(error))
+        return {
+            'url': url,
+            'error': str(error),
+            'status': 'failed'
+        }
+    
     def process_main_page(self, url):
         """处理主页面，提取链接并批量转换"""
         try:
@@ -358,6 +635,26 @@ class BatchWebToPDF:
         print(f"成功转换: {success_count}")
         print(f"转换失败: {failed_count}")
         
+        stats = self.pdf_renderer.stats() if self.pdf_renderer else None
+        if stats:
+            if stats['jobs']:
+                print(f"渲染任务: {stats['jobs']}，平均耗时: {stats['avg_time']:.2f}秒，"
+                      f"最长耗时: {stats['max_time']:.2f}秒，进程回收: {stats['recycled']}次")
+        
+        if self.asset_cache:
+            stats = self.asset_cache.stats()
+            if stats['hits'] or stats['misses']:
+                print(f"资源缓存: 命中 {stats['hits']}，未命中 {stats['misses']} (命中率 {stats['hit_rate']:.0%})，"
+                      f"节省下载: {stats['saved_mb']:.2f}MB，淘汰: {stats['evicted']}")
+        
+        summary = self.metrics.summary(include_urls=False)
+        if summary['stages']:
+            print(f"吞吐量: {summary['pages_per_second']:.2f} 页/秒")
+            print(f"{'阶段':<12}{'次数':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'最长':>9}")
+            for stage, item in summary['stages'].items():
+                print(f"{stage:<12}{item['count']:>6}{item['p50']:>8.2f}s{item['p95']:>8.2f}s"
+                      f"{item['p99']:>8.2f}s{item['max']:>8.2f}s")
+        
         if success_count > 0:
             total_size = sum(r['file_size'] for r in results if r['status'] == 'success')
             print(f"总文件大小: {total_size:.2f} KB")
@@ -375,8 +672,166 @@ class BatchWebToPDF:
             else:
                 print(f"{i}. ❌ {result['url']} -> {result['error']}")
 
-def main():
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="批量网页转PDF工具。不带参数运行时进入交互模式",
+    )
+    parser.add_argument('urls', nargs='*', help="要转换的URL")
+    parser.add_argument('-i', '--input', help="从文件读取URL，每行一个；'-' 表示标准输入")
+    parser.add_argument('-p', '--page', help="从该页面提取链接后批量转换")
+    parser.add_argument('--crawl', action='store_true', help="与 --page 一起使用，从该页面开始递归抓取整个站点")
+    parser.add_argument('--depth', type=int, default=2, help="抓取模式的最大链接深度 (默认: 2)")
+    parser.add_argument('--max-pages', type=int, default=100, help="抓取模式最多转换的页面数 (默认: 100)")
+    parser.add_argument('--any-domain', action='store_true', help="抓取模式下也跟随其他主机的链接")
+    parser.add_argument('--include', action='append', default=[], metavar='REGEX',
+                        help="只转换URL或链接文本匹配该正则的链接，可重复")
+    parser.add_argument('--exclude', action='append', default=[], metavar='REGEX',
+                        help="排除URL或链接文本匹配该正则的链接，可重复")
+    parser.add_argument('--allow-host', action='append', metavar='HOST', help="只保留这些主机（含子域名）的链接，可重复")
+    parser.add_argument('--deny-host', action='append', metavar='HOST', help="排除这些主机（含子域名）的链接，可重复")
+    parser.add_argument('--allow-path', action='append', metavar='PREFIX', help="只保留路径以此开头的链接，可重复")
+    parser.add_argument('--deny-path', action='append', metavar='PREFIX', help="排除路径以此开头的链接，可重复")
+    parser.add_argument('--deny-ext', action='append', metavar='EXT', help="排除该扩展名的链接，可重复")
+    parser.add_argument('--deny-query', action='append', metavar='REGEX', help="排除查询字符串匹配该正则的链接，可重复")
+    parser.add_argument('-o', '--output-dir', default="batch_outputs", help="输出目录 (默认: batch_outputs)")
+    parser.add_argument('-j', '--workers', type=int, default=4, help="获取网页的并发数 (默认: 4)")
+    parser.add_argument('--render-workers', type=int, help="渲染并发数 (默认: 与CPU核心数相关)")
+    parser.add_argument('--limit-per-host', type=int, default=8, help="每个主机的连接数上限 (默认: 8)")
+    parser.add_argument('--journal', help="任务日志文件 (SQLite)，重新运行时跳过已成功的URL")
+    parser.add_argument('--resume', action='store_true', help="只处理任务日志中未完成和失败的URL")
+    parser.add_argument('--asset-cache-mb', type=float, metavar='MB',
+                        help="渲染时共享缓存样式表、字体和图片，最多占用该大小的内存")
+    parser.add_argument('--max-page-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024), metavar='MB',
+                        help="单个网页的大小上限，超过时中止下载（默认: %(default).0f）")
+    parser.add_argument('--merge', metavar='PDF', help="另外把所有PDF合并为一个文件，每个URL一个书签（需要pypdf）")
+    parser.add_argument('--summary', help="将结果以JSON写入该文件；'-' 表示标准输出")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="将各阶段耗时和每个URL的明细写入该文件；扩展名为.prom时使用Prometheus文本格式，否则为JSON")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="剖析每个URL的获取、解析和渲染，cProfile结果和内存报告按URL保存到该目录（会明显变慢）")
+    args = parser.parse_args(argv)
+    if args.crawl:
+        # 抓取模式只从 --page 出发，其他URL来源和正则过滤不会生效
+        conflicts = [name for name, value in (('URL参数', args.urls), ('-i/--input', args.input),
+                                              ('--include', args.include), ('--exclude', args.exclude)) if value]
+        if conflicts:
+            parser.error(f"--crawl 不能与 {'、'.join(conflicts)} 一起使用，抓取范围请用 --allow-host/--deny-path 等选项限制")
+    return args
+
+def read_urls(source):
+    """从文件或标准输入读取URL，忽略空行和 # 开头的注释"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def normalize_input_url(url):
+    """补全协议"""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+def write_summary(results, destination):
+    """以JSON格式输出结果汇总"""
+    success_count = sum(1 for r in results if r['status'] == 'success')
+    summary = {
+        'total': len(results),
+        'success': success_count,
+        'failed': len(results) - success_count,
+        'results': results
+    }
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if destination == '-':
+        print(text)
+    else:
+        with open(destination, 'w', encoding='utf-8') as f:
+            f.write(text)
+        logger.info(f"结果汇总已写入: {destination}")
+
+def run_cli(args):
+    """非交互模式：转换命令行、文件或标准输入中的URL，返回退出码"""
+    # 汇总写到标准输出时，进度信息改写到标准错误，保证标准输出是合法的JSON
+    if args.summary == '-':
+        with contextlib.redirect_stdout(sys.stderr):
+            results, code = _run_batch(args)
+        if results is not None:
+            write_summary(results, '-')
+        return code
+    
+    results, code = _run_batch(args)
+    if results is not None and args.summary:
+        write_summary(results, args.summary)
+    return code
+
+def _run_batch(args):
+    """执行非交互批量转换，返回 (results, 退出码)"""
+    link_filter = LinkFilter(allow_hosts=args.allow_host, deny_hosts=args.deny_host,
+                             allow_paths=args.allow_path, deny_paths=args.deny_path,
+                             deny_extensions=args.deny_ext, deny_query=args.deny_query)
+    # 资源缓存与网页获取共用同一个连接池
+    asset_cache = AssetCache(max_size_mb=args.asset_cache_mb, session=shared_session()) if args.asset_cache_mb else None
+    converter = BatchWebToPDF(max_workers=args.workers, render_workers=args.render_workers,
+                              limit_per_host=args.limit_per_host, link_filter=link_filter, asset_cache=asset_cache,
+                              body_limits=BodyLimits(max_bytes=int(args.max_page_mb * 1024 * 1024)),
+                              profiler=ConversionProfiler(args.profile) if args.profile else None)
+    journal = JobJournal(args.journal) if args.journal else None
+    
+    try:
+        if args.resume:
+            if journal is None:
+                print("--resume 需要同时指定 --journal", file=sys.stderr)
+                return None, 2
+            results = converter.resume_batch(journal, args.output_dir, merge_output=args.merge)
+        elif args.crawl:
+            if not args.page:
+                print("--crawl 需要同时指定 --page", file=sys.stderr)
+                return None, 2
+            results = converter.crawl(normalize_input_url(args.page), args.output_dir, max_depth=args.depth,
+                                      max_pages=args.max_pages, same_domain=not args.any_domain,
+                                      journal=journal, merge_output=args.merge)
+        else:
+            urls = [normalize_input_url(url) for url in args.urls]
+            if args.input:
+                urls.extend(normalize_input_url(url) for url in read_urls(args.input))
+            
+            if args.page:
+                try:
+                    html_content, final_url = converter.get_webpage_content(normalize_input_url(args.page))
+                except Exception as e:
+                    print(f"获取页面失败: {args.page} ({e})", file=sys.stderr)
+                    return None, 1
+                links = converter.extract_links_from_page(final_url, html_content)
+                urls.extend(converter.filter_links(links, args.include, args.exclude))
+            elif args.include or args.exclude:
+                links = [{'url': url, 'text': ''} for url in urls]
+                urls = converter.filter_links(links, args.include, args.exclude)
+            
+            # 去重并保持顺序
+            urls = list(dict.fromkeys(urls))
+            if not urls:
+                print("未找到需要转换的URL", file=sys.stderr)
+                return None, 2
+            
+            results = converter.batch_convert(urls, args.output_dir, journal=journal, merge_output=args.merge)
+    finally:
+        if journal is not None:
+            journal.close()
+    
+    converter.show_batch_results(results)
+    if args.metrics:
+        converter.metrics.export(args.metrics)
+        logger.info(f"转换指标已写入: {args.metrics}")
+    return results, 0 if all(r['status'] == 'success' for r in results) else 1
+
+def main(argv=None):
     """主程序入口"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_cli(parse_args(argv))
+    
     print("=" * 60)
     print("批量网页转PDF工具")
     print("=" * 60)
@@ -444,4 +899,4 @@ def main():
             print("请稍后重试")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main()) 
\ No newline at end of file
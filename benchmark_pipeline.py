@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换流水线基准测试
+在本机HTTP服务上提供一组固定的测试页面（小页面、大页面、中文页面、多图片页面、多链接页面），
+按后端和并发数分别运行批量转换，测量吞吐量、单页耗时分位数和峰值内存；
+每种组合在单独的子进程中运行，峰值内存互不影响。结果可以保存为基准，之后的运行与基准比较
+用法:
+    python benchmark_pipeline.py                          运行所有可用的后端，并发数 1 4 8
+    python benchmark_pipeline.py -b html -c 1 8 -r 10     指定后端、并发数和轮数
+    python benchmark_pipeline.py --save-baseline          保存为基准
+    python benchmark_pipeline.py --compare                与基准比较，性能下降超过阈值时返回1
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import struct
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import ConversionMetrics, quantile
+
+# 测试页面的内容或组成变化时递增，版本不同的基准不做比较
+CORPUS_VERSION = 1
+SEED = 20240601
+BACKENDS = ('html', 'wkhtmltopdf', 'weasyprint')
+BASELINE_PATH = 'benchmark_baseline.json'
+
+ENGLISH_WORDS = ('performance pipeline render fetch decode document browser network stream buffer cache '
+                 'latency throughput worker process memory format convert output layout style').split()
+CHINESE_TEXT = ('网页转换工具将页面内容保存为文档格式支持中文字体和批量处理获取解析渲染输出'
+                '性能测试并发吞吐延迟内存缓存编码样式表格图片链接段落标题列表数据结果')
+
+
+def _sentence(rng, chinese_ratio):
+    if rng.random() < chinese_ratio:
+        return ''.join(rng.choice(CHINESE_TEXT) for _ in range(rng.randint(20, 60))) + '。'
+    return ' '.join(rng.choice(ENGLISH_WORDS) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+
+
+def _paragraphs(rng, size_bytes, chinese_ratio):
+    """生成约size_bytes字节（UTF-8）的段落"""
+    parts = []
+    size = 0
+    while size < size_bytes:
+        paragraph = '<p>' + ' '.join(_sentence(rng, chinese_ratio) for _ in range(rng.randint(3, 6))) + '</p>\n'
+        parts.append(paragraph)
+        size += len(paragraph.encode('utf-8'))
+    return ''.join(parts)
+
+
+def _page(title, body, head=''):
+    return f'<!DOCTYPE html>\n<html>\n<head>\n<title>{title}</title>{head}\n</head>\n<body>\n{body}</body>\n</html>\n'
+
+
+def _png(width, height, rgb):
+    """生成纯色PNG图片"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + bytes(rgb) * width
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height)) + chunk(b'IEND', b''))
+
+
+def build_corpus():
+    """返回 {路径: (Content-Type, 内容)}，同一CORPUS_VERSION下内容完全相同"""
+    rng = random.Random(SEED)
+    corpus = {}
+
+    def add_page(path, html_content, encoding='utf-8', content_type='text/html; charset=utf-8'):
+        corpus[path] = (content_type, html_content.encode(encoding))
+
+    add_page('/small.html', _page('小页面', _paragraphs(rng, 8 * 1024, 0.3)))
+
+    table = ''.join(f'<tr><td>{i}</td><td>{_sentence(rng, 0.2)}</td><td>{rng.random():.6f}</td></tr>\n'
+                    for i in range(2000))
+    add_page('/large.html', _page('大页面', _paragraphs(rng, 4 * 1024 * 1024, 0.2) + f'<table>\n{table}</table>\n'))
+
+    # 响应头不声明编码，由<meta charset>决定，覆盖编码识别和GB18030解码
+    add_page('/cjk.html', _page('中文页面', _paragraphs(rng, 512 * 1024, 0.95), '\n<meta charset="gbk">'),
+             encoding='gb18030', content_type='text/html')
+
+    images = ''.join(f'<figure><img src="/img/{i}.png" width="64" height="64"><figcaption>{_sentence(rng, 0.5)}'
+                     f'</figcaption></figure>\n' for i in range(60))
+    add_page('/images.html', _page('多图片页面', images + _paragraphs(rng, 16 * 1024, 0.3),
+                                   '\n<link rel="stylesheet" href="/style.css">'))
+    for i in range(60):
+        corpus[f'/img/{i}.png'] = ('image/png', _png(64, 64, (i * 4 % 256, 128, 255 - i * 4 % 256)))
+    corpus['/style.css'] = ('text/css', b'figure { display: inline-block; margin: 4px; }\n')
+
+    links = ''.join(f'<li><a href="/section/{i}/page-{rng.randint(1, 10 ** 6)}.html">{_sentence(rng, 0.3)}</a></li>\n'
+                    for i in range(3000))
+    add_page('/links.html', _page('多链接页面', f'<ul>\n{links}</ul>\n'))
+    return corpus
+
+
+PAGE_PATHS = ('/small.html', '/large.html', '/cjk.html', '/images.html', '/links.html')
+
+
+class CorpusServer:
+    """在本机回环地址上提供测试页面的HTTP服务，latency为每个请求额外的延迟（秒）"""
+
+    def __init__(self, corpus, latency=0.0):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                entry = corpus.get(self.path.split('?', 1)[0])
+                if latency:
+                    time.sleep(latency)
+                if entry is None:
+                    self.send_error(404)
+                    return
+                content_type, body = entry
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, name='corpus-server', daemon=True)
+        self.thread.start()
+
+    def urls(self, rounds):
+        """每轮请求全部页面；查询参数区分各轮，输出文件不会互相覆盖"""
+        return [f'{self.base_url}{path}?round={r}' for r in range(rounds) for path in PAGE_PATHS]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def backend_unavailable(backend):
+    """返回后端不可用的原因，可用时返回None"""
+    if backend == 'wkhtmltopdf':
+        try:
+            import pdfkit  # noqa: F401
+        except ImportError:
+            return 'pdfkit未安装'
+        from render_pool import find_wkhtmltopdf
+        try:
+            find_wkhtmltopdf()
+        except OSError as e:
+            return str(e)
+    elif backend == 'weasyprint':
+        try:
+            import weasyprint  # noqa: F401
+        except (ImportError, OSError) as e:
+            return f'weasyprint不可用: {e}'
+    return None
+
+
+def peak_rss_mb():
+    """返回 (当前进程峰值内存, 已结束子进程的峰值内存)，单位MB；无法获取时为None"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        # Linux下ru_maxrss的单位是KB，macOS下是字节
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return own / (1024 * 1024), children / (1024 * 1024)
+    try:
+        import psutil
+        peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    except ImportError:
+        peak = None
+    return (peak / (1024 * 1024) if peak else None), None
+
+
+def run_case(backend, concurrency, rounds, latency_ms=0):
+    """在当前进程中运行一种组合，返回结果字典；由 --case 在子进程中调用"""
+    # 各转换器导入时配置了INFO级日志，基准测试只关心结果
+    logging.disable(logging.WARNING)
+
+    server = CorpusServer(build_corpus(), latency_ms / 1000)
+    output_dir = tempfile.mkdtemp(prefix='net2pdf-bench-')
+    metrics = ConversionMetrics()
+    urls = server.urls(rounds)
+    try:
+        start = time.perf_counter()
+        if backend == 'weasyprint':
+            from web_to_pdf import WebToPDF
+            converter = WebToPDF(render_workers=concurrency, metrics=metrics)
+            outcomes = converter.convert_urls_to_pdf(urls, output_dir)
+            failed = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+        else:
+            from batch_web_to_pdf import BatchWebToPDF
+            converter = BatchWebToPDF(max_workers=concurrency, render_workers=concurrency, request_delay=0,
+                                      limit_per_host=concurrency, respect_crawl_delay=False, metrics=metrics)
+            if backend == 'html':
+                # 只保存HTML，测量获取、解码和预处理本身
+                converter.core.renderers = [converter.html_renderer]
+            with contextlib.redirect_stdout(io.StringIO()):
+                outcomes = converter.batch_convert(urls, output_dir)
+            failed = sum(1 for outcome in outcomes if outcome['status'] != 'success')
+        elapsed = time.perf_counter() - start
+        converter.core.close()
+    finally:
+        server.close()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    summary = metrics.summary()
+    latencies = sorted(record['total'] for record in summary['urls'] if record.get('status') == 'success')
+    own_rss, children_rss = peak_rss_mb()
+    return {
+        'backend': backend,
+        'concurrency': concurrency,
+        'pages': len(urls),
+        'failed': failed,
+        'seconds': elapsed,
+        'pages_per_second': len(urls) / elapsed,
+        'latency': {f'p{q * 100:g}': quantile(latencies, q) if latencies else None for q in (0.5, 0.95, 0.99)},
+        'stages_p50': {stage: item['p50'] for stage, item in summary['stages'].items()},
+        'peak_rss_mb': own_rss,
+        'peak_children_rss_mb': children_rss,
+    }
+
+
+def run_isolated(backend, concurrency, rounds, latency_ms=0):
+    """在新的Python进程中运行一种组合，峰值内存只包含这一组合"""
+    command = [sys.executable, os.path.abspath(__file__), '--case', backend, str(concurrency),
+               '--rounds', str(rounds), '--latency-ms', str(latency_ms)]
+    completed = subprocess.run(command, capture_output=True, text=True, encoding='utf-8',
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"{backend} (并发 {concurrency}) 运行失败:\n{completed.stderr.strip()}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """与基准比较，返回性能下降的说明列表"""
+    baseline_results = {(item['backend'], item['concurrency']): item for item in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = baseline_results.get((result['backend'], result['concurrency']))
+        if base is None:
+            continue
+        name = f"{result['backend']} (并发 {result['concurrency']})"
+        if result['pages_per_second'] < base['pages_per_second'] * (1 - tolerance):
+            regressions.append(f"{name} 吞吐量 {result['pages_per_second']:.2f} 页/秒，"
+                               f"基准 {base['pages_per_second']:.2f} 页/秒")
+        p95, base_p95 = result['latency']['p95'], base['latency']['p95']
+        if p95 is not None and base_p95 and p95 > base_p95 * (1 + tolerance):
+            regressions.append(f"{name} p95耗时 {p95:.3f}秒，基准 {base_p95:.3f}秒")
+        rss, base_rss = result['peak_rss_mb'], base.get('peak_rss_mb')
+        if rss is not None and base_rss and rss > base_rss * (1 + tolerance):
+            regressions.append(f"{name} 峰值内存 {rss:.0f}MB，基准 {base_rss:.0f}MB")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'后端':<14}{'并发':>4}{'页数':>6}{'失败':>5}{'页/秒':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'峰值内存':>10}")
+    for result in results:
+        latency = result['latency']
+        cells = ''.join(f"{latency[key]:>8.3f}s" if latency[key] is not None else f"{'-':>9}"
+                        for key in ('p50', 'p95', 'p99'))
+        rss = f"{result['peak_rss_mb']:>8.0f}MB" if result['peak_rss_mb'] is not None else f"{'-':>10}"
+        print(f"{result['backend']:<14}{result['concurrency']:>4}{result['pages']:>6}{result['failed']:>5}"
+              f"{result['pages_per_second']:>9.2f}{cells}{rss}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="转换流水线基准测试：本机固定页面，按后端和并发数测量吞吐量、耗时和内存")
+    parser.add_argument('-b', '--backend', nargs='+', choices=BACKENDS, default=list(BACKENDS),
+                        help="要测试的后端，不可用的后端自动跳过（默认: 全部）")
+    parser.add_argument('-c', '--concurrency', nargs='+', type=int, default=[1, 4, 8], help="并发数（默认: 1 4 8）")
+    parser.add_argument('-r', '--rounds', type=int, default=4, help="每种组合请求全部页面的轮数（默认: 4）")
+    parser.add_argument('--latency-ms', type=float, default=0, help="本机服务每个请求额外的延迟，模拟网络")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help=f"基准文件（默认: {BASELINE_PATH}）")
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基准")
+    parser.add_argument('--compare', action='store_true', help="与基准比较，性能下降超过阈值时返回1")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="允许的性能波动比例（默认: 0.15）")
+    parser.add_argument('--output', help="把本次结果以JSON写入该文件")
+    parser.add_argument('--case', nargs=2, metavar=('BACKEND', 'CONCURRENCY'), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.case:
+        # 子进程：运行一种组合，最后一行输出JSON结果
+        result = run_case(args.case[0], int(args.case[1]), args.rounds, args.latency_ms)
+        print(json.dumps(result))
+        return 0
+
+    results = []
+    for backend in args.backend:
+        reason = backend_unavailable(backend)
+        if reason:
+            print(f"跳过 {backend}: {reason}")
+            continue
+        for concurrency in args.concurrency:
+            print(f"运行 {backend} (并发 {concurrency})...", flush=True)
+            results.append(run_isolated(backend, concurrency, args.rounds, args.latency_ms))
+
+    report = {
+        'corpus_version': CORPUS_VERSION,
+        'rounds': args.rounds,
+        'latency_ms': args.latency_ms,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    print()
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基准已保存: {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"\n基准文件不存在: {args.baseline}", file=sys.stderr)
+            return 2
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if (baseline.get('corpus_version'), baseline.get('rounds'), baseline.get('latency_ms')) != \
+                (CORPUS_VERSION, args.rounds, args.latency_ms):
+            print("\n基准的测试页面版本、轮数或延迟与本次不同，不做比较", file=sys.stderr)
+            return 2
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n与基准相比性能下降（阈值 {args.tolerance:.0%}）:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\n与基准相比没有超过 {args.tolerance:.0%} 的性能下降")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
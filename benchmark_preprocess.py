@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML预处理性能测试
+在多MB的页面上比较 html_preprocess.enhance_html_for_chinese 与原先逐步 in / replace / re.sub 的实现，
+输出耗时和峰值内存
+用法: python benchmark_preprocess.py [页面大小MB ...]
+"""
+
+import re
+import sys
+import time
+import tracemalloc
+
+from html_preprocess import enhance_html_for_chinese
+
+LEGACY_FONT_CSS = """
+        <style>
+        body {
+            font-family: "Microsoft YaHei", "SimSun", "SimHei", "KaiTi", "FangSong", Arial, sans-serif;
+            line-height: 1.6;
+        }
+        </style>
+        """
+
+
+def legacy_enhance_html_for_chinese(html_content):
+    """原先 batch_web_to_pdf.py 和 web_to_pdf_enhanced.py 中的实现"""
+    if '<meta charset=' not in html_content and '<meta http-equiv="Content-Type"' not in html_content:
+        if '<head>' in html_content:
+            html_content = html_content.replace('<head>', '<head>\n    <meta charset="UTF-8">')
+        elif '<head ' in html_content:
+            html_content = re.sub(r'(<head[^>]*>)', r'\1\n    <meta charset="UTF-8">', html_content)
+        else:
+            html_content = html_content.replace('<html>', '<html>\n<head>\n    <meta charset="UTF-8">\n</head>')
+
+    if '<head>' in html_content:
+        html_content = html_content.replace('<head>', '<head>' + LEGACY_FONT_CSS)
+    elif '<head ' in html_content:
+        html_content = re.sub(r'(<head[^>]*>)', r'\1' + LEGACY_FONT_CSS, html_content)
+
+    return html_content
+
+
+def make_page(size_mb, head):
+    """生成约size_mb大小、以head开头的中英文混合页面"""
+    paragraph = '<p>网页转PDF工具 benchmark paragraph，包含中文和 English text。</p>\n'
+    count = int(size_mb * 1024 * 1024 / len(paragraph.encode('utf-8')))
+    return f'<!DOCTYPE html>\n<html>\n{head}\n<body>\n{paragraph * count}</body>\n</html>\n'
+
+
+def measure(func, html_content, repeat=5):
+    """返回 (最短耗时秒数, 峰值内存MB)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html_content)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / (1024 * 1024)
+
+
+def main(argv=None):
+    sizes = [float(arg) for arg in (argv if argv is not None else sys.argv[1:])] or [1, 5, 20]
+    heads = {
+        '<head>': '<head><title>测试</title></head>',
+        '<head lang>': '<head lang="zh-CN"><title>测试</title></head>',
+        '无<head>': '',
+    }
+
+    print(f"{'页面':<16}{'大小':>8}{'原实现':>12}{'新实现':>12}{'加速':>8}{'原峰值内存':>12}{'新峰值内存':>12}")
+    for size_mb in sizes:
+        for name, head in heads.items():
+            page = make_page(size_mb, head)
+            # 两种实现插入的内容相同，只是meta和style的先后顺序不同
+            assert '<meta charset="UTF-8">' in enhance_html_for_chinese(page)[:4096]
+
+            legacy_time, legacy_peak = measure(legacy_enhance_html_for_chinese, page)
+            new_time, new_peak = measure(enhance_html_for_chinese, page)
+            print(f"{name:<16}{size_mb:>6.0f}MB{legacy_time * 1000:>10.1f}ms{new_time * 1000:>10.1f}ms"
+                  f"{legacy_time / new_time:>7.1f}x{legacy_peak:>10.1f}MB{new_peak:>10.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
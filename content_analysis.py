@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网页内容分析
+用正则按连续片段统计中日韩文字的数量，不逐个字符循环，并据此推断页面语言和字体
+"""
+
+import re
+
+HAN = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'    # 汉字（含扩展A和兼容汉字）
+KANA = '\u3040-\u30ff\u31f0-\u31ff'                # 平假名、片假名
+HANGUL = '\u1100-\u11ff\u3130-\u318f\uac00-\ud7af'  # 韩文
+
+# 字符类的重复匹配在正则引擎内部完成，按连续片段返回，不逐个字符进入解释器
+_CJK_RE = re.compile(f'[{HAN}{KANA}{HANGUL}]+')
+_KANA_RE = re.compile(f'[{KANA}]+')
+_HANGUL_RE = re.compile(f'[{HANGUL}]+')
+
+# 各语言的字体，后面的字体在前面的字体缺字时使用
+FONT_FAMILIES = {
+    'zh': '"Microsoft YaHei", "SimSun", "SimHei", "KaiTi", "FangSong", "Noto Sans CJK SC", Arial, sans-serif',
+    'ja': '"Yu Gothic", "Meiryo", "MS Gothic", "Noto Sans CJK JP", Arial, sans-serif',
+    'ko': '"Malgun Gothic", "Gulim", "Noto Sans CJK KR", Arial, sans-serif',
+}
+DEFAULT_LANGUAGE = 'zh'
+
+
+def analyze_scripts(text):
+    """
+    统计文本中各种文字的字符数，返回 {'han': n, 'kana': n, 'hangul': n, 'language': 'zh'/'ja'/'ko'/None}
+    """
+    if text.isascii():
+        han = kana = hangul = 0
+    else:
+        # 先取出所有中日韩文字，再只在这部分中统计较少见的假名和韩文
+        cjk = ''.join(_CJK_RE.findall(text))
+        kana = sum(map(len, _KANA_RE.findall(cjk))) if _KANA_RE.search(cjk) else 0
+        hangul = sum(map(len, _HANGUL_RE.findall(cjk))) if _HANGUL_RE.search(cjk) else 0
+        han = len(cjk) - kana - hangul
+
+    stats = {'han': han, 'kana': kana, 'hangul': hangul}
+    if hangul and hangul >= han:
+        language = 'ko'
+    elif kana and kana * 10 >= han:
+        # 日文中汉字往往多于假名，假名占到汉字的十分之一即视为日文
+        language = 'ja'
+    elif han:
+        language = 'zh'
+    else:
+        language = None
+    stats['language'] = language
+    return stats
+
+
+def font_family_for(stats):
+    """按分析结果返回CSS font-family，没有分析结果或没有中日韩文字时使用中文字体"""
+    language = stats.get('language') if stats else None
+    return FONT_FAMILIES.get(language or DEFAULT_LANGUAGE)
@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换流水线核心
+一次转换分为获取、预处理、渲染三个环节，每个环节都可以替换：
+HttpFetcher 负责获取和解码，预处理是 html -> html 的函数，渲染器（Renderer）负责生成文件；
+各转换器都由这里的组件组装，所有HTTP请求共用同一个连接池
+"""
+
+import os
+import time
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from async_fetcher import fetch_all
+from output_paths import output_path, atomic_path, temp_path_for
+from response_body import BodyLimits, BodyLimitError, CHUNK_BYTES
+from metrics import timed
+from profiling import profiled, profiler_from_env
+from render_pool import RenderPool, DEFAULT_WKHTMLTOPDF
+from weasyprint_pool import WeasyPrintPool, load_stylesheets
+from asset_cache import AssetServer
+from retry_policy import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pdfkit
+    PDFKIT_AVAILABLE = True
+except ImportError:
+    PDFKIT_AVAILABLE = False
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/91.0.4472.124 Safari/537.36')
+# 模拟浏览器的完整请求头
+BROWSER_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+# wkhtmltopdf渲染已获取的HTML时的选项：不加载图片、不执行脚本，避免渲染时再次访问网络
+PDFKIT_OPTIONS = {
+    'page-size': 'A4',
+    'margin-top': '0.75in',
+    'margin-right': '0.75in',
+    'margin-bottom': '0.75in',
+    'margin-left': '0.75in',
+    'encoding': "UTF-8",
+    'no-outline': None,
+    'enable-local-file-access': None,
+    'disable-smart-shrinking': None,
+    'no-stop-slow-scripts': None,
+    'load-error-handling': 'ignore',
+    'load-media-error-handling': 'ignore',
+    'javascript-delay': '1000',
+    'no-images': None,
+    'disable-javascript': None
+}
+# 共享连接池中每个主机保留的连接数
+POOL_MAXSIZE = 32
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def shared_session():
+    """
+    返回进程内共享的requests会话，所有转换器的请求复用同一个连接池
+    各转换器的请求头随请求传入，不修改会话本身的请求头
+    """
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = USER_AGENT
+            _shared_session = session
+        return _shared_session
+
+
+class HttpFetcher:
+    """
+    获取网页内容，返回 (content, final_url)
+    headers: 本获取器的请求头，默认只设置User-Agent
+    cache: 可选的 http_cache.ResponseCache，有缓存时发送条件请求
+    retry_policy: 超时、5xx和429按指数退避重试，连续失败的主机会被熔断
+    body_limits: 响应体的大小上限和允许的内容类型（response_body.BodyLimits），响应体按块读取
+    metrics: 可选的 metrics.ConversionMetrics，记录等待响应、下载和解码的耗时
+    scheduler: 可选的 host_scheduler.HostScheduler，每次收到响应（包括重试前的响应）都交给它处理Retry-After
+    """
+
+    def __init__(self, headers=None, cache=None, retry_policy=None, session=None, timeout=30, body_limits=None,
+                 metrics=None, scheduler=None):
+        self.session = session or shared_session()
+        self.headers = dict(headers or {'User-Agent': USER_AGENT})
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.timeout = timeout
+        self.body_limits = body_limits or BodyLimits()
+        self.metrics = metrics
+        self.scheduler = scheduler
+
+    def fetch(self, url, scheduled=False):
+        """
+        获取一个网页
+        scheduled: 调用方已通过 scheduler.acquire 领取了该主机的并发名额；重试前交还名额，
+        等待后重新领取，重试与首次请求一样遵守主机的冷却和请求间隔
+        """
+        try:
+            logger.info(f"正在获取网页内容: {url}")
+            cached = self.cache.get(url) if self.cache else None
+            headers = dict(self.headers)
+            if cached:
+                headers.update(cached.revalidation_headers())
+            on_response = wait = None
+            if self.scheduler:
+                on_response = lambda response: self.scheduler.note_response(url, response.status_code,
+                                                                            response.headers)
+                if scheduled:
+                    wait = lambda delay: self._wait_scheduled(url, delay)
+            with timed(self.metrics, 'response', url):
+                response = self.retry_policy.get(self.session, url, timeout=self.timeout, headers=headers,
+                                                 stream=True, on_response=on_response, wait=wait)
+            with response:
+                if cached and response.status_code == 304:
+                    logger.info(f"网页未修改，使用缓存: {url}")
+                    self.cache.hit(cached)
+                    if self.metrics:
+                        self.metrics.count('cache_hits')
+                        # 重定向过的地址从缓存返回时，渲染耗时同样记到请求地址的明细中
+                        self.metrics.link(cached.final_url, url)
+                    return cached.content, cached.final_url
+                response.raise_for_status()
+
+                # 不是网页或Content-Length超过上限时不读取响应体，关闭响应即断开连接
+                self.body_limits.check_headers(url, response.headers)
+                with self.body_limits.buffer(url) as body:
+                    with timed(self.metrics, 'download', url):
+                        for chunk in response.iter_content(CHUNK_BYTES):
+                            body.write(chunk)
+                    # 依次根据BOM、响应头和<meta charset>确定编码，只解码一次
+                    with timed(self.metrics, 'decode', url):
+                        content, encoding = body.decode(response.headers.get('Content-Type'))
+
+            if self.metrics:
+                self.metrics.count('downloaded_bytes', body.size)
+                self.metrics.link(response.url, url)
+
+            if self.cache:
+                self.cache.store(url, content, response.url, encoding, response.headers)
+
+            return content, response.url
+
+        except (requests.exceptions.RequestException, BodyLimitError) as e:
+            logger.error(f"获取网页失败: {e}")
+            raise
+
+    def _wait_scheduled(self, url, delay):
+        """重试前交还主机的并发名额，退避后重新向调度器领取"""
+        self.scheduler.release(url)
+        try:
+            time.sleep(delay)
+        finally:
+            with timed(self.metrics, 'wait', url):
+                self.scheduler.acquire(url)
+
+    def fetch_all(self, urls, **kwargs):
+        """并发获取多个网页，返回与urls顺序一致的 (content, final_url) 或异常对象"""
+        return fetch_all(urls, headers=self.headers, fallback=self.fetch, cache=self.cache,
+                         retry_policy=self.retry_policy, body_limits=self.body_limits, metrics=self.metrics, **kwargs)
+
+
+class Renderer:
+    """
+    渲染器基类
+    extension: 输出文件的扩展名
+    prepare(html_content, base_url) 渲染前处理HTML，返回处理后的HTML
+    render(html_content, output_path, base_url) 生成文件，失败时抛出异常
+    """
+    extension = 'pdf'
+    name = 'renderer'
+
+    def prepare(self, html_content, base_url=None):
+        return html_content
+
+    def render(self, html_content, output_path, base_url=None):
+        raise NotImplementedError
+
+    def cache_settings(self, base_url=None):
+        """影响输出结果的设置，与HTML一起计入渲染缓存键；返回None表示不使用渲染缓存"""
+        return None
+
+    def close(self):
+        pass
+
+
+class WeasyPrintRenderer(Renderer):
+    """
+    WeasyPrint渲染
+    workers大于1时使用预热的进程池，否则在当前进程中渲染，样式表和字体配置只解析一次
+    """
+    name = 'WeasyPrint'
+
+    def __init__(self, css_content, workers=1, asset_cache=None):
+        self.css_content = css_content
+        self.workers = max(1, workers)
+        self.asset_cache = asset_cache
+        self.asset_server = None
+        self.pool = None
+        self.font_config = None
+        self.stylesheets = None
+
+    def get_pool(self):
+        """返回WeasyPrint渲染池，首次调用时创建"""
+        if self.pool is None:
+            # 渲染进程不共享内存中的资源缓存，通过本机代理读取
+            if self.asset_cache and self.asset_server is None:
+                self.asset_server = AssetServer(self.asset_cache)
+            self.pool = WeasyPrintPool(self.css_content, size=self.workers,
+                                       asset_server_url=self.asset_server.base_url if self.asset_server else None)
+        return self.pool
+
+    def render(self, html_content, output_path, base_url=None):
+        if self.workers > 1:
+            # 交给预热过的渲染进程
+            self.get_pool().render(html_content, output_path, base_url)
+            return
+
+        from weasyprint import HTML
+
+        if self.stylesheets is None:
+            self.font_config, self.stylesheets = load_stylesheets(self.css_content)
+        kwargs = {'url_fetcher': self.asset_cache.url_fetcher} if self.asset_cache else {}
+        HTML(string=html_content, base_url=base_url, **kwargs).write_pdf(
+            output_path, stylesheets=self.stylesheets, font_config=self.font_config
+        )
+
+    def submit(self, html_content, output_path, base_url=None):
+        """提交到渲染进程池，返回Future，结果为渲染耗时（秒）"""
+        return self.get_pool().submit(html_content, output_path, base_url)
+
+    def cache_settings(self, base_url=None):
+        # 相对路径的资源依赖base_url，因此也计入缓存键
+        return (self.css_content, base_url)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.asset_server is not None:
+            self.asset_server.close()
+            self.asset_server = None
+
+
+class WkhtmltopdfRenderer(Renderer):
+    """
+    wkhtmltopdf按HTML内容渲染
+    persistent为True时使用常驻渲染进程池，找不到wkhtmltopdf时退回到pdfkit逐页启动进程；
+    HTML不写临时文件：常驻进程从本机HTTP服务读取，pdfkit通过标准输入传入
+    """
+    name = 'wkhtmltopdf'
+
+    def __init__(self, options, persistent=True, pool_size=1, max_jobs=200, max_memory_mb=512,
+                 binary=DEFAULT_WKHTMLTOPDF, asset_cache=None):
+        self.options = options
+        self.persistent = persistent
+        self.pool_size = max(1, pool_size)
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.binary = binary
+        self.asset_cache = asset_cache
+        self.asset_server = None
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def get_pool(self):
+        """返回常驻渲染池，未启用或找不到wkhtmltopdf时返回None"""
+        if not self.persistent:
+            return None
+        with self.lock:
+            if self.pool is None:
+                try:
+                    self.pool = RenderPool(size=self.pool_size, max_jobs=self.max_jobs,
+                                           max_memory_mb=self.max_memory_mb)
+                except OSError as e:
+                    logger.warning(f"无法启动常驻渲染进程，将使用pdfkit: {e}")
+                    self.persistent = False
+            return self.pool
+
+    def get_asset_server(self):
+        """返回资源缓存的本机代理，首次调用时启动"""
+        with self.lock:
+            if self.asset_server is None:
+                self.asset_server = AssetServer(self.asset_cache)
+            return self.asset_server
+
+    def prepare(self, html_content, base_url=None):
+        if self.asset_cache and base_url:
+            # 资源地址改写为本机代理地址，wkhtmltopdf经共享缓存读取样式表、字体和图片
+            html_content = self.get_asset_server().rewrite_html(html_content, base_url)
+        return html_content
+
+    def render(self, html_content, output_path, base_url=None):
+        pool = self.get_pool()
+        if pool is not None:
+            pool.render_string(html_content, output_path, self.options)
+        else:
+            config = pdfkit.configuration(wkhtmltopdf=self.binary)
+            pdfkit.from_string(html_content, output_path, options=self.options, configuration=config)
+
+    def cache_settings(self, base_url=None):
+        # 相对路径的资源按base_url解析，与WeasyPrintRenderer一样计入缓存键
+        return (self.options, base_url)
+
+    def stats(self):
+        """返回常驻渲染池的统计，未启用时返回None"""
+        return self.pool.stats() if self.pool is not None else None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.asset_server is not None:
+            self.asset_server.close()
+            self.asset_server = None
+
+
+class WkhtmltopdfURLRenderer(Renderer):
+    """
+    wkhtmltopdf直接按URL渲染（base_url即页面地址），页面由wkhtmltopdf自行获取，可以执行页面脚本
+    binary为None时由pdfkit在PATH中查找wkhtmltopdf
+    """
+    name = 'wkhtmltopdf (URL)'
+
+    def __init__(self, options, binary=None):
+        self.options = options
+        self.binary = binary
+
+    def render(self, html_content, output_path, base_url=None):
+        if not base_url:
+            raise ValueError("按URL渲染需要页面地址")
+        config = pdfkit.configuration(wkhtmltopdf=self.binary) if self.binary else None
+        pdfkit.from_url(base_url, output_path, options=self.options, configuration=config)
+
+
+class HTMLRenderer(Renderer):
+    """
+    保存为HTML文件，作为无法生成PDF时的后备
+    preprocess: 可选的 html -> html 函数，保存前调用
+    """
+    extension = 'html'
+    name = 'HTML'
+
+    def __init__(self, preprocess=None):
+        self.preprocess = preprocess
+
+    def prepare(self, html_content, base_url=None):
+        if self.preprocess is not None:
+            html_content = self.preprocess(html_content)
+        return html_content
+
+    def render(self, html_content, output_path, base_url=None):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+
+
+class RenderJob:
+    """ConverterCore.submit 返回的渲染任务，future为None表示已从渲染缓存取得"""
+    __slots__ = ('future', 'renderer', 'temp_path', 'output_path', 'cache_key', 'base_url')
+
+    def __init__(self, future, renderer, temp_path, output_path, cache_key, base_url):
+        self.future = future
+        self.renderer = renderer
+        self.temp_path = temp_path
+        self.output_path = output_path
+        self.cache_key = cache_key
+        self.base_url = base_url
+
+
+class ConverterCore:
+    """
+    转换流水线：获取 -> 预处理 -> 渲染
+    renderers: 按顺序尝试的渲染器，前一个失败时使用下一个
+    preprocessors: 渲染前依次调用的 html -> html 函数
+    render_cache: 可选的 render_cache.RenderCache，HTML和渲染设置都未变化时直接使用已渲染的文件
+    metrics: 可选的 metrics.ConversionMetrics，记录预处理和渲染耗时以及每个URL的结果
+    profiler: 可选的 profiling.ConversionProfiler，按URL剖析获取、解析和渲染三个环节
+    """
+
+    def __init__(self, fetcher, renderers, preprocessors=(), render_cache=None, metrics=None, profiler=None):
+        self.fetcher = fetcher
+        self.renderers = list(renderers)
+        self.preprocessors = list(preprocessors)
+        self.render_cache = render_cache
+        self.metrics = metrics
+        self.profiler = profiler
+
+    def fetch(self, url, scheduled=False):
+        """scheduled见 HttpFetcher.fetch"""
+        with profiled(self.profiler, 'fetch', url):
+            html_content, final_url = self.fetcher.fetch(url, scheduled=scheduled)
+        if self.profiler:
+            self.profiler.link(final_url, url)
+        return html_content, final_url
+
+    def preprocess(self, html_content, url=None):
+        if not self.preprocessors:
+            return html_content
+        with timed(self.metrics, 'preprocess', url), profiled(self.profiler, 'parse', url):
+            for preprocessor in self.preprocessors:
+                html_content = preprocessor(html_content)
+        return html_content
+
+    def render_cache_key(self, renderer, html_content, base_url=None):
+        """返回渲染缓存键，未启用渲染缓存或渲染器不支持时返回None"""
+        if not self.render_cache:
+            return None
+        settings = renderer.cache_settings(base_url)
+        if settings is None:
+            return None
+        return self.render_cache.key_for(html_content, *settings)
+
+    def render_with(self, renderer, html_content, output_path, base_url=None):
+        """用指定的渲染器生成output_path，先写到临时文件，完成后再替换"""
+        logger.info(f"正在使用{renderer.name}生成文件: {output_path}")
+        cache_key = self.render_cache_key(renderer, html_content, base_url)
+        if cache_key and self.render_cache.fetch(cache_key, output_path):
+            if self.metrics:
+                self.metrics.count('render_cache_hits')
+            return output_path
+
+        with timed(self.metrics, 'preprocess', base_url), profiled(self.profiler, 'parse', base_url):
+            prepared = renderer.prepare(html_content, base_url)
+        with timed(self.metrics, 'render', base_url), profiled(self.profiler, 'render', base_url), \
+                atomic_path(output_path) as temp_path:
+            renderer.render(prepared, temp_path, base_url)
+        logger.info(f"文件生成成功: {output_path}")
+        if self.metrics and base_url:
+            self.metrics.annotate(base_url, renderer=renderer.name)
+        if cache_key:
+            self.render_cache.store(cache_key, output_path)
+        return output_path
+
+    def submit(self, renderer, html_content, output_path, base_url=None):
+        """
+        提交到支持 submit 的渲染器（如WeasyPrint进程池），立即返回 RenderJob，由finish等待结果；
+        与render_with一样先查渲染缓存，渲染写到临时文件，完成后再替换
+        """
+        cache_key = self.render_cache_key(renderer, html_content, base_url)
+        if cache_key and self.render_cache.fetch(cache_key, output_path):
+            if self.metrics:
+                self.metrics.count('render_cache_hits')
+            return RenderJob(None, renderer, None, output_path, None, base_url)
+
+        with timed(self.metrics, 'preprocess', base_url), profiled(self.profiler, 'parse', base_url):
+            prepared = renderer.prepare(html_content, base_url)
+        temp_path = temp_path_for(output_path)
+        return RenderJob(renderer.submit(prepared, temp_path, base_url), renderer, temp_path, output_path,
+                         cache_key, base_url)
+
+    def finish(self, job, url=None):
+        """
+        等待submit提交的渲染完成，返回输出路径；失败时删除临时文件并抛出异常
+        url不为None时记录该URL的最终状态
+        """
+        try:
+            if job.future is not None:
+                try:
+                    elapsed = job.future.result()
+                    os.replace(job.temp_path, job.output_path)
+                finally:
+                    if os.path.exists(job.temp_path):
+                        os.remove(job.temp_path)
+                logger.info(f"文件生成成功: {job.output_path} ({elapsed:.2f}秒)")
+                if self.metrics:
+                    # 渲染在进程池中进行，使用渲染进程返回的耗时
+                    self.metrics.record('render', elapsed, job.base_url)
+                    if job.base_url:
+                        self.metrics.annotate(job.base_url, renderer=job.renderer.name)
+                if job.cache_key:
+                    self.render_cache.store(job.cache_key, job.output_path)
+        except Exception as e:
+            if self.metrics and url is not None:
+                self.metrics.finish(url, 'failed', error=str(e))
+            raise
+        if self.metrics and url is not None:
+            self.metrics.finish(url, 'success', output_path=job.output_path,
+                                file_size=os.path.getsize(job.output_path))
+        return job.output_path
+
+    def render(self, html_content, final_url, output_dir):
+        """依次尝试各渲染器，返回 (output_path, 扩展名)，全部失败时抛出最后一个异常"""
+        html_content = self.preprocess(html_content, final_url)
+        for position, renderer in enumerate(self.renderers):
+            path = output_path(final_url, output_dir, renderer.extension)
+            try:
+                return self.render_with(renderer, html_content, path, final_url), renderer.extension
+            except Exception as e:
+                if position + 1 == len(self.renderers):
+                    logger.error(f"{renderer.name}生成失败: {e}")
+                    raise
+                logger.warning(f"{renderer.name}生成失败，将使用{self.renderers[position + 1].name}: {e}")
+                if self.metrics:
+                    self.metrics.count('render_fallbacks')
+
+    def convert(self, url, output_dir):
+        """获取并转换一个URL，返回 (output_path, 扩展名)"""
+        try:
+            html_content, final_url = self.fetch(url)
+            path, extension = self.render(html_content, final_url, output_dir)
+        except Exception as e:
+            if self.metrics:
+                self.metrics.finish(url, 'failed', error=str(e))
+            raise
+        if self.metrics:
+            self.metrics.finish(url, 'success', output_path=path, file_size=os.path.getsize(path))
+        return path, extension
+
+    def close(self):
+        for renderer in self.renderers:
+            renderer.close()
+
+
+class ConverterBase:
+    """
+    各转换器共用的获取和渲染装配，子类在 __init__ 中调用 setup_core，只传入与其他转换器不同的设置
+    """
+
+    def setup_core(self, renderers, headers=None, cache=None, render_cache=None, retry_policy=None,
+                   asset_cache=None, body_limits=None, metrics=None, profiler=None, scheduler=None):
+        """
+        创建获取器和转换流水线，所有转换器共用同一个连接池
+        renderers: 按顺序尝试的渲染器
+        headers: 请求头，默认只设置User-Agent
+        cache: 可选的 http_cache.ResponseCache，重复获取时只需条件请求
+        render_cache: 可选的 render_cache.RenderCache，HTML未变化时直接使用已渲染的文件
+        retry_policy: 超时、5xx和429按指数退避重试，连续失败的主机会被熔断
+        asset_cache: 可选的 asset_cache.AssetCache，所有页面的样式表、字体和图片经本机代理共享缓存
+        body_limits: 可选的 response_body.BodyLimits，限制单个网页的大小和内容类型
+        metrics: 可选的 metrics.ConversionMetrics，记录每个URL各阶段的耗时
+        profiler: 可选的 profiling.ConversionProfiler，未指定时由环境变量 NET2PDF_PROFILE 启用
+        scheduler: 可选的 host_scheduler.HostScheduler，接收每次响应以遵守Retry-After
+        """
+        self.cache = cache
+        self.render_cache = render_cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.asset_cache = asset_cache
+        self.metrics = metrics
+        self.profiler = profiler or profiler_from_env()
+        self.fetcher = HttpFetcher(headers=headers, cache=cache, retry_policy=self.retry_policy,
+                                   body_limits=body_limits, metrics=metrics, scheduler=scheduler)
+        self.session = self.fetcher.session
+        self.core = ConverterCore(self.fetcher, renderers, render_cache=render_cache, metrics=metrics,
+                                  profiler=self.profiler)
+
+    def get_webpage_content(self, url):
+        """获取网页内容，返回 (content, final_url)"""
+        return self.core.fetch(url)
+
+    def get_webpage_contents(self, urls):
+        """并发获取多个网页内容，返回与urls顺序一致的 (content, final_url) 或异常对象"""
+        return self.fetcher.fetch_all(urls)
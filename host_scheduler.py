@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按主机的请求调度
+每个主机有独立的令牌桶（最小请求间隔+突发量）和并发上限，遵守Retry-After和robots.txt中的Crawl-delay；
+批量获取时优先把请求发给空闲的主机，繁忙的主机冷却时不占用获取线程
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+logger = logging.getLogger(__name__)
+
+# 这些状态码的响应携带Retry-After时，在指定时间内暂停向该主机发送请求
+RETRY_AFTER_STATUSES = {429, 503}
+# 没有Retry-After时的默认冷却时间（秒）
+DEFAULT_RETRY_AFTER = 30
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+    """解析Retry-After头，支持秒数和HTTP日期两种格式"""
+    if not value:
+        return default
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def robots_crawl_delay(session, url, user_agent='*', timeout=10):
+    """读取URL所在站点robots.txt中的Crawl-delay，没有时返回None"""
+    parts = urlsplit(url)
+    try:
+        response = session.get(f"{parts.scheme}://{parts.netloc}/robots.txt", timeout=timeout)
+    except Exception as e:
+        logger.debug(f"读取robots.txt失败: {e}")
+        return None
+    if response.status_code != 200:
+        return None
+    parser = RobotFileParser()
+    parser.parse(response.text.splitlines())
+    return parser.crawl_delay(user_agent)
+
+
+class _HostState:
+    __slots__ = ('tat', 'active', 'blocked_until', 'crawl_delay', 'queue', 'robots_checked')
+
+    def __init__(self):
+        # tat: 令牌桶（GCRA）的理论到达时间
+        self.tat = 0.0
+        self.active = 0
+        self.blocked_until = 0.0
+        self.crawl_delay = 0.0
+        self.queue = deque()
+        self.robots_checked = False
+
+
+class HostScheduler:
+    """
+    按主机的礼貌调度器，可以在多个线程之间共享
+    min_interval: 同一主机两次请求之间的最小间隔（秒）
+    burst: 允许连续发出而不等待的请求数
+    max_per_host: 每个主机同时进行的请求数上限
+    crawl_delay_lookup: 可选的 callable(url)，返回站点的Crawl-delay（秒）或None，每个主机只调用一次
+    """
+
+    def __init__(self, min_interval=1.0, burst=1, max_per_host=2, crawl_delay_lookup=None):
+        self.min_interval = max(0.0, min_interval or 0.0)
+        self.burst = max(1, burst)
+        self.max_per_host = max(1, max_per_host)
+        self.crawl_delay_lookup = crawl_delay_lookup
+        self.cond = threading.Condition()
+        self.hosts = {}
+        self.pending = 0
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = _HostState()
+        return state
+
+    def _interval(self, state):
+        return max(self.min_interval, state.crawl_delay)
+
+    def _ready_at(self, state):
+        """该主机下一个请求最早可以发出的时间"""
+        return max(state.blocked_until, state.tat - (self.burst - 1) * self._interval(state))
+
+    def _take(self, state, now):
+        state.tat = max(state.tat, now) + self._interval(state)
+
+    def check_robots(self, url):
+        """首次遇到主机时读取其Crawl-delay，网络请求在锁外进行"""
+        if self.crawl_delay_lookup is None:
+            return
+        host = host_of(url)
+        with self.cond:
+            state = self._state(host)
+            if state.robots_checked:
+                return
+            state.robots_checked = True
+
+        delay = self.crawl_delay_lookup(url)
+        if delay:
+            logger.info(f"{host} 的Crawl-delay: {delay}秒")
+            with self.cond:
+                state.crawl_delay = float(delay)
+
+    def reserve(self, url):
+        """预约一次请求，返回需要等待的秒数；不计入并发数，适用于asyncio等自行控制并发的场景"""
+        with self.cond:
+            state = self._state(host_of(url))
+            now = time.monotonic()
+            start = max(now, self._ready_at(state))
+            self._take(state, start)
+            return start - now
+
+    def acquire(self, url):
+        """阻塞直到可以向该主机发送请求，完成后必须调用release"""
+        with self.cond:
+            state = self._state(host_of(url))
+            while True:
+                now = time.monotonic()
+                ready_at = self._ready_at(state)
+                if state.active < self.max_per_host and ready_at <= now:
+                    self._take(state, now)
+                    state.active += 1
+                    return
+                self.cond.wait(timeout=max(0.0, ready_at - now) if state.active < self.max_per_host else None)
+
+    def release(self, url):
+        with self.cond:
+            self._state(host_of(url)).active -= 1
+            self.cond.notify_all()
+
+    def add(self, item, url):
+        """加入待调度队列，由next_ready按主机空闲情况取出"""
+        with self.cond:
+            self._state(host_of(url)).queue.append((item, url))
+            self.pending += 1
+            self.cond.notify_all()
+
+    def next_ready(self):
+        """
+        取出下一个可以立即发送的 (item, url)，计入并发数，完成后必须调用release
+        所有主机都在冷却时等待最早可用的那个；队列为空时返回None
+        """
+        with self.cond:
+            while True:
+                if self.pending == 0:
+                    return None
+
+                now = time.monotonic()
+                best, best_at = None, None
+                for state in self.hosts.values():
+                    if state.queue and state.active < self.max_per_host:
+                        ready_at = self._ready_at(state)
+                        if best is None or ready_at < best_at:
+                            best, best_at = state, ready_at
+
+                if best is not None and best_at <= now:
+                    self.pending -= 1
+                    self._take(best, now)
+                    best.active += 1
+                    return best.queue.popleft()
+
+                self.cond.wait(timeout=None if best is None else best_at - now)
+
+    def note_response(self, url, status, headers=None):
+        """根据429/503响应及其Retry-After让该主机冷却"""
+        if status not in RETRY_AFTER_STATUSES:
+            return
+        delay = parse_retry_after((headers or {}).get('Retry-After'))
+        logger.warning(f"{host_of(url)} 返回 {status}，{delay:.0f}秒内暂停请求")
+        with self.cond:
+            state = self._state(host_of(url))
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+            self.cond.notify_all()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网页编码识别
+依次检查BOM、Content-Type中的charset和前几KB中的<meta charset>，都没有时只对开头的一段内容做统计检测；
+确定编码后只解码一次
+"""
+
+import re
+import codecs
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:
+    from_bytes = None
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# 只在开头这么多字节中查找<meta charset>，HTML规范要求声明出现在前1024字节内，这里适当放宽
+META_SCAN_BYTES = 4096
+# 统计检测只使用开头这么多字节
+DETECT_SAMPLE_BYTES = 64 * 1024
+# 常见的声明编码按其超集解码，网页中的GB2312/GBK内容经常包含超出声明范围的字符
+# 键为 codecs.lookup 规范化后的名称（latin-1 规范化为 iso8859-1）
+SUPERSETS = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'iso8859-1': 'cp1252', 'ascii': 'cp1252'}
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+_META_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def _normalize(name):
+    """返回Python可用的编码名，无法识别时返回None"""
+    if not name:
+        return None
+    try:
+        name = codecs.lookup(name).name
+    except LookupError:
+        return None
+    return SUPERSETS.get(name, name)
+
+
+def detect_encoding(sample):
+    """统计检测编码：优先使用charset_normalizer，没有安装时使用chardet，都没有时返回None"""
+    if from_bytes is not None:
+        best = from_bytes(sample).best()
+        return best.encoding if best is not None else None
+    if chardet is not None:
+        return chardet.detect(sample).get('encoding')
+    return None
+
+
+def charset_from_content_type(content_type):
+    """从Content-Type头中取出charset，没有时返回None"""
+    match = _CHARSET_RE.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def resolve_encoding(body, content_type=None, charset=None):
+    """
+    确定响应体的编码，返回 (encoding, 来源)
+    charset: 已解析出的响应头charset，未提供时从content_type中提取
+    与之前的处理一致，响应头中的ISO-8859-1视为未声明（多为服务器默认值），继续按页面内容判断
+    body可以是bytes、bytearray或内存映射，只读取开头的一段
+    """
+    sample = bytes(body[:DETECT_SAMPLE_BYTES])
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, 'bom'
+
+    declared = charset or charset_from_content_type(content_type)
+    if declared and declared.lower() not in ('iso-8859-1', 'latin-1', 'latin1'):
+        encoding = _normalize(declared)
+        if encoding:
+            return encoding, 'header'
+
+    match = _META_RE.search(sample, 0, META_SCAN_BYTES)
+    if match:
+        encoding = _normalize(match.group(1).decode('ascii', errors='ignore'))
+        # 声明为UTF-16的HTML实际已按ASCII兼容编码读出了meta，不可能是UTF-16
+        if encoding and not encoding.startswith('utf-16'):
+            return encoding, 'meta'
+
+    try:
+        sample.decode('utf-8')
+        return 'utf-8', 'detected'
+    except UnicodeDecodeError as e:
+        # 截断处可能切断一个多字节字符
+        if e.start >= len(sample) - 3 and len(body) > len(sample):
+            return 'utf-8', 'detected'
+
+    detected = detect_encoding(sample)
+    if detected:
+        return _normalize(detected) or 'utf-8', 'detected'
+
+    return _normalize(declared) or 'utf-8', 'default'
+
+
+def decode_html(body, content_type=None, charset=None):
+    """解码响应体，返回 (content, encoding)"""
+    encoding, source = resolve_encoding(body, content_type, charset)
+    if encoding not in ('utf-8', 'utf-8-sig'):
+        logger.info(f"检测到编码: {encoding} ({source})，转换为UTF-8")
+    return str(body, encoding, errors='replace'), encoding
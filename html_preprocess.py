@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML预处理
+在<head>中插入charset声明和字体样式：插入位置只查找一次，所有内容拼成一段后一次性插入，
+整个文档只复制一次；各转换器共用
+"""
+
+import re
+
+from content_analysis import FONT_FAMILIES, DEFAULT_LANGUAGE
+
+DEFAULT_FONT_FAMILY = FONT_FAMILIES[DEFAULT_LANGUAGE]
+
+CHARSET_META = '\n    <meta charset="UTF-8">'
+FONT_CSS = """
+        <style>
+        body {
+            font-family: %s;
+            line-height: 1.6;
+        }
+        </style>
+        """
+
+_HEAD_RE = re.compile(r'<head\b[^>]*>', re.IGNORECASE)
+_HTML_RE = re.compile(r'<html\b[^>]*>', re.IGNORECASE)
+_CHARSET_DECLARED_RE = re.compile(r'<meta\b[^>]*?(?:charset\s*=|http-equiv\s*=\s*["\']?content-type)', re.IGNORECASE)
+
+
+def inject_head(html_content, snippet, charset=True):
+    """
+    把snippet插入到<head>开头，charset为True且文档未声明编码时同时插入 <meta charset="UTF-8">
+    没有<head>时在<html>后新建一个；两者都没有时原样返回
+    """
+    head = _HEAD_RE.search(html_content)
+    if head is not None:
+        tag = head.group(0)
+        if charset:
+            # 编码声明只会出现在<head>中，只检查到</head>为止
+            head_end = html_content.find('</head', head.end())
+            if _CHARSET_DECLARED_RE.search(html_content, head.end(),
+                                           head_end if head_end != -1 else len(html_content)) is None:
+                snippet = CHARSET_META + snippet
+    else:
+        html_tag = _HTML_RE.search(html_content)
+        if html_tag is None:
+            return html_content
+        tag = html_tag.group(0)
+        # 没有<head>的文档中的charset声明也不在<head>中，按整个文档检查
+        if charset and _CHARSET_DECLARED_RE.search(html_content) is None:
+            snippet = CHARSET_META + snippet
+        snippet = f"\n<head>{snippet}\n</head>"
+
+    # 第一个匹配的标签就是第一次出现的位置，replace只替换一次，只生成一个新字符串
+    return html_content.replace(tag, tag + snippet, 1)
+
+
+def enhance_html_for_chinese(html_content, font_family=DEFAULT_FONT_FAMILY):
+    """确保HTML声明了UTF-8编码，并加入中日韩字体样式"""
+    return inject_head(html_content, FONT_CSS % font_family)
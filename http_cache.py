@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网页响应磁盘缓存
+按规范化后的URL保存网页内容、最终URL、编码以及ETag/Last-Modified，
+再次获取时发送条件请求，服务器返回304即直接使用缓存内容
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """规范化URL：协议和主机小写，去掉默认端口和片段，查询参数排序"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else '')
+        host = f"{userinfo}@{host}"
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+class CacheEntry:
+    """一条缓存记录"""
+
+    def __init__(self, key, content, final_url, encoding, etag=None, last_modified=None):
+        self.key = key
+        self.content = content
+        self.final_url = final_url
+        self.encoding = encoding
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def revalidation_headers(self):
+        """返回条件请求头"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    按URL缓存网页响应的磁盘缓存，超过max_size_mb时按最近使用时间淘汰
+    可以在多个线程和多个转换器之间共享
+    """
+
+    def __init__(self, cache_dir=".http_cache", max_size_mb=500):
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # key -> [大小, 最近使用时间]
+        self.index = {}
+        self.total_size = 0
+        self._load_index()
+
+    def _load_index(self):
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5]
+            try:
+                size = os.path.getsize(self._body_path(key))
+                last_used = os.path.getmtime(self._meta_path(key))
+            except OSError:
+                continue
+            self.index[key] = [size, last_used]
+            self.total_size += size
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, key + '.body')
+
+    @staticmethod
+    def key_for(url):
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+    def get(self, url):
+        """查找缓存记录，不存在时返回None"""
+        key = self.key_for(url)
+        with self.lock:
+            if key not in self.index:
+                return None
+        try:
+            with open(self._meta_path(key), encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._body_path(key), encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            self._remove(key)
+            return None
+        return CacheEntry(key, content, meta['final_url'], meta['encoding'],
+                          meta.get('etag'), meta.get('last_modified'))
+
+    def hit(self, entry):
+        """服务器返回304时调用，记录命中并刷新最近使用时间"""
+        now = time.time()
+        with self.lock:
+            self.hits += 1
+            if entry.key in self.index:
+                self.index[entry.key][1] = now
+        try:
+            os.utime(self._meta_path(entry.key), (now, now))
+        except OSError:
+            pass
+
+    def store(self, url, content, final_url, encoding, headers):
+        """保存响应，没有ETag和Last-Modified的响应无法重新验证，不缓存"""
+        with self.lock:
+            self.misses += 1
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        key = self.key_for(url)
+        body = content.encode('utf-8')
+        meta = {
+            'url': url,
+            'final_url': str(final_url),
+            'encoding': encoding,
+            'etag': etag,
+            'last_modified': last_modified
+        }
+        try:
+            self._write_atomic(self._body_path(key), body)
+            self._write_atomic(self._meta_path(key), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"写入缓存失败: {e}")
+            return
+
+        with self.lock:
+            old = self.index.get(key)
+            if old:
+                self.total_size -= old[0]
+            self.index[key] = [len(body), time.time()]
+            self.total_size += len(body)
+            evicted = self._evict_locked()
+        for old_key in evicted:
+            self._delete_files(old_key)
+
+    def _write_atomic(self, path, data):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _evict_locked(self):
+        """淘汰最久未使用的记录直到总大小不超过上限，返回被淘汰的键"""
+        if self.total_size <= self.max_size:
+            return []
+        evicted = []
+        for key, (size, _) in sorted(self.index.items(), key=lambda item: item[1][1]):
+            if self.total_size <= self.max_size:
+                break
+            del self.index[key]
+            self.total_size -= size
+            evicted.append(key)
+        logger.info(f"缓存淘汰 {len(evicted)} 条记录")
+        return evicted
+
+    def _remove(self, key):
+        with self.lock:
+            old = self.index.pop(key, None)
+            if old:
+                self.total_size -= old[0]
+        self._delete_files(key)
+
+    def _delete_files(self, key):
+        for path in (self._meta_path(key), self._body_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        """返回缓存统计"""
+        with self.lock:
+            return {
+                'entries': len(self.index),
+                'size_mb': self.total_size / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量任务日志
+用SQLite记录批量转换中每个URL的状态、输出路径、文件大小和错误信息，
+任务中断后可以只重新处理未完成和失败的URL
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SUCCESS = 'success'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    url TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    output_path TEXT,
+    file_type TEXT,
+    file_size REAL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class JobJournal:
+    """
+    持久化的批量任务日志，多个工作线程可以同时写入
+    记录的结果字典与 BatchWebToPDF.batch_convert 的返回值格式一致
+    """
+
+    def __init__(self, path="batch_job.sqlite3"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+
+    def add_urls(self, urls):
+        """登记URL，已存在的URL保持原有状态"""
+        now = time.time()
+        with self.lock:
+            start = self.conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM items").fetchone()[0]
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO items (url, position, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(url, start + offset, PENDING, now) for offset, url in enumerate(urls)]
+            )
+            self.conn.execute("COMMIT")
+
+    def record(self, result):
+        """写入一个URL的转换结果"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE items SET status = ?, output_path = ?, file_type = ?, file_size = ?, error = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                (result['status'], result.get('output_path'), result.get('file_type'),
+                 result.get('file_size'), result.get('error'), time.time(), result['url'])
+            )
+
+    def urls(self, statuses=None):
+        """按登记顺序返回URL，可按状态过滤"""
+        query = "SELECT url FROM items"
+        params = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params = tuple(statuses)
+        with self.lock:
+            return [row[0] for row in self.conn.execute(query + " ORDER BY position", params)]
+
+    def pending_urls(self, retry_failed=True):
+        """返回需要（重新）处理的URL"""
+        return self.urls([PENDING, FAILED] if retry_failed else [PENDING])
+
+    def completed(self, urls=None):
+        """返回已成功的URL及其结果字典 {url: result}"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, output_path, file_type, file_size FROM items WHERE status = ?", (SUCCESS,)
+            ).fetchall()
+        wanted = set(urls) if urls is not None else None
+        return {
+            url: {
+                'url': url,
+                'output_path': output_path,
+                'file_type': file_type,
+                'file_size': file_size,
+                'status': SUCCESS
+            }
+            for url, output_path, file_type, file_size in rows
+            if wanted is None or url in wanted
+        }
+
+    def results(self):
+        """按登记顺序返回所有已处理URL的结果，格式与batch_convert一致"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, status, output_path, file_type, file_size, error FROM items "
+                "WHERE status != ? ORDER BY position", (PENDING,)
+            ).fetchall()
+        results = []
+        for url, status, output_path, file_type, file_size, error in rows:
+            if status == SUCCESS:
+                results.append({'url': url, 'output_path': output_path, 'file_type': file_type,
+                                'file_size': file_size, 'status': status})
+            else:
+                results.append({'url': url, 'error': error, 'status': status})
+        return results
+
+    def counts(self):
+        """返回各状态的URL数量"""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+        counts = {PENDING: 0, SUCCESS: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+链接过滤器
+创建时一次性编译所有规则，每个链接只解析一次URL、扫描一次正则
+"""
+
+import re
+from urllib.parse import urlsplit
+
+# 默认排除的链接：脚本、邮件、电话、锚点、静态资源、登录相关页面和站点根目录
+DEFAULT_INVALID_PATTERNS = [
+    r'javascript:',
+    r'mailto:',
+    r'tel:',
+    r'#',
+    r'\.(css|js|png|jpg|jpeg|gif|ico|pdf|zip|rar)$',
+    r'logout',
+    r'login',
+    r'admin',
+    r'\.(com|cn|org|net)/$'
+]
+
+
+def _compile_any(patterns, flags=0):
+    """把多个正则合并为一个，全部为空时返回None"""
+    patterns = [p for p in patterns or [] if p]
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{p})' for p in patterns), flags)
+
+
+class HostRule:
+    """主机规则，匹配主机本身及其子域名"""
+
+    def __init__(self, hosts):
+        hosts = [h.lower().lstrip('.') for h in hosts or [] if h]
+        self.hosts = frozenset(hosts)
+        self.suffixes = tuple('.' + h for h in hosts)
+
+    def __bool__(self):
+        return bool(self.hosts)
+
+    def matches(self, host):
+        return host in self.hosts or host.endswith(self.suffixes)
+
+
+class LinkFilter:
+    """
+    可配置的链接过滤器
+    allow_*规则为空时不限制；设置后链接必须满足。deny_*规则命中任意一条即排除
+    hosts: 主机名，包括子域名；paths: 路径前缀；extensions: 文件扩展名（不区分大小写，可带点）；
+    query: 匹配查询字符串的正则
+    invalid_patterns: 针对整个URL的排除正则，默认为 DEFAULT_INVALID_PATTERNS
+    """
+
+    def __init__(self, allow_hosts=None, deny_hosts=None, allow_paths=None, deny_paths=None,
+                 allow_extensions=None, deny_extensions=None, allow_query=None, deny_query=None,
+                 invalid_patterns=DEFAULT_INVALID_PATTERNS):
+        self.allow_hosts = HostRule(allow_hosts)
+        self.deny_hosts = HostRule(deny_hosts)
+        self.allow_paths = tuple(allow_paths or ())
+        self.deny_paths = tuple(deny_paths or ())
+        self.allow_extensions = frozenset(e.lower().lstrip('.') for e in allow_extensions or [])
+        self.deny_extensions = frozenset(e.lower().lstrip('.') for e in deny_extensions or [])
+        self.allow_query = _compile_any(allow_query)
+        self.deny_query = _compile_any(deny_query)
+        self.invalid = _compile_any(invalid_patterns, re.IGNORECASE)
+        self.has_url_rules = bool(
+            self.allow_hosts or self.deny_hosts or self.allow_paths or self.deny_paths
+            or self.allow_extensions or self.deny_extensions or self.allow_query or self.deny_query
+        )
+
+    def is_valid(self, url, text):
+        """判断链接是否需要保留"""
+        if not text.strip():
+            return False
+        if self.invalid is not None and self.invalid.search(url):
+            return False
+        if not self.has_url_rules:
+            return True
+
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        if self.allow_hosts and not self.allow_hosts.matches(host):
+            return False
+        if self.deny_hosts and self.deny_hosts.matches(host):
+            return False
+
+        path = parts.path or '/'
+        if self.allow_paths and not path.startswith(self.allow_paths):
+            return False
+        if self.deny_paths and path.startswith(self.deny_paths):
+            return False
+
+        if self.allow_extensions or self.deny_extensions:
+            name = path.rsplit('/', 1)[-1]
+            extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+            if self.allow_extensions and extension not in self.allow_extensions:
+                return False
+            if extension in self.deny_extensions:
+                return False
+
+        if self.allow_query and not self.allow_query.search(parts.query):
+            return False
+        if self.deny_query and self.deny_query.search(parts.query):
+            return False
+
+        return True
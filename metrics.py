@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换指标
+按URL记录每个阶段的耗时，并汇总为各阶段的p50/p95/p99和吞吐量计数，可导出为JSON或Prometheus文本格式
+阶段:
+    wait        按主机调度等待的时间
+    response    发出请求到收到响应头（含DNS、建立连接、服务器处理和重试）
+    download    读取响应体
+    decode      识别编码并解码
+    preprocess  渲染前处理HTML
+    render      wkhtmltopdf/WeasyPrint渲染或保存HTML
+"""
+
+import json
+import time
+import threading
+import contextlib
+from collections import OrderedDict, deque
+
+STAGES = ('wait', 'response', 'download', 'decode', 'preprocess', 'render')
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def timed(metrics, stage, url=None):
+    """metrics为None时什么也不做，便于各组件把指标作为可选参数"""
+    return metrics.stage(stage, url) if metrics is not None else contextlib.nullcontext()
+
+
+def quantile(sorted_values, q):
+    """最近秩法求分位数，sorted_values已排序且非空"""
+    index = max(0, min(len(sorted_values) - 1, int(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class ConversionMetrics:
+    """
+    线程安全的转换指标，获取线程、事件循环和渲染线程可以同时记录
+    max_samples: 每个阶段保留的最近样本数，用于计算分位数；次数和总耗时始终精确
+    max_urls: 保留明细的URL数，超过时丢弃最早的
+    """
+
+    def __init__(self, max_samples=100000, max_urls=10000, prefix='net2pdf'):
+        self.max_samples = max_samples
+        self.max_urls = max_urls
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = {}
+            self.totals = {}
+            self.counters = {}
+            self.pages = {}
+            self.urls = OrderedDict()
+            self.aliases = {}
+            self.started = time.time()
+            self.start_time = time.perf_counter()
+
+    def _url_record(self, url):
+        url = self.aliases.get(url, url)
+        record = self.urls.get(url)
+        if record is None:
+            record = self.urls[url] = {'url': url, 'stages': {}}
+            if len(self.urls) > self.max_urls:
+                self.urls.popitem(last=False)
+        return record
+
+    def record(self, stage, seconds, url=None):
+        """记录一次阶段耗时；同一URL的同一阶段多次记录（如重试）时累加"""
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+            count, total = self.totals.get(stage, (0, 0.0))
+            self.totals[stage] = (count + 1, total + seconds)
+            if url is not None:
+                stages = self._url_record(url)['stages']
+                stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def stage(self, stage, url=None):
+        """计时上下文，异常退出时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, url)
+
+    def count(self, name, value=1):
+        """累加计数，如 downloaded_bytes、cache_hits"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def link(self, final_url, url):
+        """重定向后的地址与请求地址记到同一条明细中"""
+        if final_url and final_url != url:
+            with self.lock:
+                self.aliases[final_url] = self.aliases.get(url, url)
+
+    def annotate(self, url, **fields):
+        """为URL的明细补充字段，如渲染器、输出大小"""
+        with self.lock:
+            self._url_record(url).update(fields)
+
+    def finish(self, url, status, **fields):
+        """记录URL的最终状态（success/failed），计入吞吐量"""
+        with self.lock:
+            record = self._url_record(url)
+            record.update(fields)
+            record['status'] = status
+            record['total'] = sum(record['stages'].values())
+            self.pages[status] = self.pages.get(status, 0) + 1
+
+    def url_timings(self, url):
+        """返回URL各阶段耗时的副本，没有记录时返回空字典"""
+        with self.lock:
+            record = self.urls.get(self.aliases.get(url, url))
+            return dict(record['stages']) if record else {}
+
+    def stage_summary(self):
+        """返回 {阶段: {count, sum, mean, p50, p95, p99, max}}，按阶段顺序排列"""
+        with self.lock:
+            snapshot = {stage: (sorted(samples), self.totals[stage]) for stage, samples in self.samples.items()}
+
+        order = {stage: position for position, stage in enumerate(STAGES)}
+        summary = {}
+        for stage in sorted(snapshot, key=lambda s: (order.get(s, len(order)), s)):
+            values, (count, total) = snapshot[stage]
+            item = {'count': count, 'sum': total, 'mean': total / count}
+            for q in QUANTILES:
+                item[f'p{q * 100:g}'] = quantile(values, q)
+            item['max'] = values[-1]
+            summary[stage] = item
+        return summary
+
+    def summary(self, include_urls=True):
+        """返回全部指标的字典"""
+        stages = self.stage_summary()
+        with self.lock:
+            elapsed = time.perf_counter() - self.start_time
+            pages = dict(self.pages)
+            counters = dict(self.counters)
+            urls = [dict(record, stages=dict(record['stages'])) for record in self.urls.values()]
+
+        finished = sum(pages.values())
+        result = {
+            'started': self.started,
+            'elapsed': elapsed,
+            'pages': pages,
+            'pages_per_second': finished / elapsed if elapsed > 0 else 0.0,
+            'counters': counters,
+            'stages': stages,
+        }
+        if 'downloaded_bytes' in counters and elapsed > 0:
+            result['download_mb_per_second'] = counters['downloaded_bytes'] / (1024 * 1024) / elapsed
+        if include_urls:
+            result['urls'] = urls
+        return result
+
+    def to_json(self, include_urls=True):
+        return json.dumps(self.summary(include_urls), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus文本格式：阶段耗时为summary，页面数和计数为counter，吞吐量为gauge"""
+        summary = self.summary(include_urls=False)
+        prefix = self.prefix
+        lines = [
+            f'# HELP {prefix}_stage_seconds 各阶段耗时',
+            f'# TYPE {prefix}_stage_seconds summary',
+        ]
+        for stage, item in summary['stages'].items():
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q:g}"}} {item[f"p{q * 100:g}"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {item["sum"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {item["count"]}')
+
+        lines.append(f'# HELP {prefix}_pages_total 完成的页面数')
+        lines.append(f'# TYPE {prefix}_pages_total counter')
+        for status, count in sorted(summary['pages'].items()):
+            lines.append(f'{prefix}_pages_total{{status="{status}"}} {count}')
+
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+
+        lines.append(f'# TYPE {prefix}_pages_per_second gauge')
+        lines.append(f'{prefix}_pages_per_second {summary["pages_per_second"]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """写入文件：扩展名为 .prom 或 .txt 时使用Prometheus文本格式，否则为JSON"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出文件路径
+文件按URL哈希分散到子目录中，文件名由URL确定且不会冲突；
+写入先写到同目录下的临时文件，完成后再原子地重命名，并发写入不会互相覆盖或留下半个文件
+"""
+
+import os
+import re
+import hashlib
+import threading
+import contextlib
+import logging
+from urllib.parse import urlsplit
+
+from http_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+# 文件名中URL路径部分的最大长度，超出部分截断，唯一性由哈希保证
+MAX_SLUG_LENGTH = 80
+
+
+def ensure_dir(path):
+    """
+    创建目录，已存在时只有一次stat
+    不在进程内缓存已创建的目录：运行中被删除的目录（如清理输出时）会在下次写入前重新创建
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+        logger.info(f"创建输出目录: {path}")
+    return path
+
+
+def output_path(url, output_dir, extension="pdf", shard_depth=1):
+    """
+    根据URL生成输出路径: output_dir/<哈希前两位>/<域名>_<路径>_<哈希>.<扩展名>
+    同一URL（规范化后）总是得到同一路径，不同URL的路径不会相同
+    shard_depth: 子目录层数，每层256个目录；为0时不分子目录
+    """
+    digest = hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+
+    parsed_url = urlsplit(url)
+    domain = parsed_url.netloc.replace('.', '_')
+    path = parsed_url.path.strip('/').replace('/', '_') or 'index'
+    slug = re.sub(r'[^\w\-.]', '_', f"{domain}_{path}")[:MAX_SLUG_LENGTH]
+    filename = f"{slug}_{digest[:12]}.{extension}"
+
+    shards = [digest[2 * level:2 * level + 2] for level in range(shard_depth)]
+    directory = ensure_dir(os.path.join(output_dir, *shards))
+    return os.path.join(directory, filename)
+
+
+def temp_path_for(path):
+    """与path同目录、同扩展名的临时路径，进程和线程之间不会冲突"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".tmp-{os.getpid()}-{threading.get_ident()}-{name}")
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """
+    返回临时路径，with块正常结束后原子地替换为path，出错时删除临时文件
+    """
+    temp_path = temp_path_for(path)
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式PDF合并
+把多个PDF逐个追加到同一个输出文件，每个来源生成一个书签；
+每读入一个文件就立即写出它的对象，内存中只保留对象偏移和页面列表，与合并的文档数量无关
+"""
+
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import (
+        ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, NumberObject, StreamObject,
+        create_string_object
+    )
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+# 目录、页面树和书签根节点的固定对象编号
+PAGES_ID = 1
+OUTLINES_ID = 2
+CATALOG_ID = 3
+
+
+class StreamingPDFMerger:
+    """
+    流式PDF合并器
+    用法: with StreamingPDFMerger(path) as merger: merger.append(pdf_path, title)
+    """
+
+    def __init__(self, output_path):
+        if not PYPDF_AVAILABLE:
+            raise RuntimeError("合并PDF需要安装pypdf: pip install pypdf")
+        self.output_path = output_path
+        self.stream = open(output_path, 'wb')
+        self.stream.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+        self.offsets = {}
+        self.next_id = CATALOG_ID + 1
+        self.page_ids = []
+        # (书签标题, 书签对象编号, 第一页的对象编号)
+        self.outline = []
+
+    def _allocate(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def _write_object(self, object_id, obj):
+        self.offsets[object_id] = self.stream.tell()
+        self.stream.write(f"{object_id} 0 obj\n".encode('ascii'))
+        obj.write_to_stream(self.stream)
+        self.stream.write(b"\nendobj\n")
+
+    def append(self, pdf_path, title):
+        """追加一个PDF文件的所有页面，并为其第一页添加书签，返回追加的页数"""
+        reader = PdfReader(pdf_path)
+        mapping = {}
+        pending = deque()
+
+        def reference(indirect):
+            key = (indirect.idnum, indirect.generation)
+            if key not in mapping:
+                mapping[key] = self._allocate()
+                pending.append(key)
+            return IndirectObject(mapping[key], 0, None)
+
+        def remap(obj):
+            """复制对象，把其中的间接引用换成输出文件中的编号"""
+            if isinstance(obj, IndirectObject):
+                return reference(obj)
+            if isinstance(obj, StreamObject):
+                copied = obj.__class__()
+                copied._data = obj._data
+                for key, value in obj.items():
+                    copied[key] = remap(value)
+                return copied
+            if isinstance(obj, DictionaryObject):
+                copied = DictionaryObject()
+                for key, value in obj.items():
+                    copied[key] = remap(value)
+                return copied
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(remap(value) for value in obj)
+            return obj
+
+        pages = list(reader.pages)
+        page_ids = []
+        # 先登记页面自身的编号，其他对象（如链接注释）引用页面时不会重复复制
+        for page in pages:
+            page_id = self._allocate()
+            page_ids.append(page_id)
+            if page.indirect_reference is not None:
+                ref = page.indirect_reference
+                mapping[(ref.idnum, ref.generation)] = page_id
+
+        for page, page_id in zip(pages, page_ids):
+            copied = DictionaryObject()
+            for key, value in page.items():
+                if key != '/Parent':
+                    copied[key] = remap(value)
+            copied[NameObject('/Parent')] = IndirectObject(PAGES_ID, 0, None)
+            self._write_object(page_id, copied)
+
+        while pending:
+            key = pending.popleft()
+            obj = reader.get_object(IndirectObject(key[0], key[1], reader))
+            self._write_object(mapping[key], remap(obj) if obj is not None else NullObject())
+
+        if page_ids:
+            self.outline.append((title, self._allocate(), page_ids[0]))
+            self.page_ids.extend(page_ids)
+        self.stream.flush()
+        logger.info(f"已合并 {len(page_ids)} 页: {title}")
+        return len(page_ids)
+
+    def _write_outline(self):
+        root = DictionaryObject({NameObject('/Type'): NameObject('/Outlines')})
+        if self.outline:
+            root[NameObject('/First')] = IndirectObject(self.outline[0][1], 0, None)
+            root[NameObject('/Last')] = IndirectObject(self.outline[-1][1], 0, None)
+            root[NameObject('/Count')] = NumberObject(len(self.outline))
+
+        for position, (title, item_id, page_id) in enumerate(self.outline):
+            item = DictionaryObject({
+                NameObject('/Title'): create_string_object(title),
+                NameObject('/Parent'): IndirectObject(OUTLINES_ID, 0, None),
+                NameObject('/Dest'): ArrayObject([IndirectObject(page_id, 0, None), NameObject('/Fit')])
+            })
+            if position > 0:
+                item[NameObject('/Prev')] = IndirectObject(self.outline[position - 1][1], 0, None)
+            if position + 1 < len(self.outline):
+                item[NameObject('/Next')] = IndirectObject(self.outline[position + 1][1], 0, None)
+            self._write_object(item_id, item)
+
+        self._write_object(OUTLINES_ID, root)
+
+    def close(self):
+        """写出页面树、书签、目录和交叉引用表"""
+        if self.stream.closed:
+            return
+        self._write_object(PAGES_ID, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(page_id, 0, None) for page_id in self.page_ids),
+            NameObject('/Count'): NumberObject(len(self.page_ids))
+        }))
+        self._write_outline()
+        self._write_object(CATALOG_ID, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(PAGES_ID, 0, None),
+            NameObject('/Outlines'): IndirectObject(OUTLINES_ID, 0, None),
+            NameObject('/PageMode'): NameObject('/UseOutlines')
+        }))
+
+        xref_offset = self.stream.tell()
+        self.stream.write(f"xref\n0 {self.next_id}\n".encode('ascii'))
+        self.stream.write(b"0000000000 65535 f\r\n")
+        for object_id in range(1, self.next_id):
+            offset = self.offsets.get(object_id)
+            if offset is None:
+                self.stream.write(b"0000000000 65535 f\r\n")
+            else:
+                self.stream.write(f"{offset:010d} 00000 n\r\n".encode('ascii'))
+        self.stream.write(
+            f"trailer\n<< /Size {self.next_id} /Root {CATALOG_ID} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii')
+        )
+        self.stream.close()
+        logger.info(f"合并PDF生成成功: {self.output_path} ({len(self.page_ids)} 页)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
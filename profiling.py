@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换性能剖析
+按URL把获取（fetch）、解析（parse，包括解码后的预处理和链接提取）、渲染（render）三个环节分别用cProfile
+和tracemalloc记录，每个URL在输出目录下得到一个子目录:
+    fetch.prof / parse.prof / render.prof   cProfile统计，可用 pstats、snakeviz 等工具查看
+    report.txt                              各环节耗时、峰值内存、耗时最多的函数和分配最多的代码行
+    report.json                             同样内容的数字部分
+启用后各环节依次执行（cProfile和tracemalloc都是进程级的），只用于诊断，不用于正常批量转换。
+设置环境变量 NET2PDF_PROFILE=目录 即可在不修改代码的情况下启用
+"""
+
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import contextlib
+import logging
+
+from output_paths import output_path, ensure_dir
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = 'NET2PDF_PROFILE'
+SECTIONS = ('fetch', 'parse', 'render')
+
+
+def profiler_from_env():
+    """环境变量 NET2PDF_PROFILE 设置了目录时返回对应的剖析器，否则返回None"""
+    output_dir = os.environ.get(PROFILE_ENV)
+    return ConversionProfiler(output_dir) if output_dir else None
+
+
+def profiled(profiler, section, url=None):
+    """profiler为None时什么也不做，便于各组件把剖析器作为可选参数"""
+    return profiler.section(section, url) if profiler is not None else contextlib.nullcontext()
+
+
+class SectionStats:
+    """一个URL的一个环节的累计结果，同一环节多次执行（如重试、换用下一个渲染器）时累加"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.allocations = []
+
+
+class ConversionProfiler:
+    """
+    output_dir: 剖析结果的目录，每个URL一个子目录
+    memory: 同时用tracemalloc统计峰值内存和分配最多的代码行（会明显变慢）
+    top: 报告中列出的函数和代码行数
+    """
+
+    def __init__(self, output_dir='profiles', memory=True, top=25, frames=1):
+        self.output_dir = output_dir
+        self.memory = memory
+        self.top = top
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {}
+        self.aliases = {}
+        self.started_tracing = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.started_tracing = True
+        logger.info(f"已启用性能剖析，结果保存到: {output_dir}")
+
+    def link(self, final_url, url):
+        """重定向后的地址与请求地址使用同一个目录"""
+        if final_url and final_url != url:
+            self.aliases[final_url] = self.aliases.get(url, url)
+
+    def directory_for(self, url):
+        """URL的剖析结果目录，与输出文件使用相同的命名和分散规则"""
+        return os.path.splitext(output_path(url, self.output_dir, 'prof'))[0]
+
+    @contextlib.contextmanager
+    def section(self, section, url=None):
+        """剖析一个环节；同一线程中嵌套的环节计入外层，其他线程的环节等待当前环节结束"""
+        if getattr(self.local, 'active', False):
+            yield
+            return
+
+        url = self.aliases.get(url, url) or 'unknown'
+        with self.lock:
+            self.local.active = True
+            stats = self.stats.get((url, section))
+            if stats is None:
+                stats = self.stats[(url, section)] = SectionStats()
+
+            tracing = self.memory and tracemalloc.is_tracing()
+            if tracing:
+                before = self._snapshot() if self.top else None
+                tracemalloc.reset_peak()
+                start_bytes = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                stats.profile.enable()
+            except ValueError as e:
+                # 已有其他剖析工具在运行（如外部的cProfile）
+                logger.warning(f"无法启用cProfile: {e}")
+            try:
+                yield
+            finally:
+                stats.profile.disable()
+                stats.seconds += time.perf_counter() - start
+                stats.calls += 1
+                if tracing:
+                    stats.peak_bytes = max(stats.peak_bytes, tracemalloc.get_traced_memory()[1] - start_bytes)
+                    if before is not None:
+                        stats.allocations = self._snapshot().compare_to(before, 'lineno')[:self.top]
+                self.local.active = False
+                self._write(url)
+
+    @staticmethod
+    def _snapshot():
+        # 排除tracemalloc自身的分配
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+    def _write(self, url):
+        """写出URL的各环节cProfile结果和报告，每个环节结束后更新"""
+        directory = self.directory_for(url)
+        ensure_dir(directory)
+        report = {'url': url, 'sections': {}}
+        lines = [f"URL: {url}", ""]
+
+        for section in SECTIONS:
+            stats = self.stats.get((url, section))
+            if stats is None:
+                continue
+            stats.profile.dump_stats(os.path.join(directory, f'{section}.prof'))
+            report['sections'][section] = {
+                'calls': stats.calls,
+                'seconds': stats.seconds,
+                'peak_mb': stats.peak_bytes / (1024 * 1024) if self.memory else None,
+            }
+
+            lines.append(f"== {section}: {stats.calls} 次，耗时 {stats.seconds:.3f}秒"
+                         + (f"，峰值内存 {stats.peak_bytes / (1024 * 1024):.2f}MB" if self.memory else ""))
+            buffer = io.StringIO()
+            pstats.Stats(stats.profile, stream=buffer).sort_stats('cumulative').print_stats(self.top)
+            lines.append(buffer.getvalue().strip())
+            if stats.allocations:
+                lines.append("")
+                lines.append("分配最多的代码行（环节结束时相对开始时的净增）:")
+                lines.extend(f"  {difference}" for difference in stats.allocations)
+            lines.append("")
+
+        with open(os.path.join(directory, 'report.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        with open(os.path.join(directory, 'report.json'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def close(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
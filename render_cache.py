@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染结果缓存
+以HTML内容和渲染选项（pdfkit选项、样式表）的哈希为键保存已生成的PDF，
+相同内容再次转换时直接硬链接（或复制）已有的PDF，不再调用渲染器
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+import logging
+
+from output_paths import atomic_path
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """PDF渲染结果缓存，可以在多个线程和多个转换器之间共享"""
+
+    def __init__(self, cache_dir=".render_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(html_content, *settings):
+        """计算缓存键，settings为影响渲染结果的选项，如pdfkit选项字典或样式表字符串"""
+        digest = hashlib.sha256(html_content.encode('utf-8'))
+        for setting in settings:
+            digest.update(b'\0')
+            digest.update(json.dumps(setting, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pdf')
+
+    def fetch(self, key, output_path):
+        """命中时把缓存的PDF链接到output_path并返回True"""
+        cached_path = self._path(key)
+        if not os.path.exists(cached_path):
+            with self.lock:
+                self.misses += 1
+            return False
+
+        try:
+            link_or_copy(cached_path, output_path)
+        except OSError as e:
+            logger.warning(f"读取渲染缓存失败: {e}")
+            with self.lock:
+                self.misses += 1
+            return False
+
+        with self.lock:
+            self.hits += 1
+        logger.info(f"HTML未变化，使用已渲染的PDF: {output_path}")
+        return True
+
+    def store(self, key, pdf_path):
+        """把新生成的PDF加入缓存"""
+        cached_path = self._path(key)
+        if os.path.exists(cached_path):
+            return
+        temp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            link_or_copy(pdf_path, temp_path)
+            os.replace(temp_path, cached_path)
+        except OSError as e:
+            logger.warning(f"写入渲染缓存失败: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def stats(self):
+        """返回缓存统计"""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def link_or_copy(source, destination):
+    """优先创建硬链接，跨文件系统等无法链接时复制文件；先写到临时路径再替换destination"""
+    with atomic_path(destination) as temp_path:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻wkhtmltopdf渲染池
+每个工作进程以 --read-args-from-stdin 模式长期运行，通过管道逐行接收渲染任务，
+避免每个页面都重新启动wkhtmltopdf及其WebKit环境
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import queue
+import time
+import uuid
+import atexit
+import logging
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+DEFAULT_WKHTMLTOPDF = r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe'
+
+
+def find_wkhtmltopdf(path=DEFAULT_WKHTMLTOPDF):
+    """查找wkhtmltopdf可执行文件，默认路径不存在时从PATH中查找"""
+    if path and os.path.exists(path):
+        return path
+    found = shutil.which('wkhtmltopdf')
+    if not found:
+        raise OSError(f"未找到wkhtmltopdf可执行文件: {path}")
+    return found
+
+
+def options_to_args(options):
+    """将pdfkit风格的选项字典转换为wkhtmltopdf命令行参数"""
+    args = []
+    for key, value in (options or {}).items():
+        args.append('--' + key.lstrip('-'))
+        if value is not None:
+            args.append(str(value))
+    return args
+
+
+def quote_arg(arg):
+    """按wkhtmltopdf读取标准输入参数时的规则给参数加引号"""
+    return '"' + arg.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.pages.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PageServer:
+    """
+    本机HTTP服务，把内存中的HTML交给常驻wkhtmltopdf进程读取
+    常驻进程的标准输入已用于接收参数，无法再通过管道传入HTML，这样可以不写临时文件
+    """
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _PageHandler)
+        self.server.daemon_threads = True
+        self.server.pages = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @contextlib.contextmanager
+    def publish(self, html_content):
+        """在with块内通过返回的URL提供html_content"""
+        path = f"/{uuid.uuid4().hex}.html"
+        self.server.pages[path] = html_content.encode('utf-8')
+        try:
+            yield self.base_url + path
+        finally:
+            self.server.pages.pop(path, None)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RenderWorker:
+    """一个常驻的wkhtmltopdf进程"""
+
+    def __init__(self, binary, timeout=120):
+        self.binary = binary
+        self.timeout = timeout
+        self.jobs_done = 0
+        self.process = None
+        self.lines = None
+
+    def start(self):
+        """启动wkhtmltopdf进程，并用后台线程读取其进度输出"""
+        self.process = subprocess.Popen(
+            [self.binary, '--read-args-from-stdin'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        self.jobs_done = 0
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_stderr, args=(self.process, self.lines), daemon=True).start()
+        logger.info(f"启动渲染进程: pid={self.process.pid}")
+
+    @staticmethod
+    def _read_stderr(process, lines):
+        # wkhtmltopdf用\r刷新进度条，文本模式下会被拆分为独立的行
+        for line in process.stderr:
+            lines.put(line.strip())
+        lines.put(None)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def memory_mb(self):
+        """返回进程的常驻内存（MB），无法获取时返回None"""
+        if not self.alive():
+            return None
+        if PSUTIL_AVAILABLE:
+            try:
+                return psutil.Process(self.process.pid).memory_info().rss / (1024 * 1024)
+            except psutil.Error:
+                return None
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    def render(self, args):
+        """提交一个渲染任务并等待完成，失败时抛出RuntimeError"""
+        if not self.alive():
+            self.start()
+
+        self.process.stdin.write(' '.join(quote_arg(arg) for arg in args) + '\n')
+        self.process.stdin.flush()
+
+        deadline = time.monotonic() + self.timeout
+        errors = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stop()
+                raise RuntimeError(f"渲染超时 ({self.timeout}秒)")
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                continue
+
+            if line is None:
+                raise RuntimeError(f"渲染进程意外退出: {'; '.join(errors) or '无错误输出'}")
+            if line.endswith('Done'):
+                break
+            if line.startswith('Exit with code'):
+                raise RuntimeError(line)
+            if line.lower().startswith(('error', 'warning')):
+                errors.append(line)
+
+        self.jobs_done += 1
+
+    def stop(self):
+        """关闭进程"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+
+class RenderPool:
+    """
+    wkhtmltopdf常驻进程池
+    size: 进程数量
+    max_jobs: 每个进程处理多少个任务后重启
+    max_memory_mb: 进程内存超过该值时重启
+    """
+
+    def __init__(self, size=2, max_jobs=200, max_memory_mb=512, binary=None, timeout=120):
+        self.binary = find_wkhtmltopdf(binary) if binary else find_wkhtmltopdf()
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.workers = [RenderWorker(self.binary, timeout) for _ in range(max(1, size))]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+        self.lock = threading.Lock()
+        self.job_times = []
+        self.recycled = 0
+        self.page_server = None
+        atexit.register(self.close)
+
+    def render(self, input_path, output_path, options=None):
+        """
+        渲染一个HTML文件为PDF，返回本次任务的渲染耗时（秒）
+        """
+        args = options_to_args(options) + [input_path, output_path]
+        worker = self.idle.get()
+        try:
+            start = time.perf_counter()
+            try:
+                worker.render(args)
+            except Exception:
+                worker.stop()
+                raise
+            elapsed = time.perf_counter() - start
+
+            with self.lock:
+                self.job_times.append(elapsed)
+            logger.info(f"渲染完成: {output_path} ({elapsed:.2f}秒)")
+
+            self._maybe_recycle(worker)
+            return elapsed
+        finally:
+            self.idle.put(worker)
+
+    def render_string(self, html_content, output_path, options=None):
+        """
+        渲染内存中的HTML为PDF，不写临时文件，返回本次任务的渲染耗时（秒）
+        """
+        with self.lock:
+            if self.page_server is None:
+                self.page_server = PageServer()
+        with self.page_server.publish(html_content) as url:
+            return self.render(url, output_path, options)
+
+    def _maybe_recycle(self, worker):
+        """按任务数和内存上限回收工作进程，下一个任务会自动启动新进程"""
+        reason = None
+        if self.max_jobs and worker.jobs_done >= self.max_jobs:
+            reason = f"已处理 {worker.jobs_done} 个任务"
+        elif self.max_memory_mb:
+            memory = worker.memory_mb()
+            if memory is not None and memory > self.max_memory_mb:
+                reason = f"内存 {memory:.0f}MB 超过上限"
+
+        if reason:
+            logger.info(f"回收渲染进程: {reason}")
+            worker.stop()
+            with self.lock:
+                self.recycled += 1
+
+    def stats(self):
+        """返回渲染任务统计"""
+        with self.lock:
+            times = list(self.job_times)
+        return {
+            'jobs': len(times),
+            'total_time': sum(times),
+            'avg_time': sum(times) / len(times) if times else 0.0,
+            'max_time': max(times, default=0.0),
+            'recycled': self.recycled
+        }
+
+    def close(self):
+        """关闭所有工作进程"""
+        for worker in self.workers:
+            worker.stop()
+        if self.page_server is not None:
+            self.page_server.close()
+            self.page_server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应体限制
+按块读取响应体：先检查内容类型和Content-Length，不是网页或明显过大时不读取响应体；
+读取过程中超过大小上限立即中止，较大的响应体转存到临时文件，不整个保存在内存中
+"""
+
+import mmap
+import tempfile
+import logging
+
+from html_encoding import decode_html
+
+logger = logging.getLogger(__name__)
+
+# 单个网页的默认大小上限（解压后）
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# 超过这个大小的响应体转存到临时文件
+SPOOL_BYTES = 2 * 1024 * 1024
+# 每次读取的块大小
+CHUNK_BYTES = 64 * 1024
+# 默认允许的内容类型；未声明Content-Type的响应照常读取
+HTML_CONTENT_TYPES = frozenset({
+    'text/html', 'application/xhtml+xml', 'application/xml', 'text/xml', 'text/plain',
+})
+
+
+class BodyLimitError(Exception):
+    """响应不满足大小或内容类型限制，已中止读取"""
+
+
+class ResponseTooLarge(BodyLimitError):
+    """响应体超过大小上限"""
+
+
+class UnsupportedContentType(BodyLimitError):
+    """内容类型不在允许列表中"""
+
+
+class BodyBuffer:
+    """
+    接收响应体的缓冲区
+    不超过spool_bytes时保存在内存中，超过后转存到临时文件；累计大小超过max_bytes时抛出ResponseTooLarge
+    """
+
+    def __init__(self, url, max_bytes=DEFAULT_MAX_BYTES, spool_bytes=SPOOL_BYTES):
+        self.url = url
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.size = 0
+        self._memory = bytearray()
+        self._file = None
+        self._map = None
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise ResponseTooLarge(f"响应体超过 {self.max_bytes / (1024 * 1024):g} MB，已中止: {self.url}")
+
+        if self._file is None and self.size > self.spool_bytes:
+            self._file = tempfile.TemporaryFile(prefix='net2pdf-body-')
+            self._file.write(self._memory)
+            self._memory = bytearray()
+            logger.info(f"响应体较大，转存到临时文件: {self.url}")
+
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._memory += chunk
+
+    def getbuffer(self):
+        """返回完整的响应体：内存中的bytearray，或临时文件的只读内存映射"""
+        if self._file is None:
+            return self._memory
+        if self._map is None:
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def decode(self, content_type=None, charset=None):
+        """解码响应体，返回 (content, encoding)；转存到临时文件的内容直接从映射中解码，不再复制一份字节"""
+        return decode_html(self.getbuffer(), content_type, charset)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._memory = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BodyLimits:
+    """
+    响应体限制，HttpFetcher 和 AsyncFetcher 共用
+    max_bytes: 单个响应体的大小上限，None表示不限制
+    spool_bytes: 超过这个大小的响应体转存到临时文件
+    allowed_types: 允许的内容类型（不含参数），None表示不检查
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spool_bytes=SPOOL_BYTES, allowed_types=HTML_CONTENT_TYPES):
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.allowed_types = frozenset(t.lower() for t in allowed_types) if allowed_types else None
+
+    def check_headers(self, url, headers):
+        """读取响应体之前检查内容类型和Content-Length，不满足限制时抛出BodyLimitError"""
+        content_type = headers.get('Content-Type', '')
+        mime_type = content_type.split(';', 1)[0].strip().lower()
+        if self.allowed_types and mime_type and mime_type not in self.allowed_types:
+            raise UnsupportedContentType(f"内容类型不是网页 ({content_type})，已中止: {url}")
+
+        if self.max_bytes:
+            try:
+                length = int(headers.get('Content-Length') or 0)
+            except ValueError:
+                length = 0
+            # 压缩响应的Content-Length是压缩后的大小，解压后的大小在读取时再检查
+            if length > self.max_bytes:
+                raise ResponseTooLarge(f"Content-Length为 {length / (1024 * 1024):.1f} MB，"
+                                       f"超过 {self.max_bytes / (1024 * 1024):g} MB 上限: {url}")
+
+    def buffer(self, url):
+        return BodyBuffer(url, self.max_bytes, self.spool_bytes)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求重试和熔断
+超时、连接错误、5xx和429响应按带随机抖动的指数退避重试；
+同一主机连续失败达到阈值后熔断，一段时间内直接拒绝发往该主机的请求
+"""
+
+import time
+import random
+import threading
+import logging
+from urllib.parse import urlsplit
+
+import requests
+
+from host_scheduler import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# 需要重试的响应状态码
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """主机处于熔断状态，请求未发送"""
+
+
+class CircuitBreaker:
+    """
+    按主机的熔断器，可以在多个线程之间共享
+    failure_threshold: 连续失败多少次后熔断
+    reset_timeout: 熔断多少秒后放行一个试探请求，成功则恢复
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        # host -> [连续失败次数, 熔断开始时间或None]
+        self.hosts = {}
+
+    def allow(self, host):
+        """返回是否允许向该主机发送请求"""
+        with self.lock:
+            failures, opened_at = self.hosts.get(host, (0, None))
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # 半开状态：放行一个试探请求，其余请求在结果出来前继续被拒绝
+                self.hosts[host] = [failures, time.monotonic()]
+                return True
+            return False
+
+    def record_success(self, host):
+        with self.lock:
+            self.hosts.pop(host, None)
+
+    def record_failure(self, host):
+        with self.lock:
+            state = self.hosts.setdefault(host, [0, None])
+            state[0] += 1
+            if state[0] >= self.failure_threshold:
+                if state[1] is None:
+                    logger.warning(f"{host} 连续失败 {state[0]} 次，暂停请求 {self.reset_timeout} 秒")
+                state[1] = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    重试策略
+    max_retries: 首次请求失败后最多重试几次
+    backoff_base / backoff_max: 第n次重试前等待 [0, min(backoff_max, backoff_base * 2^n)] 之间的随机秒数，
+    响应带Retry-After时至少等待该时间
+    max_retry_after: Retry-After超过这个秒数时不再等待重试，直接返回该响应
+    breaker: 可选的 CircuitBreaker，默认每个策略一个
+    """
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=30, max_retry_after=300, breaker=None):
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.breaker = breaker or CircuitBreaker()
+
+    def delay(self, attempt, retry_after=None):
+        """第attempt次重试前的等待秒数"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            # 服务器要求的等待时间必须遵守，不受backoff_max限制
+            delay = max(delay, retry_after)
+        return delay
+
+    def retry_after(self, status, headers):
+        """429/503响应的Retry-After秒数，其他情况返回None"""
+        if status in (429, 503) and headers.get('Retry-After'):
+            return parse_retry_after(headers.get('Retry-After'))
+        return None
+
+    def response_delay(self, attempt, status, headers):
+        """
+        第attempt次请求得到可重试的响应后，重试前的等待秒数；
+        重试次数用尽或Retry-After超过max_retry_after时返回None，表示放弃
+        """
+        if attempt >= self.max_retries:
+            return None
+        retry_after = self.retry_after(status, headers)
+        if retry_after is not None and self.max_retry_after is not None and retry_after > self.max_retry_after:
+            logger.warning(f"Retry-After为 {retry_after:.0f}秒，超过 {self.max_retry_after}秒，不再重试")
+            return None
+        return self.delay(attempt, retry_after)
+
+    def check_circuit(self, url):
+        """主机处于熔断状态时抛出CircuitOpenError"""
+        host = urlsplit(url).netloc.lower()
+        if not self.breaker.allow(host):
+            raise CircuitOpenError(f"{host} 连续失败，已暂停请求")
+        return host
+
+    def get(self, session, url, on_response=None, wait=None, **kwargs):
+        """
+        带重试的 session.get，返回最后一次的响应（调用方照常raise_for_status）；
+        超时和连接错误重试用尽后抛出最后一次的异常
+        on_response: 可选的 callable(response)，每次收到响应（包括将要重试的响应）时调用，
+        例如让 HostScheduler 立即根据429/503冷却该主机
+        wait: 可选的 callable(delay)，代替 time.sleep 等待重试，例如先交还主机的并发名额再经调度器重新领取
+        """
+        host = self.check_circuit(url)
+        attempt = 0
+        while True:
+            try:
+                response = session.get(url, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure(host)
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f"请求失败，{delay:.1f}秒后重试 ({attempt + 1}/{self.max_retries}): {url} ({e})")
+            else:
+                if on_response is not None:
+                    on_response(response)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success(host)
+                    return response
+                delay = self.response_delay(attempt, response.status_code, response.headers)
+                if delay is None:
+                    self.breaker.record_failure(host)
+                    return response
+                logger.warning(f"服务器返回 {response.status_code}，{delay:.1f}秒后重试 "
+                               f"({attempt + 1}/{self.max_retries}): {url}")
+                response.close()
+
+            (wait or time.sleep)(delay)
+            attempt += 1
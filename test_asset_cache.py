@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试渲染资源共享缓存
+"""
+
+import requests
+
+from asset_cache import AssetCache, AssetServer
+from test_fetchers import start_server
+
+KB = 1024 / (1024 * 1024)
+
+
+def asset(size, content_type='image/png'):
+    body = bytes(index % 251 for index in range(size))
+
+    def handler(request):
+        return 200, {'Content-Type': content_type}, body
+    handler.body = body
+    return handler
+
+
+def test_lru_eviction():
+    """超过总大小上限时淘汰最久未使用的资源，命中的资源移到队尾"""
+    routes = {f'/{name}': asset(400) for name in 'abcd'}
+    server, base, seen = start_server(routes)
+    try:
+        cache = AssetCache(max_size_mb=KB * 0.9)
+        for name in 'abc':
+            cache.get(f'{base}/{name}')
+        assert list(cache.entries) == [f'{base}/b', f'{base}/c']
+
+        cache.get(f'{base}/b')
+        cache.get(f'{base}/d')
+        assert list(cache.entries) == [f'{base}/b', f'{base}/d']
+        assert cache.total_size == 800
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['evicted'] == 2
+    finally:
+        server.shutdown()
+
+
+def test_large_asset_is_streamed_not_cached():
+    """超过单个资源上限的资源只读取到上限为止，其余内容逐块读取，且不进入缓存"""
+    big = asset(300 * 1024)
+    server, base, seen = start_server({'/big': big})
+    try:
+        cache = AssetCache(max_asset_mb=100 * KB)
+        result = cache.get(base + '/big')
+        assert result.response is not None
+        assert len(result.body) <= 100 * 1024 + 64 * 1024
+        assert b''.join(result.chunks()) == big.body
+        assert cache.entries == {}
+
+        reader = cache.url_fetcher(base + '/big')['file_obj']
+        assert reader.read() == big.body
+        reader.close()
+        assert cache.stats()['misses'] == 2
+    finally:
+        server.shutdown()
+
+
+def test_proxy_forwards_large_asset():
+    big = asset(300 * 1024)
+    small = asset(100, 'text/css')
+    server, base, seen = start_server({'/big': big, '/small.css': small})
+    proxy = AssetServer(AssetCache(max_asset_mb=100 * KB))
+    try:
+        for path, handler in (('/big', big), ('/small.css', small)):
+            response = requests.get(proxy.proxy_url(path, base, rewrite=False), timeout=5)
+            assert response.status_code == 200
+            assert response.content == handler.body
+    finally:
+        proxy.close()
+        server.shutdown()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量转换的命令行模式
+"""
+
+import json
+
+import pytest
+
+import batch_web_to_pdf
+from batch_web_to_pdf import main
+from converter_core import shared_session
+from test_fetchers import start_server, page
+
+
+def test_asset_cache_uses_shared_session(tmp_path, monkeypatch):
+    """--asset-cache-mb 创建的资源缓存与网页获取共用同一个连接池"""
+    created = []
+
+    class RecordingCache(batch_web_to_pdf.AssetCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(batch_web_to_pdf, 'AssetCache', RecordingCache)
+    server, base, seen = start_server({'/a': page('A')})
+    try:
+        summary = tmp_path / 'summary.json'
+        code = main([base + '/a', '-o', str(tmp_path / 'out'), '--asset-cache-mb', '1', '--summary', str(summary)])
+    finally:
+        server.shutdown()
+
+    assert code == 0
+    assert json.loads(summary.read_text(encoding='utf-8'))['success'] == 1
+    assert [cache.session for cache in created] == [shared_session()]
+
+
+def test_page_fetch_failure_exits_with_error(tmp_path, capsys):
+    """--page 页面获取失败时输出错误并返回1，而不是抛出异常"""
+    server, base, seen = start_server({})
+    try:
+        code = main(['--page', base + '/missing', '-o', str(tmp_path / 'out')])
+    finally:
+        server.shutdown()
+
+    assert code == 1
+    assert '获取页面失败' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('extra', [
+    ['https://example.com/a'],
+    ['-i', 'urls.txt'],
+    ['--include', 'docs'],
+    ['--exclude', 'blog'],
+])
+def test_crawl_rejects_ignored_options(extra, capsys):
+    """抓取模式不会使用其他URL来源和正则过滤，同时指定时直接报错"""
+    with pytest.raises(SystemExit) as excinfo:
+        main(['--crawl', '--page', 'https://example.com/'] + extra)
+    assert excinfo.value.code == 2
+    assert '--crawl 不能与' in capsys.readouterr().err
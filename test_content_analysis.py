@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试中日韩文字统计和字体选择
+"""
+
+import pytest
+
+from content_analysis import analyze_scripts, font_family_for, FONT_FAMILIES, HAN, KANA, HANGUL
+
+
+def in_ranges(char, ranges):
+    """按字符逐个判断的参考实现，ranges为 content_analysis 中的字符类字符串"""
+    return any(ranges[i] <= char <= ranges[i + 2] for i in range(0, len(ranges), 3))
+
+
+def reference(text):
+    return {
+        'han': sum(1 for c in text if in_ranges(c, HAN)),
+        'kana': sum(1 for c in text if in_ranges(c, KANA)),
+        'hangul': sum(1 for c in text if in_ranges(c, HANGUL)),
+    }
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'plain ascii <p>text</p>',
+    '<p>网页转PDF工具，专门优化中文支持。</p>',
+    '日本語のテキストとカタカナ、ひらがな。',
+    '한국어 텍스트와 漢字',
+    'mixed 中文 and 𠀀 extension-B, 㐀 extension-A, 豈 compatibility, Ünïcödé',
+])
+def test_counts_match_per_character_reference(text):
+    stats = analyze_scripts(text)
+    assert {key: stats[key] for key in ('han', 'kana', 'hangul')} == reference(text)
+
+
+@pytest.mark.parametrize('text, language', [
+    ('中文页面' * 10, 'zh'),
+    ('日本語の文章です。' * 10, 'ja'),
+    ('漢字' * 50 + 'の' * 9, 'zh'),
+    ('漢字' * 50 + 'の' * 10, 'ja'),
+    ('한국어 문장입니다 漢字', 'ko'),
+    ('English only', None),
+    ('Ünïcödé only', None),
+])
+def test_language(text, language):
+    assert analyze_scripts(text)['language'] == language
+
+
+def test_font_family_for():
+    assert font_family_for(analyze_scripts('日本語の文章です。')) == FONT_FAMILIES['ja']
+    assert font_family_for(analyze_scripts('한국어')) == FONT_FAMILIES['ko']
+    # 没有分析结果或没有中日韩文字时使用中文字体
+    assert font_family_for(None) == FONT_FAMILIES['zh']
+    assert font_family_for(analyze_scripts('English')) == FONT_FAMILIES['zh']
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试转换流水线核心：渲染缓存、原子写入、提交到渲染池的任务和各转换器共用的装配
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from converter_core import (ConverterCore, HttpFetcher, HTMLRenderer, Renderer, WeasyPrintRenderer,
+                            WkhtmltopdfRenderer)
+from render_cache import RenderCache
+from metrics import ConversionMetrics
+
+
+class FakeRenderer(Renderer):
+    """把HTML原样写入输出文件，submit在线程池中执行；fail为True时渲染失败"""
+    name = 'fake'
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+        self.pool = ThreadPoolExecutor(max_workers=2)
+
+    def render(self, html_content, output_path, base_url=None):
+        self.calls += 1
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        if self.fail:
+            raise RuntimeError("渲染失败")
+
+    def submit(self, html_content, output_path, base_url=None):
+        def run():
+            self.render(html_content, output_path, base_url)
+            return 0.25
+        return self.pool.submit(run)
+
+    def cache_settings(self, base_url=None):
+        return ('fake', base_url)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+@pytest.fixture
+def core(tmp_path):
+    renderer = FakeRenderer()
+    core = ConverterCore(HttpFetcher(), [renderer], render_cache=RenderCache(str(tmp_path / 'cache')),
+                         metrics=ConversionMetrics())
+    yield core
+    core.close()
+
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.startswith('.tmp-')]
+
+
+def test_render_with_uses_cache(tmp_path, core):
+    renderer = core.renderers[0]
+    first, second = str(tmp_path / 'a.pdf'), str(tmp_path / 'b.pdf')
+    core.render_with(renderer, '<p>同一页面</p>', first, 'https://example.com/a')
+    core.render_with(renderer, '<p>同一页面</p>', second, 'https://example.com/a')
+    assert renderer.calls == 1
+    with open(second, encoding='utf-8') as f:
+        assert f.read() == '<p>同一页面</p>'
+    assert core.metrics.summary()['counters']['render_cache_hits'] == 1
+
+
+def test_render_cache_key_depends_on_settings(core):
+    renderer = core.renderers[0]
+    key = core.render_cache_key(renderer, '<p>x</p>', 'https://example.com/a')
+    assert key == core.render_cache_key(renderer, '<p>x</p>', 'https://example.com/a')
+    assert key != core.render_cache_key(renderer, '<p>x</p>', 'https://example.com/b')
+    assert key != core.render_cache_key(renderer, '<p>y</p>', 'https://example.com/a')
+    assert core.render_cache_key(HTMLRenderer(), '<p>x</p>') is None
+
+
+def test_renderer_cache_settings_include_base_url():
+    """相对地址的资源按base_url解析，base_url不同时不能共用渲染结果"""
+    wkhtmltopdf = WkhtmltopdfRenderer({'page-size': 'A4'}, persistent=False)
+    weasyprint = WeasyPrintRenderer('body {}')
+    for renderer in (wkhtmltopdf, weasyprint):
+        assert renderer.cache_settings('https://a.example/') != renderer.cache_settings('https://b.example/')
+    assert RenderCache.key_for('<p>x</p>', *wkhtmltopdf.cache_settings('https://a.example/')) != \
+        RenderCache.key_for('<p>x</p>', *wkhtmltopdf.cache_settings('https://b.example/'))
+
+
+def test_render_with_failure_leaves_no_files(tmp_path):
+    core = ConverterCore(HttpFetcher(), [FakeRenderer(fail=True)])
+    output = str(tmp_path / 'a.pdf')
+    with pytest.raises(RuntimeError):
+        core.render_with(core.renderers[0], '<p>x</p>', output)
+    assert os.listdir(tmp_path) == []
+
+
+def test_render_falls_back_to_next_renderer(tmp_path):
+    core = ConverterCore(HttpFetcher(), [FakeRenderer(fail=True), HTMLRenderer()], metrics=ConversionMetrics())
+    path, extension = core.render('<html><head></head><body>x</body></html>', 'https://example.com/a',
+                                  str(tmp_path))
+    assert extension == 'html' and os.path.exists(path)
+    assert core.metrics.summary()['counters']['render_fallbacks'] == 1
+
+
+def test_submit_and_finish(tmp_path, core):
+    renderer = core.renderers[0]
+    url = 'https://example.com/a'
+    output = str(tmp_path / 'a.pdf')
+    job = core.submit(renderer, '<p>页面</p>', output, url)
+    assert core.finish(job, url) == output
+    assert leftovers(tmp_path) == []
+
+    record = core.metrics.summary()['urls'][0]
+    assert record['status'] == 'success'
+    assert record['stages']['render'] == 0.25
+    assert record['renderer'] == 'fake'
+
+    # 第二次提交相同的HTML时直接使用渲染缓存，不再调用渲染器
+    again = core.submit(renderer, '<p>页面</p>', str(tmp_path / 'b.pdf'), url)
+    assert again.future is None
+    assert core.finish(again) == str(tmp_path / 'b.pdf')
+    assert renderer.calls == 1
+
+
+def test_finish_failure_removes_temp_file(tmp_path):
+    core = ConverterCore(HttpFetcher(), [FakeRenderer(fail=True)], metrics=ConversionMetrics())
+    output = str(tmp_path / 'a.pdf')
+    job = core.submit(core.renderers[0], '<p>x</p>', output, 'https://example.com/a')
+    with pytest.raises(RuntimeError):
+        core.finish(job, 'https://example.com/a')
+    assert os.listdir(tmp_path) == []
+    assert core.metrics.summary()['pages'] == {'failed': 1}
+    core.close()
+
+
+def test_web_to_pdf_batch_uses_core(tmp_path):
+    """WebToPDF.convert_urls_to_pdf 通过流水线提交渲染，结果与输入顺序一致"""
+    from web_to_pdf import WebToPDF
+    from test_fetchers import start_server, page
+
+    server, base, seen = start_server({'/a': page('A'), '/b': page('B'), '/missing': page('无', status=404)})
+    try:
+        converter = WebToPDF(render_cache=RenderCache(str(tmp_path / 'cache')), metrics=ConversionMetrics())
+        converter.renderer = FakeRenderer()
+        converter.core.renderers = [converter.renderer]
+        urls = [base + '/a', base + '/missing', base + '/b']
+        results = converter.convert_urls_to_pdf(urls, str(tmp_path / 'out'))
+        converter.core.close()
+    finally:
+        server.shutdown()
+
+    assert isinstance(results[1], Exception)
+    for result, text in ((results[0], 'A'), (results[2], 'B')):
+        with open(result, encoding='utf-8') as f:
+            assert text in f.read()
+    assert converter.metrics.summary()['pages'] == {'success': 2, 'failed': 1}
+
+
+def test_converters_share_setup():
+    """各转换器由 ConverterBase.setup_core 装配，共用同一个连接池"""
+    from web_to_pdf_simple import SimpleWebToPDF
+    from web_to_pdf_enhanced import EnhancedWebToPDF
+    from batch_web_to_pdf import BatchWebToPDF
+    from converter_core import BROWSER_HEADERS
+
+    simple, enhanced, batch = SimpleWebToPDF(), EnhancedWebToPDF(), BatchWebToPDF(respect_crawl_delay=False)
+    assert simple.session is enhanced.session is batch.session
+    assert simple.fetcher.headers != BROWSER_HEADERS
+    assert enhanced.fetcher.headers == batch.fetcher.headers == BROWSER_HEADERS
+    assert batch.fetcher.scheduler is batch.scheduler
+    assert batch.metrics is not None and simple.metrics is None
+    for converter in (simple, enhanced, batch):
+        assert converter.core.fetcher is converter.fetcher
+        assert converter.retry_policy is converter.fetcher.retry_policy
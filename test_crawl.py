@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试站点抓取的页面数上限和去重
+"""
+
+import pytest
+
+pytest.importorskip('lxml')
+
+from batch_web_to_pdf import BatchWebToPDF
+from test_fetchers import start_server, page
+
+
+def links(*paths):
+    return ''.join(f'<a href="{path}">页面{path}</a>' for path in paths)
+
+
+def redirect(location):
+    return lambda handler: (301, {'Location': location}, b'')
+
+
+@pytest.fixture
+def converter():
+    return BatchWebToPDF(max_workers=2, render_workers=1, request_delay=0, async_fetch=False,
+                         respect_crawl_delay=False)
+
+
+def test_redirects_do_not_use_up_max_pages(tmp_path, converter):
+    """/docs -> /docs/ 这样的重定向只用于去重，不占用max_pages"""
+    routes = {'/docs': redirect('/docs/'), '/docs/': page(links('/p1', '/p2', '/p3', '/p4', '/p5', '/p6'))}
+    for number in range(1, 7):
+        routes[f'/p{number}'] = redirect(f'/p{number}/')
+        routes[f'/p{number}/'] = page(f'第{number}页')
+    server, base, seen = start_server(routes)
+    try:
+        results = converter.crawl(base + '/docs', output_dir=str(tmp_path), max_depth=2, max_pages=4)
+    finally:
+        server.shutdown()
+    assert [result['url'] for result in results] == [base + path for path in ('/docs', '/p1', '/p2', '/p3')]
+    assert all(result['status'] == 'success' for result in results)
+
+
+def test_same_final_url_rendered_once(tmp_path, converter):
+    routes = {
+        '/': page(links('/a', '/alias', '/b')),
+        '/a': redirect('/a/'),
+        '/alias': redirect('/a/'),
+        '/a/': page(links('/b')),
+        '/b': page('B'),
+    }
+    server, base, seen = start_server(routes)
+    try:
+        results = converter.crawl(base + '/', output_dir=str(tmp_path), max_depth=2, max_pages=10)
+    finally:
+        server.shutdown()
+
+    urls = [result['url'] for result in results]
+    assert len(urls) == 3
+    assert urls[0] == base + '/' and base + '/b' in urls
+    assert len({result['output_path'] for result in results}) == 3
+    # /b 在两个页面中出现，只获取一次
+    assert [path for path, headers, port in seen].count('/b') == 1
+
+
+def test_duplicates_recorded_in_journal(tmp_path, converter):
+    from job_journal import JobJournal
+
+    routes = {
+        '/': page(links('/a', '/alias')),
+        '/a': redirect('/a/'),
+        '/alias': redirect('/a/'),
+        '/a/': page('A'),
+    }
+    server, base, seen = start_server(routes)
+    try:
+        with JobJournal(str(tmp_path / 'job.sqlite3')) as journal:
+            results = converter.crawl(base + '/', output_dir=str(tmp_path / 'out'), max_depth=1, journal=journal)
+            assert len(results) == 2
+            assert journal.pending_urls() == []
+            assert journal.counts()['success'] == 3
+    finally:
+        server.shutdown()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试同步和异步获取器，使用本机的 http.server 代替真实网站
+"""
+
+import time
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from converter_core import HttpFetcher
+from http_cache import ResponseCache
+from metrics import ConversionMetrics
+from host_scheduler import HostScheduler
+from retry_policy import RetryPolicy
+
+
+def start_server(routes):
+    """
+    启动本机服务器，routes为 {路径: callable(handler) -> (状态码, 响应头, 响应体)}
+    返回 (server, base_url, requests)，requests按顺序记录 (路径, 请求头)
+    """
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            requests_seen.append((self.path, dict(self.headers), self.client_address[1]))
+            route = routes.get(self.path)
+            status, headers, body = route(self) if route else (404, {}, b'not found')
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}', requests_seen
+
+
+def page(text, status=200, **headers):
+    return lambda handler: (status, dict({'Content-Type': 'text/html; charset=utf-8'}, **headers),
+                            f'<html><body>{text}</body></html>'.encode('utf-8'))
+
+
+def revalidated(text):
+    """带ETag的页面，条件请求时返回304"""
+    def route(handler):
+        if handler.headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return page(text, ETag='"v1"')(handler)
+    return route
+
+
+@pytest.fixture
+def redirect_server():
+    server, base, seen = start_server({
+        '/docs': lambda handler: (301, {'Location': '/docs/'}, b''),
+        '/docs/': revalidated('文档'),
+    })
+    yield base, seen
+    server.shutdown()
+
+
+def test_sync_304_links_redirected_url(tmp_path, redirect_server):
+    """从缓存返回重定向过的页面时，渲染耗时仍记到请求地址的明细中"""
+    base, seen = redirect_server
+    metrics = ConversionMetrics()
+    scheduler = HostScheduler(min_interval=0)
+    fetcher = HttpFetcher(cache=ResponseCache(str(tmp_path / 'cache')), metrics=metrics, scheduler=scheduler)
+    url = base + '/docs'
+    assert fetcher.fetch(url) == ('<html><body>文档</body></html>', base + '/docs/')
+
+    metrics.reset()
+    content, final_url = fetcher.fetch(url)
+    assert final_url == base + '/docs/'
+    metrics.record('render', 0.5, final_url)
+    assert metrics.url_timings(url)['render'] == 0.5
+
+
+def test_async_304_links_and_notes_response(tmp_path, redirect_server):
+    pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    base, seen = redirect_server
+    metrics = ConversionMetrics()
+    noted = []
+    scheduler = HostScheduler(min_interval=0)
+    scheduler.note_response = lambda url, status, headers=None: noted.append(status)
+    fetcher = AsyncFetcher(cache=ResponseCache(str(tmp_path / 'cache')), metrics=metrics, scheduler=scheduler)
+    url = base + '/docs'
+    assert fetcher.fetch_all([url]) == [('<html><body>文档</body></html>', base + '/docs/')]
+
+    metrics.reset()
+    noted.clear()
+    [(content, final_url)] = fetcher.fetch_all([url])
+    assert final_url == base + '/docs/'
+    assert noted == [304]
+    metrics.record('render', 0.5, final_url)
+    assert metrics.url_timings(url)['render'] == 0.5
+
+
+@pytest.fixture
+def site():
+    def slow(text, seconds):
+        def route(handler):
+            time.sleep(seconds)
+            return page(text)(handler)
+        return route
+
+    server, base, seen = start_server({
+        '/slow': slow('慢', 0.3),
+        '/fast': page('快'),
+        '/other': page('其他'),
+        '/missing': page('不存在', status=404),
+        '/error': page('错误', status=500),
+    })
+    yield base, seen
+    server.shutdown()
+
+
+def test_async_results_keep_input_order(site):
+    pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    base, seen = site
+    urls = [base + path for path in ('/slow', '/fast', '/other')]
+    results = AsyncFetcher().fetch_all(urls)
+    assert [content for content, final_url in results] == [
+        '<html><body>慢</body></html>', '<html><body>快</body></html>', '<html><body>其他</body></html>'
+    ]
+    assert [final_url for content, final_url in results] == urls
+
+
+def test_async_errors_are_returned_in_place(site):
+    """失败的URL在结果中为异常对象，不影响其他URL；5xx按策略重试"""
+    aiohttp = pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    base, seen = site
+    urls = [base + '/missing', base + '/fast', base + '/error']
+    fetcher = AsyncFetcher(retry_policy=RetryPolicy(max_retries=1, backoff_base=0))
+    missing, fast, error = fetcher.fetch_all(urls)
+    assert isinstance(missing, aiohttp.ClientResponseError) and missing.status == 404
+    assert fast[0] == '<html><body>快</body></html>'
+    assert isinstance(error, aiohttp.ClientResponseError) and error.status == 500
+    assert [path for path, headers, port in seen].count('/error') == 2
+
+
+def test_async_reuses_connections(site):
+    pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    base, seen = site
+    urls = [base + '/fast'] * 5 + [base + '/other'] * 5
+    results = AsyncFetcher(limit_per_host=1).fetch_all(urls)
+    assert not any(isinstance(result, Exception) for result in results)
+    assert len({port for path, headers, port in seen}) == 1
+
+
+def test_async_on_result_streams_without_keeping_pages(site):
+    pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    base, seen = site
+    received = {}
+    urls = [base + '/fast', base + '/missing']
+    results = AsyncFetcher().fetch_all(urls, on_result=received.__setitem__)
+    assert results[0] is None
+    assert isinstance(results[1], Exception)
+    assert received[0][0] == '<html><body>快</body></html>'
+    assert received[1] is results[1]
+
+
+def test_async_max_pending_waits_for_follow_up(site):
+    """on_result返回的任务完成前不开始获取下一个URL"""
+    pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    base, seen = site
+    started = []
+    finished = []
+
+    def on_result(index, result):
+        started.append(time.monotonic())
+        future = Future()
+
+        def complete():
+            time.sleep(0.2)
+            finished.append(time.monotonic())
+            future.set_result(None)
+
+        threading.Thread(target=complete).start()
+        return future
+
+    AsyncFetcher().fetch_all([base + '/fast'] * 3, on_result=on_result, max_pending=1)
+    assert len(started) == 3
+    assert started[1] >= finished[0] and started[2] >= finished[1]
+
+
+@pytest.mark.parametrize('async_fetch', [True, False])
+def test_batch_convert_orders_results_and_reports_errors(tmp_path, site, async_fetch):
+    if async_fetch:
+        pytest.importorskip('aiohttp')
+    from batch_web_to_pdf import BatchWebToPDF
+
+    base, seen = site
+    urls = [base + path for path in ('/slow', '/missing', '/fast', '/other')]
+    converter = BatchWebToPDF(max_workers=2, render_workers=1, request_delay=0, async_fetch=async_fetch,
+                              respect_crawl_delay=False, max_pending=2,
+                              retry_policy=RetryPolicy(max_retries=0))
+    converter.html_renderer.render = slow_render(converter.html_renderer.render)
+    results = converter.batch_convert(urls, output_dir=str(tmp_path))
+
+    assert [result['url'] for result in results] == urls
+    assert [result['status'] for result in results] == ['success', 'failed', 'success', 'success']
+    with open(results[0]['output_path'], encoding='utf-8') as f:
+        assert '慢' in f.read()
+    assert converter.metrics.summary()['pages'] == {'success': 3, 'failed': 1}
+
+
+def slow_render(render):
+    """让渲染慢于获取，检验max_pending限制下批量转换仍能完成"""
+    def wrapper(*args, **kwargs):
+        time.sleep(0.05)
+        return render(*args, **kwargs)
+    return wrapper
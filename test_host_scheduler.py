@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按主机的请求调度
+"""
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from host_scheduler import HostScheduler, parse_retry_after, DEFAULT_RETRY_AFTER
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(None) == DEFAULT_RETRY_AFTER
+    assert parse_retry_after('soon') == DEFAULT_RETRY_AFTER
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+def test_reserve_spaces_requests_per_host():
+    """同一主机按最小间隔排队，不同主机互不影响"""
+    scheduler = HostScheduler(min_interval=10)
+    assert scheduler.reserve('http://a.example/1') == 0
+    assert 9.9 < scheduler.reserve('http://a.example/2') <= 10
+    assert scheduler.reserve('http://b.example/1') == 0
+
+
+def test_burst_allows_back_to_back_requests():
+    scheduler = HostScheduler(min_interval=10, burst=3)
+    waits = [scheduler.reserve('http://a.example/') for _ in range(4)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] > 9
+
+
+def test_next_ready_prefers_idle_hosts():
+    """繁忙主机冷却时先取出其他主机的请求"""
+    scheduler = HostScheduler(min_interval=10, max_per_host=1)
+    for item, url in [(1, 'http://a.example/1'), (2, 'http://a.example/2'), (3, 'http://b.example/1')]:
+        scheduler.add(item, url)
+
+    order = []
+    for _ in range(2):
+        item, url = scheduler.next_ready()
+        order.append(item)
+        scheduler.release(url)
+    assert order == [1, 3]
+    assert scheduler.pending == 1
+
+
+def test_next_ready_returns_none_when_empty():
+    assert HostScheduler().next_ready() is None
+
+
+def test_max_per_host_blocks_until_release():
+    scheduler = HostScheduler(min_interval=0, max_per_host=1)
+    scheduler.acquire('http://a.example/1')
+    acquired = threading.Event()
+
+    def worker():
+        scheduler.acquire('http://a.example/2')
+        acquired.set()
+        scheduler.release('http://a.example/2')
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+    scheduler.release('http://a.example/1')
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_retry_after_cools_down_host():
+    """429/503的Retry-After让该主机冷却，其他状态码和其他主机不受影响"""
+    scheduler = HostScheduler(min_interval=0)
+    scheduler.note_response('http://a.example/', 500, {'Retry-After': '60'})
+    assert scheduler.reserve('http://a.example/') == 0
+
+    scheduler.note_response('http://a.example/', 429, {'Retry-After': '60'})
+    assert 59 < scheduler.reserve('http://a.example/') <= 60
+    assert scheduler.reserve('http://b.example/') == 0
+
+
+def test_retry_after_wakes_after_cooldown():
+    scheduler = HostScheduler(min_interval=0)
+    scheduler.note_response('http://a.example/', 503, {'Retry-After': '1'})
+    scheduler.add('item', 'http://a.example/')
+    start = time.monotonic()
+    item, url = scheduler.next_ready()
+    assert item == 'item'
+    assert time.monotonic() - start >= 0.9
+    scheduler.release(url)
+
+
+def test_crawl_delay_lookup_called_once_per_host():
+    calls = []
+
+    def lookup(url):
+        calls.append(url)
+        return 5
+
+    scheduler = HostScheduler(min_interval=1, crawl_delay_lookup=lookup)
+    scheduler.check_robots('http://a.example/1')
+    scheduler.check_robots('http://a.example/2')
+    assert calls == ['http://a.example/1']
+    scheduler.reserve('http://a.example/1')
+    assert 4.9 < scheduler.reserve('http://a.example/2') <= 5
+
+
+def test_async_fetch_waits_outside_semaphore():
+    """异步获取时等待冷却的请求不占用并发名额，空闲主机的请求立即完成"""
+    pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = b'<html><body>ok</body></html>'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        busy = [f'http://127.0.0.1:{server.server_port}/{index}' for index in range(4)]
+        idle = f'http://localhost:{server.server_port}/'
+        finished = {}
+        start = time.monotonic()
+        fetcher = AsyncFetcher(limit=2, scheduler=HostScheduler(min_interval=0.5))
+        results = fetcher.fetch_all(busy + [idle],
+                                    on_result=lambda index, result: finished.setdefault(index, time.monotonic()))
+        assert not any(isinstance(result, Exception) for result in results)
+        assert finished[len(busy)] - start < 0.4
+        assert finished[len(busy) - 1] - start >= 1.4
+    finally:
+        server.shutdown()
+
+
+def test_thread_mode_retry_goes_through_scheduler():
+    """线程模式的重试先交还名额，再经调度器领取，遵守请求间隔"""
+    from converter_core import HttpFetcher
+    from retry_policy import RetryPolicy
+
+    hits = []
+    scheduler = HostScheduler(min_interval=1, max_per_host=1)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(time.monotonic())
+            status = 500 if len(hits) == 1 else 200
+            body = b'<html><body>ok</body></html>'
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f'http://127.0.0.1:{server.server_port}/'
+        fetcher = HttpFetcher(retry_policy=RetryPolicy(backoff_base=0), scheduler=scheduler)
+        scheduler.acquire(url)
+        try:
+            content, final_url = fetcher.fetch(url, scheduled=True)
+        finally:
+            scheduler.release(url)
+        assert 'ok' in content
+        assert hits[1] - hits[0] >= 0.9
+        assert scheduler.hosts[f'127.0.0.1:{server.server_port}'].active == 0
+    finally:
+        server.shutdown()
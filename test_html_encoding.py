@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试网页编码识别
+"""
+
+import codecs
+
+import pytest
+
+import html_encoding
+from html_encoding import resolve_encoding, decode_html, charset_from_content_type
+
+CHINESE = '网页转PDF工具，专门优化中文支持的版本。' * 20
+
+
+def test_bom_wins():
+    body = codecs.BOM_UTF8 + '<meta charset="gbk">中文'.encode('utf-8')
+    assert resolve_encoding(body, 'text/html; charset=gbk') == ('utf-8-sig', 'bom')
+
+
+def test_header_charset():
+    assert charset_from_content_type('text/html; charset="GBK"') == 'GBK'
+    assert resolve_encoding(CHINESE.encode('gbk'), 'text/html; charset=GBK') == ('gb18030', 'header')
+
+
+def test_header_latin1_is_ignored_in_favor_of_meta():
+    """响应头中的ISO-8859-1多为服务器默认值，按页面中的声明处理"""
+    body = '<html><head><meta charset="gb2312"></head>'.encode('ascii') + CHINESE.encode('gbk')
+    assert resolve_encoding(body, 'text/html; charset=ISO-8859-1') == ('gb18030', 'meta')
+
+
+@pytest.mark.parametrize('declared', ['latin-1', 'ISO-8859-1', 'us-ascii', 'ascii'])
+def test_supersets_apply_to_normalized_names(declared):
+    """latin-1和ascii规范化后同样按cp1252解码"""
+    body = f'<meta charset="{declared}">'.encode('ascii') + b'\x93quoted\x94'
+    assert resolve_encoding(body) == ('cp1252', 'meta')
+    content, encoding = decode_html(body)
+    assert content.endswith('“quoted”')
+
+
+def test_meta_utf16_is_ignored():
+    body = b'<meta charset="utf-16"><p>plain</p>'
+    assert resolve_encoding(body) == ('utf-8', 'detected')
+
+
+def test_detects_gbk_without_declaration():
+    assert resolve_encoding(CHINESE.encode('gbk')) == ('gb18030', 'detected')
+
+
+def test_chardet_fallback(monkeypatch):
+    """没有安装charset_normalizer时使用chardet"""
+    class FakeChardet:
+        @staticmethod
+        def detect(sample):
+            return {'encoding': 'GB2312', 'confidence': 0.99}
+
+    monkeypatch.setattr(html_encoding, 'from_bytes', None)
+    monkeypatch.setattr(html_encoding, 'chardet', FakeChardet)
+    assert resolve_encoding(CHINESE.encode('gbk')) == ('gb18030', 'detected')
+
+
+def test_without_detectors_falls_back_to_utf8(monkeypatch):
+    monkeypatch.setattr(html_encoding, 'from_bytes', None)
+    monkeypatch.setattr(html_encoding, 'chardet', None)
+    assert resolve_encoding(CHINESE.encode('gbk')) == ('utf-8', 'default')
+
+
+def test_truncated_utf8_sample_is_still_utf8():
+    """统计样本的截断处切断多字节字符时仍判定为UTF-8"""
+    body = ('中' * html_encoding.DETECT_SAMPLE_BYTES).encode('utf-8')
+    assert resolve_encoding(body) == ('utf-8', 'detected')
+
+
+def test_decode_bytearray():
+    content, encoding = decode_html(bytearray(CHINESE.encode('utf-8')))
+    assert (content, encoding) == (CHINESE, 'utf-8')
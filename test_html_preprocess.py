@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试渲染前的HTML处理
+"""
+
+from html_preprocess import inject_head, enhance_html_for_chinese, CHARSET_META, DEFAULT_FONT_FAMILY
+
+SNIPPET = '<style>p{}</style>'
+
+
+def test_inserts_after_head_with_charset():
+    html = '<html><HEAD lang="zh"><title>t</title></HEAD><body></body></html>'
+    assert inject_head(html, SNIPPET) == (
+        '<html><HEAD lang="zh">' + CHARSET_META + SNIPPET + '<title>t</title></HEAD><body></body></html>'
+    )
+
+
+def test_keeps_existing_charset_declaration():
+    for declaration in ('<meta charset="gbk">', '<meta http-equiv="Content-Type" content="text/html; charset=gbk">'):
+        html = f'<html><head>{declaration}</head><body></body></html>'
+        assert inject_head(html, SNIPPET) == f'<html><head>{SNIPPET}{declaration}</head><body></body></html>'
+
+
+def test_charset_in_body_does_not_count():
+    """编码声明只在<head>中检查，正文中的meta不算"""
+    html = '<html><head></head><body><meta charset="gbk"></body></html>'
+    assert CHARSET_META in inject_head(html, SNIPPET)
+
+
+def test_charset_false_inserts_only_snippet():
+    html = '<html><head></head></html>'
+    assert inject_head(html, SNIPPET, charset=False) == f'<html><head>{SNIPPET}</head></html>'
+
+
+def test_creates_head_after_html():
+    html = '<html lang="zh"><body>正文</body></html>'
+    assert inject_head(html, SNIPPET) == (
+        f'<html lang="zh">\n<head>{CHARSET_META}{SNIPPET}\n</head><body>正文</body></html>'
+    )
+
+
+def test_fragment_is_unchanged():
+    assert inject_head('<p>片段</p>', SNIPPET) == '<p>片段</p>'
+
+
+def test_only_first_head_is_used():
+    html = '<html><head></head><body><pre>&lt;head&gt;<head></pre></body></html>'
+    result = inject_head(html, SNIPPET)
+    assert result.count(SNIPPET) == 1
+    assert result.index(SNIPPET) < result.index('<body>')
+
+
+def test_enhance_adds_font_family():
+    result = enhance_html_for_chinese('<html><head></head><body>中文</body></html>')
+    assert DEFAULT_FONT_FAMILY in result
+    assert CHARSET_META in result
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量任务日志的中断恢复
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from job_journal import JobJournal, PENDING, SUCCESS, FAILED
+
+URLS = ['https://example.com/a', 'https://example.com/b', 'https://example.com/c']
+
+
+def success(url, path='/tmp/a.pdf'):
+    return {'url': url, 'output_path': path, 'file_type': 'pdf', 'file_size': 1.5, 'status': SUCCESS}
+
+
+def test_add_urls_keeps_existing_state(tmp_path):
+    with JobJournal(str(tmp_path / 'job.sqlite3')) as journal:
+        journal.add_urls(URLS[:2])
+        journal.record(success(URLS[0]))
+        journal.add_urls(URLS)
+        assert journal.urls() == URLS
+        assert journal.counts() == {PENDING: 2, SUCCESS: 1, FAILED: 0}
+
+
+def test_resume_after_reopen(tmp_path):
+    """重新打开日志后只需处理未完成和失败的URL，已成功的结果保留"""
+    path = str(tmp_path / 'job.sqlite3')
+    with JobJournal(path) as journal:
+        journal.add_urls(URLS)
+        journal.record(success(URLS[0]))
+        journal.record({'url': URLS[1], 'error': '超时', 'status': FAILED})
+
+    with JobJournal(path) as journal:
+        assert journal.pending_urls() == URLS[1:]
+        assert journal.pending_urls(retry_failed=False) == URLS[2:]
+        assert journal.completed() == {URLS[0]: success(URLS[0])}
+        assert journal.completed([URLS[1]]) == {}
+        assert journal.results() == [success(URLS[0]), {'url': URLS[1], 'error': '超时', 'status': FAILED}]
+
+
+def test_record_counts_attempts(tmp_path):
+    with JobJournal(str(tmp_path / 'job.sqlite3')) as journal:
+        journal.add_urls(URLS[:1])
+        journal.record({'url': URLS[0], 'error': '超时', 'status': FAILED})
+        journal.record(success(URLS[0]))
+        attempts = journal.conn.execute("SELECT attempts FROM items").fetchone()[0]
+        assert attempts == 2
+        assert journal.pending_urls() == []
+
+
+def test_batch_convert_skips_completed_urls(tmp_path):
+    """batch_convert 直接使用日志中已成功的结果，只请求其余的URL"""
+    from batch_web_to_pdf import BatchWebToPDF
+
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path)
+            body = f'<html><head><title>{self.path}</title></head><body>内容</body></html>'.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        urls = [f'http://127.0.0.1:{server.server_port}/{name}' for name in ('a', 'b')]
+        with JobJournal(str(tmp_path / 'job.sqlite3')) as journal:
+            journal.add_urls(urls)
+            journal.record(success(urls[0], str(tmp_path / 'a.pdf')))
+
+            converter = BatchWebToPDF(max_workers=2, request_delay=0, async_fetch=False,
+                                      respect_crawl_delay=False)
+            results = converter.batch_convert(urls, output_dir=str(tmp_path / 'out'), journal=journal)
+
+            assert requested == ['/b']
+            assert [result['status'] for result in results] == [SUCCESS, SUCCESS]
+            assert results[0]['output_path'] == str(tmp_path / 'a.pdf')
+            assert journal.pending_urls() == []
+    finally:
+        server.shutdown()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试从网页中提取链接：lxml增量解析与BeautifulSoup的结果一致
+"""
+
+import pytest
+
+pytest.importorskip('lxml')
+
+import batch_web_to_pdf
+from batch_web_to_pdf import BatchWebToPDF
+
+BODY = """<html><head><title>目录</title></head><body>
+<a href="/x">第一章</a>
+<p><a href="chapter/2.html" title="第二章"><span>第二</span>章</a></p>
+<a href="/x">重复</a>
+<a href="javascript:void(0)">脚本</a>
+<a href="style.css">样式</a>
+<a href="https://other.example/page"> 外部 </a>
+</body></html>"""
+
+PAGES = {
+    'plain': BODY,
+    'doctype': '<!DOCTYPE html>' + BODY,
+    'comment': '<!DOCTYPE html><!-- x -->' + BODY,
+    'xml': '<?xml version="1.0" encoding="utf-8"?>\n' + BODY,
+    'trailing comment': BODY + '<!-- end -->',
+}
+
+
+@pytest.fixture(scope='module')
+def converter():
+    return BatchWebToPDF(async_fetch=False, respect_crawl_delay=False)
+
+
+def links_with(converter, monkeypatch, lxml, html):
+    monkeypatch.setattr(batch_web_to_pdf, 'LXML_AVAILABLE', lxml)
+    return [link['url'] for link in converter.extract_links_from_page('https://example.com/docs/', html)]
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_lxml_matches_beautifulsoup(converter, monkeypatch, name):
+    """根元素前有注释或XML声明时lxml同样提取到全部链接"""
+    expected = [
+        'https://example.com/x',
+        'https://example.com/docs/chapter/2.html',
+        'https://other.example/page',
+    ]
+    assert links_with(converter, monkeypatch, False, PAGES[name]) == expected
+    assert links_with(converter, monkeypatch, True, PAGES[name]) == expected
+
+
+def test_link_text_and_title(converter, monkeypatch):
+    monkeypatch.setattr(batch_web_to_pdf, 'LXML_AVAILABLE', True)
+    links = converter.extract_links_from_page('https://example.com/docs/', PAGES['comment'])
+    assert links[1] == {'url': 'https://example.com/docs/chapter/2.html', 'text': '第二章', 'title': '第二章'}
+
+
+def test_large_page_in_chunks(converter):
+    html = '<!-- x --><html><body>' + ''.join(
+        f'<div><a href="/p/{index}">页面{index}</a></div>' for index in range(5000)
+    ) + '</body></html>'
+    links = list(converter.iter_links_from_page('https://example.com/', html, chunk_size=1024))
+    assert len(links) == 5000
+    assert links[-1]['url'] == 'https://example.com/p/4999'
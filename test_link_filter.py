@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试链接过滤器
+"""
+
+import re
+
+from link_filter import LinkFilter, DEFAULT_INVALID_PATTERNS
+
+URLS = [
+    'https://example.com/docs/intro',
+    'https://example.com/',
+    'https://example.cn/',
+    'https://example.com/docs/',
+    'javascript:void(0)',
+    'MAILTO:someone@example.com',
+    'tel:123',
+    'https://example.com/page#section',
+    'https://example.com/style.CSS',
+    'https://example.com/file.pdf?download=1',
+    'https://example.com/Login',
+    'https://example.com/administrator/tools',
+    'https://example.com/blog/2024/post.html',
+]
+
+
+def old_is_valid(url, text):
+    """逐条匹配的原实现，合并后的正则必须与其结果一致"""
+    for pattern in DEFAULT_INVALID_PATTERNS:
+        if re.search(pattern, url, re.IGNORECASE):
+            return False
+    return bool(text.strip())
+
+
+def test_default_patterns_match_original():
+    link_filter = LinkFilter()
+    for url in URLS:
+        for text in ('链接', '  '):
+            assert link_filter.is_valid(url, text) == old_is_valid(url, text), url
+
+
+def test_hosts_include_subdomains():
+    link_filter = LinkFilter(allow_hosts=['Example.com'], deny_hosts=['.blog.example.com'])
+    assert link_filter.is_valid('https://example.com/a', 'a')
+    assert link_filter.is_valid('https://docs.EXAMPLE.com/a', 'a')
+    assert not link_filter.is_valid('https://blog.example.com/a', 'a')
+    assert not link_filter.is_valid('https://cn.blog.example.com/a', 'a')
+    assert not link_filter.is_valid('https://badexample.com/a', 'a')
+
+
+def test_path_prefixes():
+    link_filter = LinkFilter(allow_paths=['/docs/', '/api/'], deny_paths=['/docs/old/'])
+    assert link_filter.is_valid('https://example.com/docs/intro', 'a')
+    assert link_filter.is_valid('https://example.com/api/v1', 'a')
+    assert not link_filter.is_valid('https://example.com/docs/old/intro', 'a')
+    assert not link_filter.is_valid('https://example.com/blog/docs/', 'a')
+
+
+def test_extensions():
+    deny = LinkFilter(deny_extensions=['.EPUB', 'mobi'])
+    assert not deny.is_valid('https://example.com/book.epub', 'a')
+    assert not deny.is_valid('https://example.com/book.MOBI?x=1', 'a')
+    assert deny.is_valid('https://example.com/v1.2/book', 'a')
+
+    allow = LinkFilter(allow_extensions=['html', ''])
+    assert allow.is_valid('https://example.com/a.html', 'a')
+    assert allow.is_valid('https://example.com/a', 'a')
+    assert not allow.is_valid('https://example.com/a.php', 'a')
+
+
+def test_query():
+    link_filter = LinkFilter(allow_query=[r'^$', r'lang=zh'], deny_query=[r'(^|&)sort='])
+    assert link_filter.is_valid('https://example.com/a', 'a')
+    assert link_filter.is_valid('https://example.com/a?lang=zh', 'a')
+    assert not link_filter.is_valid('https://example.com/a?lang=zh&sort=date', 'a')
+    assert not link_filter.is_valid('https://example.com/a?page=2', 'a')
+
+
+def test_invalid_patterns_can_be_replaced():
+    link_filter = LinkFilter(invalid_patterns=[r'\?print='])
+    assert link_filter.is_valid('https://example.com/login', '登录')
+    assert not link_filter.is_valid('https://example.com/a?print=1', 'a')
+    assert LinkFilter(invalid_patterns=None).is_valid('javascript:void(0)', 'a')
+
+
+def test_converter_applies_filter():
+    """从页面提取链接时使用转换器的过滤器"""
+    from batch_web_to_pdf import BatchWebToPDF
+
+    link_filter = LinkFilter(allow_hosts=['example.com'], deny_paths=['/private'], deny_extensions=['zip'],
+                             deny_query=['utm_'])
+    converter = BatchWebToPDF(link_filter=link_filter, respect_crawl_delay=False)
+    html = '''<html><body>
+        <a href="/docs/a">A</a>
+        <a href="/private/b">B</a>
+        <a href="https://other.com/c">C</a>
+        <a href="/files/d.zip">D</a>
+        <a href="/docs/e?utm_source=x">E</a>
+    </body></html>'''
+    links = converter.extract_links_from_page('https://www.example.com/', html)
+    assert [link['url'] for link in links] == ['https://www.example.com/docs/a']
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试转换指标的汇总和导出
+"""
+
+import re
+
+from metrics import ConversionMetrics
+from test_fetchers import start_server, page
+
+SAMPLE_RE = re.compile(r'^[a-z_][a-z0-9_]*(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?\d+(\.\d+)?$')
+
+
+def make_metrics():
+    metrics = ConversionMetrics()
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        metrics.record('render', seconds, 'https://example.com/a')
+    metrics.record('wait', 1.5, 'https://example.com/b')
+    metrics.count('downloaded_bytes', 2048)
+    metrics.finish('https://example.com/a', 'success')
+    metrics.finish('https://example.com/b', 'failed', error='超时')
+    return metrics
+
+
+def test_prometheus_format():
+    """每个指标先有TYPE行，样本行符合Prometheus文本格式，阶段按流水线顺序输出"""
+    text = make_metrics().to_prometheus()
+    lines = text.splitlines()
+    assert text.endswith('\n')
+
+    declared = set()
+    for line in lines:
+        if line.startswith('# TYPE '):
+            declared.add(line.split()[2])
+        elif not line.startswith('# HELP '):
+            assert SAMPLE_RE.match(line), line
+            name = line.split('{')[0].split()[0]
+            assert name in declared or re.sub(r'_(sum|count)$', '', name) in declared, line
+
+    assert 'net2pdf_stage_seconds{stage="render",quantile="0.5"} 0.200000' in lines
+    assert 'net2pdf_stage_seconds{stage="render",quantile="0.99"} 0.400000' in lines
+    assert 'net2pdf_stage_seconds_sum{stage="render"} 1.000000' in lines
+    assert 'net2pdf_stage_seconds_count{stage="render"} 4' in lines
+    assert 'net2pdf_pages_total{status="failed"} 1' in lines
+    assert 'net2pdf_pages_total{status="success"} 1' in lines
+    assert 'net2pdf_downloaded_bytes_total 2048' in lines
+    assert text.index('stage="wait"') < text.index('stage="render"')
+
+
+def test_export_chooses_format_by_extension(tmp_path):
+    metrics = make_metrics()
+    prom = metrics.export(str(tmp_path / 'metrics.prom'))
+    summary = metrics.export(str(tmp_path / 'metrics.json'))
+    with open(prom, encoding='utf-8') as f:
+        assert f.read().startswith('# HELP net2pdf_stage_seconds')
+    with open(summary, encoding='utf-8') as f:
+        assert '"超时"' in f.read()
+
+
+def test_thread_mode_records_scheduler_wait(tmp_path):
+    """线程模式下等待调度器放行的时间记到对应URL的wait阶段"""
+    from batch_web_to_pdf import BatchWebToPDF
+
+    server, base, seen = start_server({'/a': page('A'), '/b': page('B')})
+    try:
+        converter = BatchWebToPDF(max_workers=2, request_delay=0.3, async_fetch=False, respect_crawl_delay=False)
+        urls = [base + '/a', base + '/b']
+        results = converter.batch_convert(urls, output_dir=str(tmp_path))
+    finally:
+        server.shutdown()
+
+    assert [result['status'] for result in results] == ['success', 'success']
+    waits = sorted(converter.metrics.url_timings(url).get('wait', 0.0) for url in urls)
+    assert waits[1] >= 0.25
+    assert converter.metrics.summary()['stages']['wait']['count'] == 2
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试输出文件路径和原子写入
+"""
+
+import os
+import shutil
+import hashlib
+
+import pytest
+
+from http_cache import normalize_url
+from output_paths import output_path, atomic_path, temp_path_for, MAX_SLUG_LENGTH
+
+
+def test_path_is_stable_and_sharded(tmp_path):
+    """同一URL总是得到同一路径，文件放在哈希前两位的子目录中"""
+    output_dir = str(tmp_path)
+    path = output_path('https://example.com/docs/intro', output_dir)
+    assert path == output_path('https://example.com/docs/intro', output_dir)
+    directory, name = os.path.split(path)
+    shard = os.path.relpath(directory, output_dir)
+    assert len(shard) == 2 and os.path.isdir(directory)
+    assert name.startswith('example_com_docs_intro_') and name.endswith('.pdf')
+    digest = hashlib.sha1(normalize_url('https://example.com/docs/intro').encode('utf-8')).hexdigest()
+    assert shard == digest[:2]
+    assert name.endswith(f'_{digest[:12]}.pdf')
+
+
+def test_distinct_urls_get_distinct_paths(tmp_path):
+    """路径相同但查询参数不同的URL，以及只差大小写的路径，不会写到同一个文件"""
+    urls = ['https://example.com/a?page=1', 'https://example.com/a?page=2', 'https://example.com/A']
+    assert len({output_path(url, str(tmp_path)) for url in urls}) == len(urls)
+
+
+def test_shard_depth(tmp_path):
+    flat = output_path('https://example.com/a', str(tmp_path), 'html', shard_depth=0)
+    deep = output_path('https://example.com/a', str(tmp_path), 'html', shard_depth=2)
+    assert os.path.dirname(flat) == str(tmp_path)
+    assert len(os.path.relpath(os.path.dirname(deep), str(tmp_path)).split(os.sep)) == 2
+    assert os.path.basename(flat) == os.path.basename(deep)
+
+
+def test_long_path_is_truncated(tmp_path):
+    name = os.path.basename(output_path('https://example.com/' + 'x' * 500, str(tmp_path)))
+    assert len(name) <= MAX_SLUG_LENGTH + len('_') + 12 + len('.pdf')
+
+
+def test_recreates_deleted_directory(tmp_path):
+    """运行中输出目录被删除后，下次生成路径时重新创建"""
+    path = output_path('https://example.com/a', str(tmp_path))
+    shutil.rmtree(os.path.dirname(path))
+    path = output_path('https://example.com/a', str(tmp_path))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('ok')
+
+
+def test_atomic_path_replaces_on_success(tmp_path):
+    target = str(tmp_path / 'a.pdf')
+    with open(target, 'w', encoding='utf-8') as f:
+        f.write('old')
+    with atomic_path(target) as temp:
+        assert os.path.dirname(temp) == str(tmp_path)
+        assert temp == temp_path_for(target)
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write('new')
+        with open(target, encoding='utf-8') as f:
+            assert f.read() == 'old'
+    with open(target, encoding='utf-8') as f:
+        assert f.read() == 'new'
+    assert os.listdir(tmp_path) == ['a.pdf']
+
+
+def test_atomic_path_keeps_old_file_on_error(tmp_path):
+    target = str(tmp_path / 'a.pdf')
+    with open(target, 'w', encoding='utf-8') as f:
+        f.write('old')
+    with pytest.raises(RuntimeError):
+        with atomic_path(target) as temp:
+            with open(temp, 'w', encoding='utf-8') as f:
+                f.write('half')
+            raise RuntimeError("渲染失败")
+    with open(target, encoding='utf-8') as f:
+        assert f.read() == 'old'
+    assert os.listdir(tmp_path) == ['a.pdf']
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流式PDF合并
+"""
+
+import pytest
+
+pypdf = pytest.importorskip('pypdf')
+
+from pdf_merge import StreamingPDFMerger
+
+
+def make_pdf(path, sizes):
+    """生成每页尺寸为sizes中对应 (宽, 高) 的PDF"""
+    writer = pypdf.PdfWriter()
+    for width, height in sizes:
+        writer.add_blank_page(width=width, height=height)
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_merge_pages_and_outline(tmp_path):
+    first = make_pdf(tmp_path / 'first.pdf', [(200, 300), (210, 310)])
+    second = make_pdf(tmp_path / 'second.pdf', [(400, 500)])
+    output = str(tmp_path / 'merged.pdf')
+
+    with StreamingPDFMerger(output) as merger:
+        assert merger.append(first, '第一篇') == 2
+        assert merger.append(second, 'Second') == 1
+
+    reader = pypdf.PdfReader(output)
+    assert [(float(page.mediabox.width), float(page.mediabox.height)) for page in reader.pages] == [
+        (200, 300), (210, 310), (400, 500)
+    ]
+    outline = reader.outline
+    assert [item.title for item in outline] == ['第一篇', 'Second']
+    assert [reader.get_destination_page_number(item) for item in outline] == [0, 2]
+
+
+def test_merge_without_sources(tmp_path):
+    output = str(tmp_path / 'empty.pdf')
+    StreamingPDFMerger(output).close()
+    reader = pypdf.PdfReader(output)
+    assert len(reader.pages) == 0
+    assert reader.outline == []
+
+
+def test_close_is_idempotent(tmp_path):
+    output = str(tmp_path / 'merged.pdf')
+    merger = StreamingPDFMerger(output)
+    merger.append(make_pdf(tmp_path / 'one.pdf', [(100, 100)]), 'one')
+    merger.close()
+    merger.close()
+    assert len(pypdf.PdfReader(output).pages) == 1
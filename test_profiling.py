@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按URL的性能剖析输出
+"""
+
+import os
+import json
+import pstats
+
+from profiling import ConversionProfiler, profiled, profiler_from_env, PROFILE_ENV, SECTIONS
+from test_fetchers import start_server, page
+
+URL = 'https://example.com/docs/a'
+
+
+def parse_page():
+    return [line.upper() for line in ['<p>中文</p>'] * 1000]
+
+
+def read_report(profiler, url):
+    with open(os.path.join(profiler.directory_for(url), 'report.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_sections_write_profiles_and_reports(tmp_path):
+    """每个环节写出一个.prof文件，报告按 fetch/parse/render 的顺序列出各环节"""
+    profiler = ConversionProfiler(str(tmp_path), memory=True, top=5)
+    try:
+        for section in reversed(SECTIONS):
+            with profiler.section(section, URL):
+                parse_page()
+    finally:
+        profiler.close()
+
+    directory = profiler.directory_for(URL)
+    assert sorted(os.listdir(directory)) == ['fetch.prof', 'parse.prof', 'render.prof', 'report.json', 'report.txt']
+    stats = pstats.Stats(os.path.join(directory, 'parse.prof'))
+    assert any(name == 'parse_page' for (_, _, name) in stats.stats)
+
+    report = read_report(profiler, URL)
+    assert report['url'] == URL
+    assert list(report['sections']) == list(SECTIONS)
+    for item in report['sections'].values():
+        assert item['calls'] == 1 and item['seconds'] >= 0 and item['peak_mb'] >= 0
+
+    with open(os.path.join(directory, 'report.txt'), encoding='utf-8') as f:
+        text = f.read()
+    assert text.startswith(f'URL: {URL}')
+    assert text.index('== fetch: 1 次') < text.index('== parse: 1 次') < text.index('== render: 1 次')
+    assert 'parse_page' in text
+    assert '分配最多的代码行' in text
+
+
+def test_repeated_and_nested_sections(tmp_path):
+    """同一环节多次执行时累加；嵌套的环节计入外层，不单独输出"""
+    profiler = ConversionProfiler(str(tmp_path), memory=False)
+    for _ in range(2):
+        with profiler.section('render', URL):
+            with profiler.section('parse', URL):
+                parse_page()
+
+    report = read_report(profiler, URL)
+    assert report['sections'] == {'render': {'calls': 2, 'seconds': report['sections']['render']['seconds'],
+                                             'peak_mb': None}}
+
+
+def test_redirected_url_shares_directory(tmp_path):
+    profiler = ConversionProfiler(str(tmp_path), memory=False)
+    with profiler.section('fetch', URL):
+        pass
+    profiler.link('https://example.com/docs/a/', URL)
+    with profiler.section('render', 'https://example.com/docs/a/'):
+        pass
+    assert list(read_report(profiler, URL)['sections']) == ['fetch', 'render']
+    assert len(os.listdir(str(tmp_path))) == 1
+
+
+def test_disabled_profiler(monkeypatch, tmp_path):
+    with profiled(None, 'fetch', URL):
+        pass
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    assert profiler_from_env() is None
+    monkeypatch.setenv(PROFILE_ENV, str(tmp_path))
+    profiler = profiler_from_env()
+    assert profiler.output_dir == str(tmp_path)
+    profiler.close()
+
+
+def test_batch_convert_profiles_each_url(tmp_path):
+    """批量转换时每个URL的获取、解析和渲染分别写入该URL的目录"""
+    from batch_web_to_pdf import BatchWebToPDF
+
+    server, base, seen = start_server({'/a': page('A'), '/b': page('B')})
+    profiler = ConversionProfiler(str(tmp_path / 'profiles'), memory=False)
+    try:
+        converter = BatchWebToPDF(max_workers=2, request_delay=0, async_fetch=True, respect_crawl_delay=False,
+                                  profiler=profiler)
+        assert converter.async_fetch is False
+        urls = [base + '/a', base + '/b']
+        results = converter.batch_convert(urls, output_dir=str(tmp_path / 'out'))
+    finally:
+        server.shutdown()
+
+    assert [result['status'] for result in results] == ['success', 'success']
+    for url in urls:
+        assert list(read_report(profiler, url)['sections']) == list(SECTIONS)
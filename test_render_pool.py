@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试wkhtmltopdf常驻渲染池，用读取标准输入参数的Python脚本代替wkhtmltopdf
+"""
+
+import os
+import sys
+import stat
+import urllib.request
+import urllib.error
+
+import pytest
+
+from render_pool import RenderPool, PageServer, options_to_args, quote_arg
+
+# 模拟 wkhtmltopdf --read-args-from-stdin：每行一个任务，把输入地址的内容写到输出文件，完成后输出Done
+FAKE_WKHTMLTOPDF = '''#!{python}
+import sys, shlex, urllib.request
+for line in sys.stdin:
+    args = shlex.split(line)
+    source, output = args[-2], args[-1]
+    if source.startswith('http'):
+        body = urllib.request.urlopen(source).read()
+    else:
+        body = open(source, 'rb').read()
+    with open(output, 'wb') as f:
+        f.write(b'%PDF-fake ' + ' '.join(args[:-2]).encode() + b'\\n' + body)
+    sys.stderr.write('[====] 100%\\rDone\\n')
+    sys.stderr.flush()
+'''
+
+
+@pytest.fixture
+def fake_binary(tmp_path):
+    path = tmp_path / 'wkhtmltopdf'
+    path.write_text(FAKE_WKHTMLTOPDF.format(python=sys.executable), encoding='utf-8')
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_options_to_args():
+    assert options_to_args({'page-size': 'A4', '--quiet': None, 'dpi': 96}) == [
+        '--page-size', 'A4', '--quiet', '--dpi', '96'
+    ]
+    assert quote_arg('C:\\a "b"') == '"C:\\\\a \\"b\\""'
+
+
+def test_page_server_publishes_only_inside_block():
+    server = PageServer()
+    try:
+        with server.publish('<p>中文页面</p>') as url:
+            with urllib.request.urlopen(url) as response:
+                assert response.read().decode('utf-8') == '<p>中文页面</p>'
+                assert 'charset=utf-8' in response.headers['Content-Type']
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url)
+    finally:
+        server.close()
+
+
+def test_render_string_writes_no_temp_files(tmp_path, fake_binary, monkeypatch):
+    """常驻进程从本机HTTP服务读取内存中的HTML，工作目录中不出现临时HTML文件"""
+    workdir = tmp_path / 'work'
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    output = str(tmp_path / 'out.pdf')
+
+    with RenderPool(size=1, max_jobs=2, binary=fake_binary, timeout=10) as pool:
+        for _ in range(3):
+            elapsed = pool.render_string('<p>中文页面</p>', output, {'page-size': 'A4'})
+            assert elapsed >= 0
+        assert pool.page_server.server.pages == {}
+        stats = pool.stats()
+
+    with open(output, 'rb') as f:
+        assert f.read() == b'%PDF-fake --page-size A4\n' + '<p>中文页面</p>'.encode('utf-8')
+    assert os.listdir(workdir) == []
+    assert stats['jobs'] == 3
+    assert stats['recycled'] == 1
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试响应体的大小限制、内容类型检查和转存临时文件
+"""
+
+import mmap
+
+import pytest
+
+from response_body import BodyLimits, BodyBuffer, ResponseTooLarge, UnsupportedContentType
+from converter_core import HttpFetcher
+from retry_policy import RetryPolicy
+from test_fetchers import start_server, page
+
+CHINESE = '网页转PDF工具，专门优化中文支持的版本。' * 200
+
+
+def test_small_body_stays_in_memory():
+    with BodyBuffer('u', max_bytes=1000, spool_bytes=100) as buffer:
+        buffer.write(b'a' * 60)
+        buffer.write(b'b' * 40)
+        assert buffer._file is None
+        assert bytes(buffer.getbuffer()) == b'a' * 60 + b'b' * 40
+
+
+def test_large_body_spills_to_file():
+    """超过spool_bytes后转存到临时文件，之后从只读内存映射中解码"""
+    body = f'<html><head><meta charset="gbk"></head><body>{CHINESE}</body></html>'.encode('gbk')
+    buffer = BodyBuffer('u', max_bytes=len(body), spool_bytes=1024)
+    for start in range(0, len(body), 700):
+        buffer.write(body[start:start + 700])
+    assert buffer._file is not None and len(buffer._memory) == 0
+    view = buffer.getbuffer()
+    assert isinstance(view, mmap.mmap) and view[:] == body
+
+    content, encoding = buffer.decode()
+    assert encoding == 'gb18030' and CHINESE in content
+    buffer.close()
+    assert buffer._file is None and buffer._map is None
+
+
+def test_max_bytes_aborts():
+    buffer = BodyBuffer('https://example.com/big', max_bytes=100, spool_bytes=50)
+    buffer.write(b'x' * 100)
+    with pytest.raises(ResponseTooLarge, match='example.com/big'):
+        buffer.write(b'x')
+    buffer.close()
+
+
+def test_check_headers():
+    limits = BodyLimits(max_bytes=1000)
+    limits.check_headers('u', {'Content-Type': 'Text/HTML; charset=utf-8', 'Content-Length': '1000'})
+    limits.check_headers('u', {})
+    limits.check_headers('u', {'Content-Length': 'bogus'})
+    with pytest.raises(UnsupportedContentType):
+        limits.check_headers('u', {'Content-Type': 'application/pdf'})
+    with pytest.raises(ResponseTooLarge):
+        limits.check_headers('u', {'Content-Type': 'text/html', 'Content-Length': '1001'})
+
+    unlimited = BodyLimits(max_bytes=None, allowed_types=None)
+    unlimited.check_headers('u', {'Content-Type': 'application/pdf', 'Content-Length': str(10 ** 12)})
+
+
+def test_fetcher_applies_limits():
+    """获取器先检查响应头，读取中超过上限时中止；转存到临时文件的网页照常解码"""
+    big = f'<html><body>{CHINESE}</body></html>'.encode('utf-8')
+    server, base, seen = start_server({
+        '/page': page(CHINESE),
+        '/pdf': lambda handler: (200, {'Content-Type': 'application/pdf'}, b'%PDF'),
+        '/big': lambda handler: (200, {'Content-Type': 'text/html'}, big),
+    })
+    try:
+        retry_policy = RetryPolicy(max_retries=0)
+        fetcher = HttpFetcher(retry_policy=retry_policy, body_limits=BodyLimits(max_bytes=len(big), spool_bytes=1024))
+        content, final_url = fetcher.fetch(base + '/page')
+        assert CHINESE in content
+
+        strict = HttpFetcher(retry_policy=retry_policy, body_limits=BodyLimits(max_bytes=len(big) - 1))
+        with pytest.raises(UnsupportedContentType):
+            strict.fetch(base + '/pdf')
+        with pytest.raises(ResponseTooLarge):
+            strict.fetch(base + '/big')
+    finally:
+        server.shutdown()
+
+
+def test_async_fetcher_applies_limits():
+    pytest.importorskip('aiohttp')
+    from async_fetcher import AsyncFetcher
+
+    server, base, seen = start_server({
+        '/page': page(CHINESE),
+        '/pdf': lambda handler: (200, {'Content-Type': 'application/pdf'}, b'%PDF'),
+    })
+    try:
+        fetcher = AsyncFetcher(retry_policy=RetryPolicy(max_retries=0),
+                               body_limits=BodyLimits(spool_bytes=1024))
+        results = fetcher.fetch_all([base + '/page', base + '/pdf'])
+    finally:
+        server.shutdown()
+
+    assert CHINESE in results[0][0]
+    assert isinstance(results[1], UnsupportedContentType)
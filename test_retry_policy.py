@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试请求重试和熔断
+HTTP相关的测试使用本机的 http.server，不访问外部网络
+"""
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy
+from host_scheduler import HostScheduler
+
+
+def start_server(responses):
+    """启动本机服务器，依次返回responses中的 (状态码, 响应头)，用完后一直返回200"""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(time.monotonic())
+            status, headers = responses[len(hits) - 1] if len(hits) <= len(responses) else (200, {})
+            body = b'<html><body>ok</body></html>' if status == 200 else b''
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/', hits
+
+
+@pytest.fixture
+def session():
+    session = requests.Session()
+    session.trust_env = False
+    yield session
+    session.close()
+
+
+def test_breaker_opens_after_threshold():
+    """连续失败达到阈值后熔断，成功一次即清零"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure('example.com')
+    assert breaker.allow('example.com')
+    breaker.record_success('example.com')
+    breaker.record_failure('example.com')
+    assert breaker.allow('example.com')
+    breaker.record_failure('example.com')
+    assert not breaker.allow('example.com')
+    assert breaker.allow('other.example.com')
+
+
+def test_breaker_half_open_allows_one_probe():
+    """熔断时间过后只放行一个试探请求，试探成功后恢复"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure('example.com')
+    assert not breaker.allow('example.com')
+    time.sleep(0.06)
+    assert breaker.allow('example.com')
+    assert not breaker.allow('example.com')
+    breaker.record_success('example.com')
+    assert breaker.allow('example.com')
+
+
+def test_check_circuit_raises_when_open():
+    policy = RetryPolicy(breaker=CircuitBreaker(failure_threshold=1))
+    policy.breaker.record_failure('example.com')
+    with pytest.raises(CircuitOpenError):
+        policy.check_circuit('http://Example.com/page')
+
+
+def test_delay_honors_full_retry_after():
+    """Retry-After不受backoff_max限制"""
+    policy = RetryPolicy(backoff_base=0.5, backoff_max=1)
+    assert policy.delay(0, 90) == 90
+    assert 0 <= policy.delay(5) <= 1
+
+
+def test_response_delay_gives_up():
+    """重试次数用尽或Retry-After超过max_retry_after时放弃"""
+    policy = RetryPolicy(max_retries=2, max_retry_after=60)
+    assert policy.response_delay(2, 503, {}) is None
+    assert policy.response_delay(0, 429, {'Retry-After': '120'}) is None
+    assert policy.response_delay(0, 429, {'Retry-After': '45'}) == 45
+
+
+def test_get_retries_until_success(session):
+    server, url, hits = start_server([(500, {}), (502, {})])
+    try:
+        policy = RetryPolicy(max_retries=3, backoff_base=0)
+        response = policy.get(session, url, timeout=5)
+        assert response.status_code == 200
+        assert len(hits) == 3
+        assert policy.breaker.allow('127.0.0.1:%d' % server.server_port)
+    finally:
+        server.shutdown()
+
+
+def test_get_returns_last_response_and_records_failure(session):
+    server, url, hits = start_server([(503, {})] * 3)
+    try:
+        policy = RetryPolicy(max_retries=2, backoff_base=0, breaker=CircuitBreaker(failure_threshold=1))
+        response = policy.get(session, url, timeout=5)
+        assert response.status_code == 503
+        assert len(hits) == 3
+        with pytest.raises(CircuitOpenError):
+            policy.get(session, url, timeout=5)
+        assert len(hits) == 3
+    finally:
+        server.shutdown()
+
+
+def test_get_reports_every_response_to_scheduler(session):
+    """重试前的429也交给调度器，主机立即进入冷却；重试等待完整的Retry-After"""
+    server, url, hits = start_server([(429, {'Retry-After': '1'})])
+    try:
+        scheduler = HostScheduler(min_interval=0)
+        seen = []
+
+        def on_response(response):
+            seen.append(response.status_code)
+            scheduler.note_response(url, response.status_code, response.headers)
+
+        policy = RetryPolicy(backoff_base=0, backoff_max=0.1)
+        response = policy.get(session, url, on_response=on_response, timeout=5)
+        assert response.status_code == 200
+        assert seen == [429, 200]
+        assert hits[1] - hits[0] >= 1
+        # 冷却在第一次响应时就已生效
+        assert scheduler.hosts['127.0.0.1:%d' % server.server_port].blocked_until > 0
+    finally:
+        server.shutdown()
+
+
+def test_get_does_not_retry_long_retry_after(session):
+    server, url, hits = start_server([(503, {'Retry-After': '3600'})])
+    try:
+        policy = RetryPolicy(max_retry_after=60)
+        response = policy.get(session, url, timeout=5)
+        assert response.status_code == 503
+        assert len(hits) == 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻WeasyPrint渲染池
+每个工作进程启动时解析一次公共样式表并建立FontConfiguration，之后连续渲染多个文档，
+避免每个页面都重复字体发现和CSS解析
+"""
+
+import os
+import time
+import atexit
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的预热状态，由 _init_worker 设置
+_font_config = None
+_stylesheets = None
+_url_fetcher = None
+
+
+def load_stylesheets(css_content):
+    """解析样式表并返回 (font_config, stylesheets)，进程内只需调用一次"""
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = FontConfiguration()
+    stylesheets = [CSS(string=css_content, font_config=font_config)] if css_content else []
+    return font_config, stylesheets
+
+
+def _init_worker(css_content, asset_server_url=None):
+    global _font_config, _stylesheets, _url_fetcher
+    _font_config, _stylesheets = load_stylesheets(css_content)
+    if asset_server_url:
+        from asset_cache import proxy_url_fetcher
+        _url_fetcher = proxy_url_fetcher(asset_server_url)
+
+
+def _render(html_content, output_path, base_url=None):
+    """在工作进程中渲染一个文档，返回渲染耗时（秒）"""
+    from weasyprint import HTML
+
+    start = time.perf_counter()
+    kwargs = {'url_fetcher': _url_fetcher} if _url_fetcher else {}
+    HTML(string=html_content, base_url=base_url, **kwargs).write_pdf(
+        output_path, stylesheets=_stylesheets, font_config=_font_config
+    )
+    return time.perf_counter() - start
+
+
+class WeasyPrintPool:
+    """
+    WeasyPrint进程池
+    css_content: 所有文档共用的样式表，每个工作进程只解析一次
+    size: 进程数量，默认为CPU核心数
+    max_tasks_per_child: 每个进程处理多少个文档后重启，需要Python 3.11+
+    asset_server_url: 可选的 asset_cache.AssetServer 地址，工作进程通过它读取页面的子资源
+    """
+
+    def __init__(self, css_content, size=None, max_tasks_per_child=None, asset_server_url=None):
+        kwargs = {}
+        if max_tasks_per_child:
+            kwargs['max_tasks_per_child'] = max_tasks_per_child
+        self.size = max(1, size or os.cpu_count() or 1)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.size,
+            initializer=_init_worker,
+            initargs=(css_content, asset_server_url),
+            **kwargs
+        )
+        atexit.register(self.close)
+
+    def submit(self, html_content, output_path, base_url=None):
+        """提交一个渲染任务，返回Future，结果为渲染耗时（秒）"""
+        return self.executor.submit(_render, html_content, output_path, base_url)
+
+    def render(self, html_content, output_path, base_url=None):
+        """渲染一个文档并等待完成，返回渲染耗时（秒）"""
+        elapsed = self.submit(html_content, output_path, base_url).result()
+        logger.info(f"渲染完成: {output_path} ({elapsed:.2f}秒)")
+        return elapsed
+
+    def close(self):
+        """关闭所有工作进程"""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
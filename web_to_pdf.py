@@ -5,145 +5,122 @@
 输入网址链接，读取该网页并在本地生成PDF文件
 """
 
-import requests
 import os
 import sys
-from urllib.parse import urlparse
-from datetime import datetime
-import weasyprint
-from weasyprint import HTML, CSS
 import logging
+from output_paths import output_path
+from converter_core import ConverterBase, WeasyPrintRenderer
+from profiling import profiler_from_env
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class WebToPDF:
-    def __init__(self):
-        self.session = requests.Session()
-        # 设置请求头，模拟浏览器访问
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-    
-    def get_webpage_content(self, url):
-        """
-        获取网页内容
-        """
-        try:
-            logger.info(f"正在获取网页内容: {url}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 检查内容类型
-            content_type = response.headers.get('content-type', '').lower()
-            if 'text/html' not in content_type:
-                logger.warning(f"警告: 内容类型不是HTML ({content_type})")
-            
-            # 检测并设置正确的编码
-            if response.encoding == 'ISO-8859-1':
-                # 尝试检测真实编码
-                response.encoding = response.apparent_encoding
-            
-            # 确保使用UTF-8编码
-            if response.encoding.lower() not in ['utf-8', 'utf8']:
-                logger.info(f"检测到编码: {response.encoding}，转换为UTF-8")
-                content = response.content.decode(response.encoding, errors='replace')
-                content = content.encode('utf-8').decode('utf-8')
-            else:
-                content = response.text
-            
-            return content, response.url
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"获取网页失败: {e}")
-            raise
+# 添加一些基本的CSS样式来改善PDF输出
+PAGE_CSS = """
+@page {
+    margin: 1in;
+    size: A4;
+}
+body {
+    font-family: Arial, sans-serif;
+    line-height: 1.6;
+    color: #333;
+}
+img {
+    max-width: 100%;
+    height: auto;
+}
+a {
+    color: #0066cc;
+    text-decoration: none;
+}
+"""
+
+class WebToPDF(ConverterBase):
+    def __init__(self, render_workers=1, cache=None, render_cache=None, retry_policy=None, asset_cache=None,
+                 body_limits=None, metrics=None, profiler=None):
+        # 获取、缓存、重试、指标和剖析的装配见 converter_core.ConverterBase.setup_core
+        profiler = profiler or profiler_from_env()
+        # render_workers大于1时使用WeasyPrint进程池渲染，每个进程预先解析样式表和字体
+        # 剖析时在当前进程中渲染，渲染进程中的调用无法被cProfile记录
+        self.render_workers = 1 if profiler else max(1, render_workers or os.cpu_count() or 1)
+        self.renderer = WeasyPrintRenderer(PAGE_CSS, workers=self.render_workers, asset_cache=asset_cache)
+        self.setup_core([self.renderer], cache=cache, render_cache=render_cache, retry_policy=retry_policy,
+                        asset_cache=asset_cache, body_limits=body_limits, metrics=metrics, profiler=profiler)
     
     def generate_filename(self, url, output_dir="pdfs"):
         """
-        根据URL生成PDF文件名
+        根据URL生成PDF文件名，文件按URL哈希分散到子目录中，同一URL总是得到同一路径
         """
-        # 创建输出目录
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            logger.info(f"创建输出目录: {output_dir}")
-        
-        # 解析URL生成文件名
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc.replace('.', '_')
-        path = parsed_url.path.strip('/').replace('/', '_') or 'index'
-        
-        # 添加时间戳避免文件名冲突
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{domain}_{path}_{timestamp}.pdf"
-        
-        # 确保文件名合法
-        filename = "".join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
-        
-        return os.path.join(output_dir, filename)
+        return output_path(url, output_dir, "pdf")
     
     def html_to_pdf(self, html_content, output_path, base_url=None):
         """
         将HTML内容转换为PDF
         """
         try:
-            logger.info(f"正在生成PDF文件: {output_path}")
-            
-            # 创建HTML对象
-            html_doc = HTML(string=html_content, base_url=base_url)
-            
-            # 添加一些基本的CSS样式来改善PDF输出
-            css_content = """
-            @page {
-                margin: 1in;
-                size: A4;
-            }
-            body {
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-            }
-            img {
-                max-width: 100%;
-                height: auto;
-            }
-            a {
-                color: #0066cc;
-                text-decoration: none;
-            }
-            """
-            
-            css = CSS(string=css_content)
-            
-            # 生成PDF
-            html_doc.write_pdf(output_path, stylesheets=[css])
-            
-            logger.info(f"PDF文件生成成功: {output_path}")
+            self.core.render_with(self.renderer, html_content, output_path, base_url)
             return True
-            
         except Exception as e:
             logger.error(f"生成PDF失败: {e}")
             raise
     
+    def render_cache_key(self, html_content, base_url=None):
+        """
+        返回渲染缓存键，未启用渲染缓存时返回None
+        """
+        return self.core.render_cache_key(self.renderer, html_content, base_url)
+    
+    def get_render_pool(self):
+        """
+        返回WeasyPrint渲染池，首次调用时创建
+        """
+        return self.renderer.get_pool()
+    
     def convert_url_to_pdf(self, url, output_dir="pdfs"):
         """
         主函数：将URL转换为PDF
         """
         try:
-            # 获取网页内容
-            html_content, final_url = self.get_webpage_content(url)
-            
-            # 生成输出文件名
-            output_path = self.generate_filename(final_url, output_dir)
-            
-            # 转换为PDF
-            self.html_to_pdf(html_content, output_path, base_url=final_url)
-            
+            output_path, _ = self.core.convert(url, output_dir)
             return output_path
             
         except Exception as e:
             logger.error(f"转换失败: {e}")
             raise
+    
+    def convert_urls_to_pdf(self, urls, output_dir="pdfs"):
+        """
+        批量将URL转换为PDF，获取并发进行，渲染分布到所有渲染进程
+        返回与urls顺序一致的输出路径或异常对象
+        """
+        results = [None] * len(urls)
+        jobs = {}
+        if self.asset_cache:
+            self.asset_cache.reset_stats()
+        
+        for index, outcome in enumerate(self.get_webpage_contents(urls)):
+            if isinstance(outcome, Exception):
+                results[index] = outcome
+                if self.metrics:
+                    self.metrics.finish(urls[index], 'failed', error=str(outcome))
+                continue
+            html_content, final_url = outcome
+            jobs[index] = self.core.submit(self.renderer, html_content, self.generate_filename(final_url, output_dir),
+                                           final_url)
+        
+        for index, job in jobs.items():
+            try:
+                results[index] = self.core.finish(job, urls[index])
+            except Exception as e:
+                logger.error(f"生成PDF失败: {e}")
+                results[index] = e
+        
+        if self.asset_cache:
+            stats = self.asset_cache.stats()
+            logger.info(f"资源缓存: 命中 {stats['hits']}，未命中 {stats['misses']}，节省下载 {stats['saved_mb']:.2f}MB")
+        return results
 
 def main():
     """
@@ -5,13 +5,13 @@
 专门优化中文支持的版本
 """
 
-import requests
 import os
 import sys
-import re
-from urllib.parse import urlparse
-from datetime import datetime
 import logging
+from html_preprocess import enhance_html_for_chinese
+from content_analysis import analyze_scripts, font_family_for
+from output_paths import output_path
+from converter_core import BROWSER_HEADERS, PDFKIT_OPTIONS, ConverterBase, HTMLRenderer, WkhtmltopdfURLRenderer
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,126 +24,54 @@ except ImportError:
     PDFKIT_AVAILABLE = False
     logger.warning("pdfkit未安装，将使用HTML文件保存方式")
 
-class EnhancedWebToPDF:
-    def __init__(self):
-        self.session = requests.Session()
-        # 设置请求头，模拟浏览器访问
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        })
+class EnhancedWebToPDF(ConverterBase):
+    def __init__(self, cache=None, retry_policy=None, analyze_content=True, body_limits=None,
+                 metrics=None, profiler=None):
+        # 统计页面中的中日韩文字并据此选择字体，为False时跳过统计并使用默认的中文字体
+        self.analyze_content = analyze_content
+        
+        # 获取、缓存、重试、指标和剖析的装配见 converter_core.ConverterBase.setup_core；请求头模拟浏览器访问
+        # HTML后备加入编码声明和按页面文字选择的字体
+        renderers = [HTMLRenderer(preprocess=lambda html: self.enhance_html_for_chinese(html, self.analyze_html(html)))]
         
-        # 配置pdfkit选项，优化中文支持
         if PDFKIT_AVAILABLE:
-            self.pdfkit_options = {
-                'page-size': 'A4',
-                'margin-top': '0.75in',
-                'margin-right': '0.75in',
-                'margin-bottom': '0.75in',
-                'margin-left': '0.75in',
-                'encoding': "UTF-8",
-                'no-outline': None,
-                'enable-local-file-access': None,
-                'javascript-delay': '1000',
-                'no-stop-slow-scripts': None,
-                'load-error-handling': 'ignore',
-                'load-media-error-handling': 'ignore'
-            }
+            # 由wkhtmltopdf直接按URL渲染，保留图片和脚本，失败时保存为HTML
+            self.pdfkit_options = {option: value for option, value in PDFKIT_OPTIONS.items()
+                                   if option not in ('disable-smart-shrinking', 'no-images', 'disable-javascript')}
+            renderers.insert(0, WkhtmltopdfURLRenderer(self.pdfkit_options))
+        
+        self.setup_core(renderers, headers=BROWSER_HEADERS, cache=cache, retry_policy=retry_policy,
+                        body_limits=body_limits, metrics=metrics, profiler=profiler)
     
-    def get_webpage_content(self, url):
+    def analyze_html(self, html_content):
         """
-        获取网页内容，增强中文支持
+        统计页面中的中日韩文字，未启用时返回None
         """
-        try:
-            logger.info(f"正在获取网页内容: {url}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 智能检测编码
-            if response.encoding == 'ISO-8859-1':
-                response.encoding = response.apparent_encoding
-            
-            # 确保使用UTF-8编码
-            if response.encoding.lower() not in ['utf-8', 'utf8']:
-                logger.info(f"检测到编码: {response.encoding}，转换为UTF-8")
-                content = response.content.decode(response.encoding, errors='replace')
-                content = content.encode('utf-8').decode('utf-8')
-            else:
-                content = response.text
-            
-            # 检查中文字符
-            chinese_chars = sum(1 for c in content if '\u4e00' <= c <= '\u9fff')
-            logger.info(f"检测到 {chinese_chars} 个中文字符")
-            
-            return content, response.url
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"获取网页失败: {e}")
-            raise
+        if not self.analyze_content:
+            return None
+        stats = analyze_scripts(html_content)
+        logger.info(f"检测到 {stats['han']} 个中文字符")
+        return stats
     
-    def enhance_html_for_chinese(self, html_content):
-        """
-        增强HTML内容的中文支持
+    def enhance_html_for_chinese(self, html_content, stats=None):
         """
-        # 确保有正确的meta标签
-        if '<meta charset=' not in html_content and '<meta http-equiv="Content-Type"' not in html_content:
-            if '<head>' in html_content:
-                html_content = html_content.replace('<head>', '<head>\n    <meta charset="UTF-8">')
-            elif '<head ' in html_content:
-                html_content = re.sub(r'(<head[^>]*>)', r'\1\n    <meta charset="UTF-8">', html_content)
-            else:
-                html_content = html_content.replace('<html>', '<html>\n<head>\n    <meta charset="UTF-8">\n</head>')
-        
-        # 添加中文字体支持
-        font_css = """
-        <style>
-        body {
-            font-family: "Microsoft YaHei", "SimSun", "SimHei", "KaiTi", "FangSong", Arial, sans-serif;
-            line-height: 1.6;
-        }
-        </style>
+        增强HTML内容的中文支持，stats为 analyze_html 的结果，用于选择字体
         """
-        
-        if '<head>' in html_content:
-            html_content = html_content.replace('<head>', '<head>' + font_css)
-        elif '<head ' in html_content:
-            html_content = re.sub(r'(<head[^>]*>)', r'\1' + font_css, html_content)
-        
-        return html_content
+        return enhance_html_for_chinese(html_content, font_family_for(stats))
     
     def generate_filename(self, url, output_dir="outputs", extension="pdf"):
         """
-        根据URL生成文件名
+        根据URL生成文件名，文件按URL哈希分散到子目录中，同一URL总是得到同一路径
         """
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            logger.info(f"创建输出目录: {output_dir}")
-        
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc.replace('.', '_')
-        path = parsed_url.path.strip('/').replace('/', '_') or 'index'
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{domain}_{path}_{timestamp}.{extension}"
-        
-        filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-        
-        return os.path.join(output_dir, filename)
+        return output_path(url, output_dir, extension)
     
-    def save_as_html(self, html_content, output_path):
+    def save_as_html(self, html_content, output_path, stats=None):
         """
         保存为HTML文件，增强中文支持
         """
         try:
-            enhanced_content = self.enhance_html_for_chinese(html_content)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(enhanced_content)
-            logger.info(f"HTML文件保存成功: {output_path}")
+            renderer = HTMLRenderer(preprocess=lambda html: self.enhance_html_for_chinese(html, stats))
+            self.core.render_with(renderer, html_content, output_path)
             return True
         except Exception as e:
             logger.error(f"保存HTML文件失败: {e}")
@@ -153,10 +81,10 @@ class EnhancedWebToPDF:
         """
         使用pdfkit转换为PDF
         """
+        if not PDFKIT_AVAILABLE:
+            raise RuntimeError("转换PDF需要安装pdfkit: pip install pdfkit")
         try:
-            logger.info(f"正在使用pdfkit生成PDF: {output_path}")
-            pdfkit.from_url(url, output_path, options=self.pdfkit_options)
-            logger.info(f"PDF文件生成成功: {output_path}")
+            self.core.render_with(WkhtmltopdfURLRenderer(self.pdfkit_options), None, output_path, url)
             return True
         except Exception as e:
             logger.error(f"pdfkit转换失败: {e}")
@@ -167,19 +95,7 @@ class EnhancedWebToPDF:
         主函数：将URL转换为PDF或HTML
         """
         try:
-            html_content, final_url = self.get_webpage_content(url)
-            
-            if PDFKIT_AVAILABLE:
-                try:
-                    output_path = self.generate_filename(final_url, output_dir, "pdf")
-                    self.convert_to_pdf_with_pdfkit(final_url, output_path)
-                    return output_path, "pdf"
-                except Exception as e:
-                    logger.warning(f"PDF转换失败，将保存为HTML: {e}")
-            
-            output_path = self.generate_filename(final_url, output_dir, "html")
-            self.save_as_html(html_content, output_path)
-            return output_path, "html"
+            return self.core.convert(url, output_dir)
             
         except Exception as e:
             logger.error(f"转换失败: {e}")